@@ -75,6 +75,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'company.tenancy.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -162,6 +163,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_THROTTLE_CLASSES": ["rest_framework.throttling.UserRateThrottle"],
     "DEFAULT_THROTTLE_RATES": {"user": "2000/day"},
+    "EXCEPTION_HANDLER": "company.exceptions.exception_handler",
 }
 
 SIMPLE_JWT = {
@@ -178,8 +180,24 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 # Cache configuration
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# The kit, price, aging and barcode caches are invalidated by signals in
+# whichever process made the change, so every worker must share one cache:
+# set REDIS_URL for any deployment running more than one process. The
+# in-memory fallback is only correct for a single process (runserver, tests).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Ordering of quote lines and sections: 'shift' keeps orders dense (1..n),
+# 'gapped' spaces them ORDER_GAP apart so inserts and moves write one row
+QUOTE_ORDERING_MODE = os.environ.get('QUOTE_ORDERING_MODE', 'shift')
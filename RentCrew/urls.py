@@ -21,4 +21,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('company.urls', namespace='company')),
     path('api/equipment/', include('equipment.urls', namespace='equipment')),
+    path('api/availability/', include('аccessibility.urls', namespace='availability')),
+    path('api/documents/', include('documentsFinance.urls', namespace='documents')),
 ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_initial'),
+        ('company', '0004_company_owner'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clients',
+            index=models.Index(fields=['company', 'clientName'], name='idx_clients_company_name'),
+        ),
+    ]
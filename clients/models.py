@@ -1,5 +1,6 @@
 from django.db import models
 from company.models import Company
+from company.tenancy import TenantManager
 
 class Clients(models.Model):
 
@@ -10,11 +11,17 @@ class Clients(models.Model):
     tags = models.JSONField(blank=True, null=True)
     company = models.ForeignKey(Company, related_name='clients', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return self.clientName
 
     class Meta:
         verbose_name_plural = "accounts"
+        indexes = [
+            models.Index(fields=['company', 'clientName'], name='idx_clients_company_name'),
+        ]
 
 
 class Contact(models.Model):
@@ -0,0 +1,30 @@
+import csv
+import io
+
+
+def text_stream(fileobj):
+    """Text view of an uploaded or opened file; BOMs from Excel exports are dropped."""
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+
+def open_csv(fileobj, delimiters=',;\t'):
+    """
+    Start reading a CSV file with a header line, one line at a time.
+
+    The delimiter is sniffed from the header alone, so the file is never
+    read ahead.
+
+    Returns:
+        tuple: (lower-cased, stripped column names, csv.reader over the
+        remaining lines)
+    """
+    stream = text_stream(fileobj)
+    header = stream.readline()
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=delimiters)
+    except csv.Error:
+        dialect = csv.excel
+    names = [name.strip().lower() for name in next(csv.reader([header], dialect), [])]
+    return names, csv.reader(stream, dialect)
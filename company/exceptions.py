@@ -0,0 +1,13 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import exception_handler as drf_exception_handler
+
+
+def exception_handler(exc, context):
+    """
+    DRF's exception handler, also answering model validation errors
+    (e.g. from Reservation.save) with 400 instead of a server error.
+    """
+    if isinstance(exc, DjangoValidationError):
+        exc = ValidationError(exc.message_dict if hasattr(exc, 'error_dict') else {'detail': exc.messages})
+    return drf_exception_handler(exc, context)
@@ -0,0 +1,106 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import models
+
+# Request being served on this thread/task, set by TenantMiddleware
+_current_request = ContextVar('tenant_request', default=None)
+# Explicit company set with tenant_context(), wins over the request
+_current_company = ContextVar('tenant_company', default=None)
+
+_UNRESOLVED = object()
+# Scope of an authenticated user that belongs to no company: sees nothing
+NO_COMPANY = object()
+
+
+def _request_company_id(request):
+    """
+    Company id of the request's user, resolved once and kept on the request.
+
+    Nothing is cached until the user is authenticated: DRF authenticates
+    JWT requests inside the view, after the middleware has run.
+    Superusers are not scoped; other users without a company get
+    NO_COMPANY.
+    """
+    company_id = getattr(request, '_tenant_company_id', _UNRESOLVED)
+    if company_id is not _UNRESOLVED:
+        return company_id
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    if user.is_superuser:
+        company_id = None
+    else:
+        company_id = user.company_id if user.company_id is not None else NO_COMPANY
+    request._tenant_company_id = company_id
+    return company_id
+
+
+def current_company_id():
+    """
+    Company id that tenant-scoped querysets are limited to, NO_COMPANY
+    if they must stay empty, or None if they are not scoped.
+    """
+    company_id = _current_company.get()
+    if company_id is not None:
+        return company_id
+    request = _current_request.get()
+    return _request_company_id(request) if request is not None else None
+
+
+@contextmanager
+def tenant_context(company):
+    """
+    Scope tenant-aware querysets to a company outside of a request,
+    e.g. in management commands and background jobs.
+    """
+    token = _current_company.set(getattr(company, 'pk', company))
+    try:
+        yield
+    finally:
+        _current_company.reset(token)
+
+
+class TenantQuerySet(models.QuerySet):
+
+    def for_company(self, company):
+        return self.filter(company=company)
+
+
+class TenantManager(models.Manager.from_queryset(TenantQuerySet)):
+    """
+    Default manager of company-owned models.
+
+    Querysets are limited to the current company (see current_company_id)
+    when they are created, and empty for a signed-in user without a
+    company. Outside a request or tenant_context they are
+    left unscoped, so migrations, commands and the shell see every row;
+    use Model.all_objects to bypass scoping inside a request. Querysets
+    built at import time, like a view's class-level queryset, are not
+    scoped and still need an explicit company filter.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        company_id = current_company_id()
+        if company_id is NO_COMPANY:
+            return queryset.none()
+        if company_id is not None:
+            queryset = queryset.filter(company_id=company_id)
+        return queryset
+
+
+class TenantMiddleware:
+    """
+    Make the current request available to TenantManager for its duration.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
@@ -0,0 +1,36 @@
+"""
+Fixtures shared by the apps' test modules.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from clients.models import Clients
+from company.models import Company, User
+from projects.models import Project
+from refdata.models import Venue
+
+
+def make_company(email='owner@example.com'):
+    """A company with an owner user belonging to it."""
+    owner = User.objects.create_user(email=email, password='pw', role='owner')
+    company = Company.objects.create(
+        legalName='Acme AV', owner=owner, country='EE', street_address='Main 1',
+        city='Tallinn', state_province='Harju', zip_postal_code='10111',
+    )
+    owner.company = company
+    owner.save()
+    return company
+
+
+def make_project(company, code='P-1', **event_dates):
+    """A confirmed project of the company, with its own client and venue."""
+    client = Clients.objects.create(clientName='Client', company=company)
+    venue = Venue.objects.create(name='Hall', company=company)
+    return Project.objects.create(
+        code=code, name='Festival', stage='confirmed', account=client, venue=venue,
+        eventDates=event_dates, ownerUser=company.owner, probability=100,
+    )
+
+
+def dt(day, hour=0):
+    """A UTC datetime in June 2026; the 1st is a Monday."""
+    return datetime(2026, 6, day, hour, tzinfo=dt_timezone.utc)
@@ -1,3 +1,74 @@
-from django.test import TestCase
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory, TestCase
+
+from clients.models import Clients
+from equipment.models import CatalogItem
+from .models import User
+from .tenancy import TenantMiddleware, current_company_id, tenant_context
+from .testing import make_company
+
+
+class TenantScopingTestCase(TestCase):
+    """Test cases for the tenant manager and middleware"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.other = make_company('other@example.com')
+        for company, sku in ((self.company, 'a1'), (self.company, 'a2'), (self.other, 'b1')):
+            CatalogItem.objects.create(sku=sku, name=sku, category='audio', defaultRate=1, company=company)
+        Clients.objects.create(clientName='Client', company=self.other)
+
+    def serve(self, user, view):
+        request = RequestFactory().get('/')
+        request.user = user
+        return TenantMiddleware(lambda request: view())(request)
+
+    def test_request_scopes_querysets(self):
+        skus = self.serve(self.company.owner, lambda: sorted(CatalogItem.objects.values_list('sku', flat=True)))
+        self.assertEqual(skus, ['a1', 'a2'])
+        self.assertEqual(self.serve(self.company.owner, lambda: Clients.objects.count()), 0)
+        self.assertEqual(self.serve(self.company.owner, lambda: CatalogItem.all_objects.count()), 3)
+        # Nothing leaks out of the request
+        self.assertIsNone(current_company_id())
+        self.assertEqual(CatalogItem.objects.count(), 3)
+
+    def test_company_is_resolved_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        def view():
+            unscoped = CatalogItem.objects.count()
+            # DRF authenticates inside the view, after the middleware
+            request.user = self.company.owner
+            with self.assertNumQueries(1):
+                scoped = CatalogItem.objects.count()
+            return unscoped, scoped
+
+        self.assertEqual(TenantMiddleware(lambda request: view())(request), (3, 2))
+        self.assertEqual(request._tenant_company_id, self.company.pk)
+
+    def test_superusers_and_explicit_context(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='pw', role='admin',
+                                              company=self.company)
+        self.assertEqual(self.serve(admin, lambda: CatalogItem.objects.count()), 3)
+        with tenant_context(self.other):
+            self.assertEqual(list(CatalogItem.objects.values_list('sku', flat=True)), ['b1'])
+        self.assertEqual(CatalogItem.objects.for_company(self.company).count(), 2)
+
+    def test_users_without_company_see_nothing(self):
+        probe = User.objects.create_user(email='probe@example.com', password='pw', role='staff')
+        self.assertEqual(self.serve(probe, lambda: CatalogItem.objects.count()), 0)
+        self.assertEqual(self.serve(probe, lambda: Clients.objects.count()), 0)
+        self.assertEqual(self.serve(probe, lambda: CatalogItem.all_objects.count()), 3)
+
+    @skipUnless(connection.vendor == 'sqlite', "Reads SQLite query plans")
+    def test_company_index_serves_list_queries(self):
+        sql, params = CatalogItem.objects.filter(company=self.company).order_by('name').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('idx_catalogitem_company_name', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Quote, QuoteLine, QuoteSection, Invoice, Payment, SubRent
+from .models import Quote, QuoteLine, QuoteSection, Invoice, Payment, SubRent, SubRentItem, RenderJob, InvoiceBatchJob
 
 class QuoteLineInline(admin.TabularInline):
     model = QuoteLine
@@ -45,8 +45,30 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ('method', 'date')
     search_fields = ('ref', 'invoiceId__number')
 
+class SubRentItemInline(admin.TabularInline):
+    model = SubRentItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ('catalogItem', 'qty', 'dateFrom', 'dateTo')
+
+    def has_add_permission(self, request, obj=None):
+        # Rows are synced from SubRent.items
+        return False
+
 @admin.register(SubRent)
 class SubRentAdmin(admin.ModelAdmin):
     list_display = ('projectId', 'dateFrom', 'dateTo', 'cost')
     list_filter = ('dateFrom', 'dateTo')
     search_fields = ('projectId__name',)
+    inlines = [SubRentItemInline]
+
+@admin.register(RenderJob)
+class RenderJobAdmin(admin.ModelAdmin):
+    list_display = ('quoteId', 'status', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('quoteId__number', 'contentHash')
+
+@admin.register(InvoiceBatchJob)
+class InvoiceBatchJobAdmin(admin.ModelAdmin):
+    list_display = ('company', 'status', 'created_at', 'finished_at')
+    list_filter = ('status',)
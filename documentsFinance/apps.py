@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DocumentsfinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'documentsFinance'
+
+    def ready(self):
+        # Connect quote totals maintenance handlers
+        from . import signals
@@ -0,0 +1,118 @@
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from .models import QuoteLine
+from .totals import ZERO
+
+# Line fields compared between versions
+COMPARED_FIELDS = ('qty', 'rate', 'days', 'discount', 'taxRuleId_id')
+
+
+def _lines(quote):
+    rows = (QuoteLine.objects
+            .filter(quoteId=quote)
+            .order_by('order', 'id')
+            .values('id', 'itemRef', 'grossAmount', 'discountAmount', *COMPARED_FIELDS))
+    return [dict(row, position=position, net=row['grossAmount'] - row['discountAmount'])
+            for position, row in enumerate(rows, 1)]
+
+
+def _stable(positions):
+    """
+    Indexes of the longest increasing run of positions (patience sorting).
+
+    Matched lines on that run kept their relative order; every other
+    matched line counts as moved.
+    """
+    tails, tail_index, previous = [], [], [None] * len(positions)
+    for i, position in enumerate(positions):
+        k = bisect_left(tails, position)
+        if k == len(tails):
+            tails.append(position)
+            tail_index.append(i)
+        else:
+            tails[k] = position
+            tail_index[k] = i
+        previous[i] = tail_index[k - 1] if k else None
+    stable = set()
+    i = tail_index[-1] if tail_index else None
+    while i is not None:
+        stable.add(i)
+        i = previous[i]
+    return stable
+
+
+def _describe(line):
+    return {'id': line['id'], 'itemRef': line['itemRef'], 'position': line['position'],
+            'qty': line['qty'], 'rate': str(line['rate']), 'days': line['days'], 'net': str(line['net'])}
+
+
+def diff_quotes(base, other):
+    """
+    Line-level changes from one quote version to another.
+
+    Lines are matched on itemRef with a hash join: the base lines are
+    bucketed by itemRef once and each line of the other version takes the
+    next unmatched base line with the same itemRef, so repeated itemRefs
+    pair up in order. Matching is linear; the moved check adds an
+    O(n log n) longest-increasing-run pass over matched positions.
+
+    Args:
+        base: Quote (or ID) to diff from
+        other: Quote (or ID) to diff to
+
+    Returns:
+        dict: 'added', 'removed', 'changed' and 'moved' lines and an
+        'impact' summary of net amounts (after line discounts, before tax)
+    """
+    base_lines, other_lines = _lines(base), _lines(other)
+
+    buckets = defaultdict(deque)
+    for line in base_lines:
+        buckets[line['itemRef']].append(line)
+
+    added, changed, pairs = [], [], []
+    for line in other_lines:
+        bucket = buckets.get(line['itemRef'])
+        if not bucket:
+            added.append(line)
+            continue
+        before = bucket.popleft()
+        pairs.append((before, line))
+        fields = {
+            field: {'from': str(before[field]) if before[field] is not None else None,
+                    'to': str(line[field]) if line[field] is not None else None}
+            for field in COMPARED_FIELDS if before[field] != line[field]
+        }
+        if fields:
+            changed.append({
+                'itemRef': line['itemRef'], 'fromId': before['id'], 'toId': line['id'],
+                'fields': fields, 'impact': str(line['net'] - before['net']),
+            })
+    removed = [line for bucket in buckets.values() for line in bucket]
+
+    stable = _stable([before['position'] for before, _ in pairs])
+    moved = [
+        {'itemRef': line['itemRef'], 'fromId': before['id'], 'toId': line['id'],
+         'from': before['position'], 'to': line['position']}
+        for i, (before, line) in enumerate(pairs) if i not in stable
+    ]
+
+    base_net = sum((line['net'] for line in base_lines), ZERO)
+    other_net = sum((line['net'] for line in other_lines), ZERO)
+    added_net = sum((line['net'] for line in added), ZERO)
+    removed_net = sum((line['net'] for line in removed), ZERO)
+    return {
+        'added': [_describe(line) for line in added],
+        'removed': [_describe(line) for line in removed],
+        'changed': changed,
+        'moved': moved,
+        'impact': {
+            'from': str(base_net),
+            'to': str(other_net),
+            'added': str(added_net),
+            'removed': str(-removed_net),
+            'changed': str(other_net - base_net - added_net + removed_net),
+            'total': str(other_net - base_net),
+        },
+    }
@@ -0,0 +1,258 @@
+import csv
+import importlib.util
+import io
+import logging
+import tempfile
+import time
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from . import pdf_worker
+from .models import Invoice, InvoiceBatchJob
+from .rendering import RenderError, run_in_background
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TEMPLATE = 'documentsFinance/invoice_pdf.html'
+INVOICE_STYLESHEET = 'documentsFinance/invoice_pdf.css'
+TIMINGS_NAME = 'timings.csv'
+
+BatchResult = namedtuple('BatchResult', ['invoice_id', 'filename', 'pdf', 'seconds', 'error'])
+
+
+def default_workers():
+    return getattr(settings, 'INVOICE_RENDER_WORKERS', None)
+
+
+def ensure_renderer():
+    """
+    Raises:
+        RenderError: if weasyprint is not installed
+    """
+    if importlib.util.find_spec('weasyprint') is None:
+        raise RenderError("weasyprint is not installed")
+
+
+def invoice_documents(invoices):
+    """
+    (invoiceId, filename, html) for each invoice, read with two queries.
+
+    HTML is built here so the worker processes never touch the database.
+    """
+    invoices = (invoices
+                .select_related('projectId__account__company')
+                .prefetch_related('payments')
+                .order_by('pk'))
+    for invoice in invoices:
+        company = invoice.projectId.account.company
+        html = render_to_string(INVOICE_TEMPLATE, {
+            'invoice': invoice,
+            'project': invoice.projectId,
+            'client': invoice.projectId.account,
+            'company': company,
+            'payments': list(invoice.payments.all()),
+            'totals': invoice.totals or {},
+        })
+        yield invoice.pk, get_valid_filename(f"invoice-{invoice.number}-{invoice.pk}.pdf"), html
+
+
+def render_documents(documents, workers=None, chunksize=4):
+    """
+    Render documents to PDF on a process pool, yielding results in input order.
+
+    Every worker parses the invoice stylesheet and loads fonts once at start
+    up. workers=0 renders in this process, which is what tests and tiny
+    batches want.
+
+    Args:
+        documents: iterable of (invoiceId, filename, html)
+        workers: pool size, default INVOICE_RENDER_WORKERS or one per CPU
+
+    Yields:
+        BatchResult
+    """
+    stylesheet = render_to_string(INVOICE_STYLESHEET)
+    if workers == 0:
+        pdf_worker.init_worker(stylesheet)
+        for document in documents:
+            yield BatchResult(*pdf_worker.render(document))
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=pdf_worker.init_worker,
+                             initargs=(stylesheet,)) as pool:
+        for result in pool.map(pdf_worker.render, documents, chunksize=chunksize):
+            yield BatchResult(*result)
+
+
+class BatchStats:
+    """Per-document timings of a batch, for sizing the pool."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.results = []
+
+    def add(self, result):
+        self.results.append((result.invoice_id, result.filename, result.seconds, result.error))
+
+    @property
+    def failed(self):
+        return sum(1 for *_, error in self.results if error)
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        seconds = sorted(s for _, _, s, _ in self.results)
+        count = len(seconds)
+        return {
+            'documents': count,
+            'failed': self.failed,
+            'wallSeconds': round(wall, 3),
+            'meanSeconds': round(sum(seconds) / count, 3) if count else 0,
+            'p95Seconds': round(seconds[min(count - 1, int(count * 0.95))], 3) if count else 0,
+            'maxSeconds': round(seconds[-1], 3) if count else 0,
+            'perSecond': round(count / wall, 2) if wall else 0,
+        }
+
+    def timings_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(['invoiceId', 'filename', 'seconds', 'error'])
+        for invoice_id, filename, seconds, error in self.results:
+            writer.writerow([invoice_id, filename, f"{seconds:.4f}", error or ''])
+        return out.getvalue()
+
+
+class _ChunkBuffer:
+    """Write-only file object whose contents are drained between zip entries."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def stream_zip(results, progress=None, stats=None):
+    """
+    Zip rendered PDFs as they arrive, ending with a timings.csv entry.
+
+    Failed documents are listed in timings.csv only.
+
+    Args:
+        results: iterable of BatchResult
+        progress: optional callable(result, stats) invoked per document
+        stats: optional BatchStats to collect timings into
+
+    Yields:
+        bytes: zip archive chunks
+    """
+    stats = stats if stats is not None else BatchStats()
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            stats.add(result)
+            if result.pdf is not None:
+                archive.writestr(result.filename, result.pdf)
+            if progress:
+                progress(result, stats)
+            yield buffer.drain()
+        archive.writestr(TIMINGS_NAME, stats.timings_csv())
+    yield buffer.drain()
+
+
+def save_to_storage(results, prefix, progress=None):
+    """
+    Store rendered PDFs through the default storage backend under prefix/.
+
+    Returns:
+        BatchStats: with timings.csv saved next to the documents
+    """
+    stats = BatchStats()
+    for result in results:
+        stats.add(result)
+        if result.pdf is not None:
+            default_storage.save(f"{prefix}/{result.filename}", ContentFile(result.pdf))
+        if progress:
+            progress(result, stats)
+    default_storage.save(f"{prefix}/{TIMINGS_NAME}", ContentFile(stats.timings_csv().encode()))
+    return stats
+
+
+def company_invoices(company, ids=None, status=None):
+    invoices = Invoice.objects.filter(projectId__account__company=company)
+    if ids is not None:
+        invoices = invoices.filter(pk__in=ids)
+    if status:
+        invoices = invoices.filter(status=status)
+    return invoices
+
+
+def _enqueue(job_id):
+    run_in_background(render_invoice_batch, job_id)
+
+
+def request_invoice_batch(company, invoices):
+    """
+    Queue a zip of invoice PDFs, handed to the render pool once the
+    surrounding transaction commits.
+
+    Returns:
+        InvoiceBatchJob
+    """
+    with transaction.atomic():
+        job = InvoiceBatchJob.objects.create(
+            company=company, invoiceIds=list(invoices.order_by('pk').values_list('pk', flat=True)),
+        )
+        transaction.on_commit(partial(_enqueue, job.pk))
+    return job
+
+
+def render_invoice_batch(job_id):
+    """
+    Render one queued batch on the process pool; runs on a render pool
+    thread or from run_render_jobs.
+
+    Returns:
+        InvoiceBatchJob, or None if another worker already claimed the job
+    """
+    claimed = (InvoiceBatchJob.objects
+               .filter(pk=job_id, status='queued')
+               .update(status='rendering', started_at=timezone.now()))
+    if not claimed:
+        return None
+    job = InvoiceBatchJob.objects.get(pk=job_id)
+    stats = BatchStats()
+    try:
+        invoices = company_invoices(job.company_id, ids=job.invoiceIds)
+        results = render_documents(invoice_documents(invoices), workers=default_workers())
+        with tempfile.TemporaryFile() as archive:
+            for chunk in stream_zip(results, stats=stats):
+                archive.write(chunk)
+            archive.seek(0)
+            job.archive.save(f"invoices-{job.pk}-{timezone.now():%Y%m%d-%H%M%S}.zip", File(archive), save=False)
+    except Exception as exc:
+        logger.exception("Rendering invoice batch %s failed", job.pk)
+        job.status, job.error = 'failed', str(exc)
+    else:
+        job.status, job.error = 'done', None
+    job.summary = stats.summary()
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'archive', 'summary', 'finished_at'])
+    return job
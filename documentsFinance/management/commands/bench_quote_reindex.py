@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from documentsFinance.models import Quote, QuoteLine
+from documentsFinance.ordering import renumber
+from projects.models import Project
+
+
+class Rollback(Exception):
+    pass
+
+
+def per_row_reindex(quote):
+    """
+    The previous reindex: one save(update_fields=['order']) per line.
+    """
+    lines = list(QuoteLine.objects.select_for_update().filter(quoteId=quote).order_by('order', 'id'))
+    for i, line in enumerate(lines, 1):
+        if line.order != i:
+            line.order = i
+            line.save(update_fields=['order'])
+
+
+class Command(BaseCommand):
+    help = "Benchmark set-based QuoteLine.reindex on a large synthetic quote (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=10000)
+        parser.add_argument('--project', type=int, help="Project to attach the quote to (default: first)")
+        parser.add_argument('--per-row', action='store_true', help="Also time the previous per-row reindex")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['project'] is not None:
+            projects = projects.filter(pk=options['project'])
+        project = projects.first()
+        if project is None:
+            raise CommandError("A project is needed to attach the benchmark quote to")
+
+        runs = [
+            ('Set-based', lambda quote: QuoteLine.reindex(quote)),
+            ('bulk_update', lambda quote: renumber(QuoteLine, quote, 1, set_based=False)),
+        ]
+        if options['per_row']:
+            runs.append(('Per-row save', per_row_reindex))
+
+        self.stdout.write(f"Lines: {options['lines']}")
+        for label, reindex in runs:
+            try:
+                with transaction.atomic():
+                    quote = self.make_quote(project, options['lines'], options['seed'])
+                    started = time.perf_counter()
+                    reindex(quote)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    first = QuoteLine.objects.filter(quoteId=quote).values_list('order', flat=True).first()
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(f"{label + ':':14} {elapsed_ms:.1f} ms (first order {first})")
+
+    def make_quote(self, project, count, seed):
+        """Quote whose lines hold sparse, shuffled orders that reindex must compact."""
+        rng = random.Random(seed)
+        quote = Quote.objects.create(projectId=project, number='BENCH', totals={})
+        orders = rng.sample(range(1, count * 50), count)
+        QuoteLine.objects.bulk_create(
+            [QuoteLine(quoteId=quote, order=order, itemRef=f'item-{n}', rate=1) for n, order in enumerate(orders)],
+            batch_size=1000,
+        )
+        return quote
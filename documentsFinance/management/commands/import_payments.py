@@ -0,0 +1,45 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from company.models import Company
+from documentsFinance.payment_import import import_payments, read_statement
+
+
+class Command(BaseCommand):
+    help = "Import a bank statement (CSV or CAMT.053/054 XML) as payments against a company's invoices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Statement file")
+        parser.add_argument('--company', type=int, required=True, help="Company id whose invoices are matched")
+        parser.add_argument('--format', choices=['csv', 'camt'], help="Default: camt for .xml files, else csv")
+        parser.add_argument('--unmatched', dest='unmatched_path', help="Write every unmatched row to this CSV")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Company {options['company']} does not exist")
+
+        try:
+            with open(options['path'], 'rb') as statement:
+                rows = read_statement(statement, options['path'], options['format'])
+                if options['unmatched_path']:
+                    with open(options['unmatched_path'], 'w', newline='') as out:
+                        writer = csv.writer(out)
+                        writer.writerow(['line', 'reason', 'amount', 'date', 'reference', 'text'])
+                        result = import_payments(rows, company, on_unmatched=lambda row, reason: writer.writerow(
+                            [row.line, reason, row.amount, row.date, row.reference, row.text]))
+                else:
+                    result = import_payments(rows, company)
+        except (OSError, ValueError, SyntaxError) as exc:
+            raise CommandError(f"Cannot import {options['path']}: {exc}")
+
+        self.stdout.write(
+            f"Read {result.rows} row(s): {result.created} payment(s) created, "
+            f"{result.duplicates} duplicate(s), {result.unmatchedCount} unmatched"
+        )
+        if options['unmatched_path']:
+            return
+        for row in result.unmatched:
+            self.stdout.write(f"  line {row['line']}: {row['reason']} ({row['amount']} {row['reference'] or row['text']})")
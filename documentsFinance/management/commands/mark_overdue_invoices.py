@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from documentsFinance.receivables import mark_overdue_invoices
+
+
+class Command(BaseCommand):
+    help = "Mark sent invoices past their due date with an open balance as overdue; run daily"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=parse_date, default=None,
+                            help="Reference date (YYYY-MM-DD), defaults to today")
+
+    def handle(self, *args, **options):
+        updated = mark_overdue_invoices(options['date'])
+        self.stdout.write(f"Marked {updated} invoice(s) overdue")
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from documentsFinance.invoice_batch import (
+    BatchStats, default_workers, ensure_renderer, invoice_documents, render_documents, save_to_storage, stream_zip,
+)
+from documentsFinance.models import Invoice
+from documentsFinance.rendering import RenderError
+
+
+class Command(BaseCommand):
+    help = "Render invoice PDFs in parallel into a zip file or the storage backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Invoice ids (default: all matching the filters)")
+        parser.add_argument('--company', type=int, help="Only invoices of this company id")
+        parser.add_argument('--status', choices=[choice for choice, _ in Invoice.STATUS_CHOICES])
+        parser.add_argument('--workers', type=int, default=default_workers(),
+                            help="Process pool size (default: one per CPU, 0 renders in-process)")
+        output = parser.add_mutually_exclusive_group()
+        output.add_argument('--zip', dest='zip_path', help="Write a zip archive to this path")
+        output.add_argument('--storage', dest='prefix', help="Storage prefix (default invoices/batch-<timestamp>)")
+
+    def handle(self, *args, **options):
+        try:
+            ensure_renderer()
+        except RenderError as exc:
+            raise CommandError(str(exc))
+
+        invoices = Invoice.objects.all()
+        if options['ids']:
+            invoices = invoices.filter(pk__in=options['ids'])
+        if options['company'] is not None:
+            invoices = invoices.filter(projectId__account__company_id=options['company'])
+        if options['status']:
+            invoices = invoices.filter(status=options['status'])
+        total = invoices.count()
+        if not total:
+            raise CommandError("No invoices match")
+
+        def progress(result, stats):
+            outcome = f"FAILED {result.error}" if result.error else f"{result.seconds:.2f}s"
+            self.stdout.write(f"[{len(stats.results)}/{total}] {result.filename} {outcome}")
+
+        results = render_documents(invoice_documents(invoices), workers=options['workers'])
+        if options['zip_path']:
+            stats = BatchStats()
+            with open(options['zip_path'], 'wb') as out:
+                for chunk in stream_zip(results, progress=progress, stats=stats):
+                    out.write(chunk)
+            target = options['zip_path']
+        else:
+            target = options['prefix'] or f"invoices/batch-{timezone.now():%Y%m%d-%H%M%S}"
+            stats = save_to_storage(results, target, progress=progress)
+
+        summary = stats.summary()
+        self.stdout.write(
+            f"Rendered {summary['documents'] - summary['failed']}/{summary['documents']} into {target} "
+            f"in {summary['wallSeconds']}s ({summary['perSecond']}/s); per document "
+            f"mean {summary['meanSeconds']}s, p95 {summary['p95Seconds']}s, max {summary['maxSeconds']}s"
+        )
+        if summary['failed']:
+            raise CommandError(f"{summary['failed']} invoice(s) failed, see timings.csv")
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from documentsFinance.invoice_batch import render_invoice_batch
+from documentsFinance.models import InvoiceBatchJob, RenderJob
+from documentsFinance.rendering import render_job
+
+
+class Command(BaseCommand):
+    help = ("Render queued quote PDFs and invoice batches in this process, "
+            "e.g. jobs left behind by a restarted worker")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=int, default=15,
+                            help="Requeue jobs stuck in 'rendering' for longer than this")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        requeued = sum(
+            model.objects.filter(status='rendering', started_at__lt=cutoff).update(status='queued', started_at=None)
+            for model in (RenderJob, InvoiceBatchJob)
+        )
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        done = failed = 0
+        for job_id in RenderJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True):
+            job = render_job(job_id)
+            if job is None:
+                continue
+            if job.status == 'done':
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Job {job.pk} (quote {job.quoteId_id}) failed: {job.error}")
+        for job_id in InvoiceBatchJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True):
+            job = render_invoice_batch(job_id)
+            if job is None:
+                continue
+            if job.status == 'done':
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Invoice batch {job.pk} failed: {job.error}")
+        self.stdout.write(f"Rendered {done} job(s), {failed} failed")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentsFinance', '0002_initial'),
+        ('projects', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subrent',
+            index=models.Index(fields=['dateFrom', 'dateTo'], name='idx_subrent_window'),
+        ),
+    ]
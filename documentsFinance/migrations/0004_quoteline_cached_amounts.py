@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:13
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+CENT = Decimal('0.01')
+
+
+def backfill_amounts(apps, schema_editor):
+    QuoteLine = apps.get_model('documentsFinance', 'QuoteLine')
+    batch = []
+    for line in QuoteLine.objects.only('qty', 'rate', 'days', 'discount').iterator(chunk_size=2000):
+        gross = (Decimal(line.qty) * line.rate * line.days).quantize(CENT, rounding=ROUND_HALF_UP)
+        line.grossAmount = gross
+        line.discountAmount = (gross * line.discount / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        batch.append(line)
+        if len(batch) == 2000:
+            QuoteLine.objects.bulk_update(batch, ['grossAmount', 'discountAmount'])
+            batch = []
+    if batch:
+        QuoteLine.objects.bulk_update(batch, ['grossAmount', 'discountAmount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentsFinance', '0003_subrent_idx_subrent_window'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quoteline',
+            name='discountAmount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Discount on the gross amount', max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='quoteline',
+            name='grossAmount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='qty x rate x days', max_digits=14),
+        ),
+        migrations.RunPython(backfill_amounts, migrations.RunPython.noop),
+    ]
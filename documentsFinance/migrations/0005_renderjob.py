@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentsFinance', '0004_quoteline_cached_amounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contentHash', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('rendering', 'Rendering'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('pdf', models.FileField(blank=True, null=True, upload_to='quotes/renders/')),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('quoteId', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='render_jobs', to='documentsFinance.quote')),
+            ],
+            options={
+                'verbose_name_plural': 'render jobs',
+                'indexes': [models.Index(fields=['quoteId', 'contentHash'], name='idx_renderjob_quote_hash'), models.Index(fields=['status', 'created_at'], name='idx_renderjob_status')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:26
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+CENT = Decimal('0.01')
+
+
+def _total(totals):
+    try:
+        return Decimal(str((totals or {}).get('total') or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, TypeError, ValueError, AttributeError):
+        return Decimal(0)
+
+
+def backfill_balances(apps, schema_editor):
+    Invoice = apps.get_model('documentsFinance', 'Invoice')
+    Payment = apps.get_model('documentsFinance', 'Payment')
+    paid = dict(Payment.objects.order_by().values('invoiceId').annotate(total=Sum('amount')).values_list('invoiceId', 'total'))
+    batch = []
+    for invoice in Invoice.objects.only('totals').iterator(chunk_size=2000):
+        invoice.totalAmount = _total(invoice.totals)
+        invoice.paidAmount = paid.get(invoice.pk) or Decimal(0)
+        invoice.balance = invoice.totalAmount - invoice.paidAmount
+        batch.append(invoice)
+        if len(batch) == 2000:
+            Invoice.objects.bulk_update(batch, ['totalAmount', 'paidAmount', 'balance'])
+            batch = []
+    if batch:
+        Invoice.objects.bulk_update(batch, ['totalAmount', 'paidAmount', 'balance'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentsFinance', '0005_renderjob'),
+        ('projects', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='paidAmount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='totalAmount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'dueDate'], name='idx_invoice_status_due'),
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
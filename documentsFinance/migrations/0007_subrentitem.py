@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:31
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _quantities(items):
+    # Same tolerant reading as documentsFinance.subrents.subrent_quantities:
+    # legacy entries that are not dicts or hold non-integer ids or
+    # quantities are skipped rather than failing the migration
+    quantities = defaultdict(int)
+    for entry in items if isinstance(items, list) else []:
+        if not isinstance(entry, dict) or not entry.get('catalogItemId'):
+            continue
+        catalog_id, qty = _as_int(entry['catalogItemId']), _as_int(entry.get('qty', 1))
+        if catalog_id is not None and qty is not None:
+            quantities[catalog_id] += qty
+    return quantities
+
+
+def backfill_items(apps, schema_editor):
+    SubRent = apps.get_model('documentsFinance', 'SubRent')
+    SubRentItem = apps.get_model('documentsFinance', 'SubRentItem')
+    CatalogItem = apps.get_model('equipment', 'CatalogItem')
+    known = set(CatalogItem.objects.values_list('pk', flat=True))
+    batch = []
+    for subrent in SubRent.objects.only('items', 'dateFrom', 'dateTo').iterator(chunk_size=2000):
+        quantities = _quantities(subrent.items)
+        batch.extend(
+            SubRentItem(subRentId_id=subrent.pk, catalogItem_id=catalog_id, qty=qty,
+                        dateFrom=subrent.dateFrom, dateTo=subrent.dateTo)
+            for catalog_id, qty in quantities.items() if qty > 0 and catalog_id in known
+        )
+        if len(batch) >= 2000:
+            SubRentItem.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        SubRentItem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentsFinance', '0006_invoice_balances'),
+        ('equipment', '0002_remove_kit_upright_only_kititem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubRentItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qty', models.PositiveIntegerField(default=1)),
+                ('dateFrom', models.DateTimeField()),
+                ('dateTo', models.DateTimeField()),
+                ('catalogItem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subrent_items', to='equipment.catalogitem')),
+                ('subRentId', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subrent_items', to='documentsFinance.subrent')),
+            ],
+            options={
+                'verbose_name_plural': 'sub rent items',
+                'indexes': [models.Index(fields=['catalogItem', 'dateFrom', 'dateTo'], name='idx_subrentitem_item_window')],
+                'constraints': [models.UniqueConstraint(fields=('subRentId', 'catalogItem'), name='unique_subrent_catalog_item')],
+            },
+        ),
+        migrations.RunPython(backfill_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 22:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0004_company_owner'),
+        ('documentsFinance', '0007_subrentitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoiceIds', models.JSONField(help_text='Ids of the invoices in the batch')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('rendering', 'Rendering'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('archive', models.FileField(blank=True, null=True, upload_to='invoices/batches/')),
+                ('summary', models.JSONField(blank=True, help_text='Render timings of the finished batch', null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoice_batch_jobs', to='company.company')),
+            ],
+            options={
+                'verbose_name_plural': 'invoice batch jobs',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='idx_invoicebatchjob_status')],
+            },
+        ),
+    ]
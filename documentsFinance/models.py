@@ -1,6 +1,12 @@
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
-from django.db.models import UniqueConstraint, Max, F, CheckConstraint, Q
+from django.db.models import UniqueConstraint, Max, CheckConstraint, Q
+
+from .ordering import (
+    GAPPED_MAX_ORDER, gapped_order_at, is_gapped, next_gapped_order, renumber, reorder, shift_orders,
+)
+from .receivables import invoice_total, refresh_invoice_balances
+from .totals import line_amounts
 
 
 class Quote(models.Model):
@@ -20,6 +26,7 @@ class Quote(models.Model):
     number = models.CharField(max_length=50)
     version = models.PositiveIntegerField(default=1)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    # Maintained from QuoteLine changes, see documentsFinance.totals
     totals = models.JSONField(help_text="JSON containing subtotal, tax, discount, and total amounts")
     pdf = models.FileField(upload_to='quotes/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -31,6 +38,40 @@ class Quote(models.Model):
     class Meta:
         verbose_name_plural = "quotes"
 
+    def new_version(self):
+        """
+        Branch a new draft version of this quote with copies of its sections and lines.
+
+        Rows are copied with bulk_create, skipping the ordering logic in
+        QuoteLine/QuoteSection.save(): the source orders are already valid
+        and unique within the quote. Cached line amounts and totals are
+        copied as they are.
+
+        Returns:
+            Quote: the new version, numbered after the highest existing one
+        """
+        with transaction.atomic():
+            # Serializes concurrent branching of the same quote
+            source = Quote.objects.select_for_update().get(pk=self.pk)
+            latest = (Quote.objects
+                      .filter(projectId_id=source.projectId_id, number=source.number)
+                      .aggregate(max_v=Max("version"))["max_v"] or source.version)
+            clone = Quote.objects.create(
+                projectId_id=source.projectId_id, number=source.number, version=latest + 1,
+                status='draft', totals=source.totals,
+            )
+            QuoteSection.objects.bulk_create(
+                [QuoteSection(quoteId=clone, **fields) for fields in
+                 source.sections.order_by().values('order', 'name', 'description')],
+                batch_size=1000,
+            )
+            QuoteLine.objects.bulk_create(
+                [QuoteLine(quoteId=clone, **fields) for fields in
+                 source.lines.order_by().values(*QuoteLine.COPIED_FIELDS)],
+                batch_size=1000,
+            )
+        return clone
+
 class QuoteLine(models.Model):
     """
     Model for individual line items in quotes with ordered positioning.
@@ -39,9 +80,25 @@ class QuoteLine(models.Model):
     - When order=None on creation: automatically appended at the end (max(order)+1)
     - When order is specified on creation: inserted at that position, shifting existing items
     - When updating order: appropriate shifting occurs to maintain consistent ordering
+
+    In 'gapped' mode orders are spaced ORDER_GAP apart instead:
+    insert_at()/move_to() store the midpoint between the neighbours of the
+    target position and only renumber the quote when no gap is left, so a
+    typical insert or move writes a single row. The mode comes from the
+    QUOTE_ORDERING_MODE setting ('shift' by default); a subclass or proxy
+    model can pin it by setting ORDERING_MODE.
     """
     # Maximum allowed order value to prevent integer overflow issues
     MAX_ORDER = 1000000
+    # 'shift' keeps orders dense (1..n); 'gapped' keeps them ORDER_GAP apart;
+    # None follows settings.QUOTE_ORDERING_MODE
+    ORDERING_MODE = None
+    ORDER_GAP = 1024
+    # Fields carried over when a quote is branched into a new version
+    COPIED_FIELDS = (
+        'order', 'itemRef', 'qty', 'rate', 'days', 'discount', 'taxRuleId_id', 'notes',
+        'grossAmount', 'discountAmount',
+    )
 
     quoteId = models.ForeignKey(Quote, on_delete=models.CASCADE, related_name='lines')
     order = models.PositiveIntegerField(null=True, blank=True)  # Intentionally no default
@@ -52,6 +109,11 @@ class QuoteLine(models.Model):
     discount = models.DecimalField(max_digits=5, decimal_places=2, default=0, help_text="Discount percentage")
     taxRuleId = models.ForeignKey('refdata.TaxRule', on_delete=models.SET_NULL, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    # Cached by save() so quote totals aggregate without recomputing each line
+    grossAmount = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False,
+                                      help_text="qty x rate x days")
+    discountAmount = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False,
+                                         help_text="Discount on the gross amount")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -80,8 +142,9 @@ class QuoteLine(models.Model):
         if self.order is not None:
             if self.order <= 0:
                 raise ValidationError({"order": "Order must be a positive integer"})
-            if self.order > self.MAX_ORDER:
-                raise ValidationError({"order": f"Order cannot exceed {self.MAX_ORDER}"})
+            max_order = GAPPED_MAX_ORDER - 1 if is_gapped(self) else self.MAX_ORDER
+            if self.order > max_order:
+                raise ValidationError({"order": f"Order cannot exceed {max_order}"})
 
     def save(self, *args, **kwargs):
         """
@@ -93,10 +156,16 @@ class QuoteLine(models.Model):
         - Updates that change order (with appropriate shifting)
         """
         self.clean()
+        self.grossAmount, self.discountAmount = line_amounts(self.qty, self.rate, self.days, self.discount)
         is_create = self.pk is None
 
         with transaction.atomic():
-            if is_create:
+            if is_gapped(self):
+                # Gapped keys are placed by insert_at()/move_to(); other rows never shift
+                if self.order is None:
+                    self.order = (next_gapped_order(QuoteLine, self.quoteId) if is_create else
+                                  QuoteLine.objects.values_list('order', flat=True).get(pk=self.pk))
+            elif is_create:
                 # Creation
                 if self.order is None:
                     # Append at end: max(order) + 1
@@ -109,10 +178,7 @@ class QuoteLine(models.Model):
                     self.order = last + 1
                 else:
                     # Insert at specific position: shift all >= self.order
-                    (QuoteLine.objects
-                     .select_for_update()
-                     .filter(quoteId=self.quoteId, order__gte=self.order)
-                     .update(order=F("order") + 1))
+                    shift_orders(QuoteLine, self.quoteId, 1, order__gte=self.order)
             else:
                 # Update existing record
                 # Get old record with select_for_update to prevent race conditions
@@ -122,27 +188,15 @@ class QuoteLine(models.Model):
                     # If order not specified, keep previous order
                     self.order = old.order
                 elif self.order != old.order:
-                    # Only process if order actually changed
+                    # Only process if order actually changed; vacate the old
+                    # slot first so the shifted range can take it
+                    QuoteLine.objects.filter(pk=self.pk).update(order=None)
                     if self.order < old.order:
                         # Moving up: shift [new, old-1] down by +1
-                        (QuoteLine.objects
-                         .select_for_update()
-                         .filter(
-                            quoteId=self.quoteId,
-                            order__gte=self.order,
-                            order__lt=old.order,
-                        )
-                         .update(order=F("order") + 1))
+                        shift_orders(QuoteLine, self.quoteId, 1, order__gte=self.order, order__lt=old.order)
                     else:
                         # Moving down: shift [old+1, new] up by -1
-                        (QuoteLine.objects
-                         .select_for_update()
-                         .filter(
-                            quoteId=self.quoteId,
-                            order__gt=old.order,
-                            order__lte=self.order,
-                        )
-                         .update(order=F("order") - 1))
+                        shift_orders(QuoteLine, self.quoteId, -1, order__gt=old.order, order__lte=self.order)
 
             super().save(*args, **kwargs)
 
@@ -160,8 +214,11 @@ class QuoteLine(models.Model):
         Returns:
             The newly created QuoteLine
         """
-        line = cls(quoteId=quote, order=position, **fields)
-        line.save()
+        with transaction.atomic():
+            if is_gapped(cls):
+                position = gapped_order_at(cls, quote, position)
+            line = cls(quoteId=quote, order=position, **fields)
+            line.save()
         return line
 
     def move_to(self, position):
@@ -174,26 +231,48 @@ class QuoteLine(models.Model):
         Returns:
             self (for method chaining)
         """
-        self.order = position
-        self.save()
+        with transaction.atomic():
+            if is_gapped(self):
+                position = gapped_order_at(type(self), self.quoteId, position, exclude_pk=self.pk)
+            self.order = position
+            self.save()
         return self
 
+    @classmethod
+    def bulk_reorder(cls, quote, ordered_ids):
+        """
+        Apply a full new sequence of lines in a single transaction.
+
+        Orders are renumbered 1..n (or ORDER_GAP apart in gapped mode) with
+        one offset update and one bulk_update, whatever the permutation.
+
+        Args:
+            quote: The Quote object or ID
+            ordered_ids: ids of every line of the quote, in their new order
+
+        Raises:
+            ValueError: if ordered_ids is not a permutation of the quote's lines
+        """
+        step = cls.ORDER_GAP if is_gapped(cls) else 1
+        reorder(cls, quote, ordered_ids, step)
+
     @classmethod
     def reindex(cls, quote):
         """
         Reindex all lines to remove gaps.
 
+        Renumbers the whole quote in a couple of set-based statements
+        without going through save(). In gapped mode orders are respaced
+        ORDER_GAP apart instead of 1..n.
+
         Args:
             quote: The Quote object or ID
+
+        Returns:
+            int: number of lines renumbered
         """
-        with transaction.atomic():
-            lines = list(cls.objects.select_for_update()
-                        .filter(quoteId=quote)
-                        .order_by('order', 'id'))
-            for i, line in enumerate(lines, 1):
-                if line.order != i:
-                    line.order = i
-                    line.save(update_fields=['order'])
+        step = cls.ORDER_GAP if is_gapped(cls) else 1
+        return renumber(cls, quote, step)
 
 
 class QuoteSection(models.Model):
@@ -204,9 +283,20 @@ class QuoteSection(models.Model):
     - When order=None on creation: automatically appended at the end (max(order)+1)
     - When order is specified on creation: inserted at that position, shifting existing items
     - When updating order: appropriate shifting occurs to maintain consistent ordering
+
+    In 'gapped' mode orders are spaced ORDER_GAP apart instead:
+    insert_at()/move_to() store the midpoint between the neighbours of the
+    target position and only renumber the quote when no gap is left, so a
+    typical insert or move writes a single row. The mode comes from the
+    QUOTE_ORDERING_MODE setting ('shift' by default); a subclass or proxy
+    model can pin it by setting ORDERING_MODE.
     """
     # Maximum allowed order value to prevent integer overflow issues
     MAX_ORDER = 1000000
+    # 'shift' keeps orders dense (1..n); 'gapped' keeps them ORDER_GAP apart;
+    # None follows settings.QUOTE_ORDERING_MODE
+    ORDERING_MODE = None
+    ORDER_GAP = 1024
 
     quoteId = models.ForeignKey(Quote, on_delete=models.CASCADE, related_name='sections')
     order = models.PositiveIntegerField(null=True, blank=True)  # Intentionally no default
@@ -235,8 +325,9 @@ class QuoteSection(models.Model):
         if self.order is not None:
             if self.order <= 0:
                 raise ValidationError({"order": "Order must be a positive integer"})
-            if self.order > self.MAX_ORDER:
-                raise ValidationError({"order": f"Order cannot exceed {self.MAX_ORDER}"})
+            max_order = GAPPED_MAX_ORDER - 1 if is_gapped(self) else self.MAX_ORDER
+            if self.order > max_order:
+                raise ValidationError({"order": f"Order cannot exceed {max_order}"})
 
     def save(self, *args, **kwargs):
         """
@@ -251,7 +342,12 @@ class QuoteSection(models.Model):
         is_create = self.pk is None
 
         with transaction.atomic():
-            if is_create:
+            if is_gapped(self):
+                # Gapped keys are placed by insert_at()/move_to(); other rows never shift
+                if self.order is None:
+                    self.order = (next_gapped_order(QuoteSection, self.quoteId) if is_create else
+                                  QuoteSection.objects.values_list('order', flat=True).get(pk=self.pk))
+            elif is_create:
                 # Creation
                 if self.order is None:
                     # Append at end: max(order) + 1
@@ -264,10 +360,7 @@ class QuoteSection(models.Model):
                     self.order = last + 1
                 else:
                     # Insert at specific position: shift all >= self.order
-                    (QuoteSection.objects
-                     .select_for_update()
-                     .filter(quoteId=self.quoteId, order__gte=self.order)
-                     .update(order=F("order") + 1))
+                    shift_orders(QuoteSection, self.quoteId, 1, order__gte=self.order)
             else:
                 # Update existing record
                 # Get old record with select_for_update to prevent race conditions
@@ -277,27 +370,15 @@ class QuoteSection(models.Model):
                     # If order not specified, keep previous order
                     self.order = old.order
                 elif self.order != old.order:
-                    # Only process if order actually changed
+                    # Only process if order actually changed; vacate the old
+                    # slot first so the shifted range can take it
+                    QuoteSection.objects.filter(pk=self.pk).update(order=None)
                     if self.order < old.order:
                         # Moving up: shift [new, old-1] down by +1
-                        (QuoteSection.objects
-                         .select_for_update()
-                         .filter(
-                            quoteId=self.quoteId,
-                            order__gte=self.order,
-                            order__lt=old.order,
-                        )
-                         .update(order=F("order") + 1))
+                        shift_orders(QuoteSection, self.quoteId, 1, order__gte=self.order, order__lt=old.order)
                     else:
                         # Moving down: shift [old+1, new] up by -1
-                        (QuoteSection.objects
-                         .select_for_update()
-                         .filter(
-                            quoteId=self.quoteId,
-                            order__gt=old.order,
-                            order__lte=self.order,
-                        )
-                         .update(order=F("order") - 1))
+                        shift_orders(QuoteSection, self.quoteId, -1, order__gt=old.order, order__lte=self.order)
 
             super().save(*args, **kwargs)
 
@@ -315,8 +396,11 @@ class QuoteSection(models.Model):
         Returns:
             The newly created QuoteSection
         """
-        section = cls(quoteId=quote, order=position, **fields)
-        section.save()
+        with transaction.atomic():
+            if is_gapped(cls):
+                position = gapped_order_at(cls, quote, position)
+            section = cls(quoteId=quote, order=position, **fields)
+            section.save()
         return section
 
     def move_to(self, position):
@@ -329,29 +413,115 @@ class QuoteSection(models.Model):
         Returns:
             self (for method chaining)
         """
-        self.order = position
-        self.save()
+        with transaction.atomic():
+            if is_gapped(self):
+                position = gapped_order_at(type(self), self.quoteId, position, exclude_pk=self.pk)
+            self.order = position
+            self.save()
         return self
 
+    @classmethod
+    def bulk_reorder(cls, quote, ordered_ids):
+        """
+        Apply a full new sequence of sections in a single transaction.
+
+        Orders are renumbered 1..n (or ORDER_GAP apart in gapped mode) with
+        one offset update and one bulk_update, whatever the permutation.
+
+        Args:
+            quote: The Quote object or ID
+            ordered_ids: ids of every section of the quote, in their new order
+
+        Raises:
+            ValueError: if ordered_ids is not a permutation of the quote's sections
+        """
+        step = cls.ORDER_GAP if is_gapped(cls) else 1
+        reorder(cls, quote, ordered_ids, step)
+
     @classmethod
     def reindex(cls, quote):
         """
         Reindex all sections to remove gaps.
 
+        Renumbers the whole quote in a couple of set-based statements
+        without going through save(). In gapped mode orders are respaced
+        ORDER_GAP apart instead of 1..n.
+
         Args:
             quote: The Quote object or ID
+
+        Returns:
+            int: number of sections renumbered
         """
-        with transaction.atomic():
-            sections = list(cls.objects.select_for_update()
-                            .filter(quoteId=quote)
-                            .order_by('order', 'id'))
-            for i, section in enumerate(sections, 1):
-                if section.order != i:
-                    section.order = i
-                    section.save(update_fields=['order'])
+        step = cls.ORDER_GAP if is_gapped(cls) else 1
+        return renumber(cls, quote, step)
 
 
 
+class RenderJob(models.Model):
+    """
+    Background PDF render of a quote.
+
+    Jobs are keyed by a hash of everything the PDF shows, so an unchanged
+    quote reuses its last finished render instead of queueing a new one.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('rendering', 'Rendering'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    quoteId = models.ForeignKey(Quote, on_delete=models.CASCADE, related_name='render_jobs')
+    contentHash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    pdf = models.FileField(upload_to='quotes/renders/', blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Render {self.id} of quote {self.quoteId_id} - {self.get_status_display()}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["quoteId", "contentHash"], name="idx_renderjob_quote_hash"),
+            models.Index(fields=["status", "created_at"], name="idx_renderjob_status"),
+        ]
+        verbose_name_plural = "render jobs"
+
+
+class InvoiceBatchJob(models.Model):
+    """
+    Background render of many invoice PDFs into one zip archive.
+
+    The archive is built on the INVOICE_RENDER_WORKERS process pool, off
+    the request path, and ends with timings.csv holding per-document
+    render times.
+    """
+    STATUS_CHOICES = RenderJob.STATUS_CHOICES
+
+    company = models.ForeignKey('company.Company', on_delete=models.CASCADE, related_name='invoice_batch_jobs')
+    invoiceIds = models.JSONField(help_text="Ids of the invoices in the batch")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    archive = models.FileField(upload_to='invoices/batches/', blank=True, null=True)
+    summary = models.JSONField(blank=True, null=True, help_text="Render timings of the finished batch")
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Invoice batch {self.id} ({len(self.invoiceIds)} invoices) - {self.get_status_display()}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="idx_invoicebatchjob_status"),
+        ]
+        verbose_name_plural = "invoice batch jobs"
+
+
 class Invoice(models.Model):
     """
     Model for project invoices.
@@ -370,14 +540,38 @@ class Invoice(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     dueDate = models.DateField()
     totals = models.JSONField(help_text="JSON containing subtotal, tax, discount, and total amounts")
+    # Denormalized from totals and payments for receivables reporting
+    totalAmount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    paidAmount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Invoice {self.number} - {self.get_status_display()}"
 
+    def save(self, *args, **kwargs):
+        """
+        Keep totalAmount in step with totals; paidAmount and balance are
+        recomputed from the payments in the same transaction. An invoice
+        marked paid by hand stays paid.
+        """
+        self.totalAmount = invoice_total(self.totals)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'totals' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'totalAmount'}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            refresh_invoice_balances([self.pk], reopen=False)
+            self.paidAmount, self.balance, self.status = (
+                Invoice.objects.filter(pk=self.pk).values_list('paidAmount', 'balance', 'status').get()
+            )
+
     class Meta:
         verbose_name_plural = "invoices"
+        indexes = [
+            models.Index(fields=['status', 'dueDate'], name='idx_invoice_status_due'),
+        ]
 
 class Payment(models.Model):
     """
@@ -424,3 +618,33 @@ class SubRent(models.Model):
 
     class Meta:
         verbose_name_plural = "sub rents"
+        indexes = [
+            models.Index(fields=["dateFrom", "dateTo"], name="idx_subrent_window"),
+        ]
+
+
+class SubRentItem(models.Model):
+    """
+    One catalog item supplied by a SubRent, normalized from SubRent.items.
+
+    Rows are rewritten from the JSON whenever the SubRent is saved; the
+    window is copied from the SubRent so availability can be aggregated
+    per catalog item without a join.
+    """
+    subRentId = models.ForeignKey(SubRent, on_delete=models.CASCADE, related_name='subrent_items')
+    catalogItem = models.ForeignKey('equipment.CatalogItem', on_delete=models.CASCADE, related_name='subrent_items')
+    qty = models.PositiveIntegerField(default=1)
+    dateFrom = models.DateTimeField()
+    dateTo = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.qty} x {self.catalogItem_id} (SubRent {self.subRentId_id})"
+
+    class Meta:
+        verbose_name_plural = "sub rent items"
+        constraints = [
+            UniqueConstraint(fields=['subRentId', 'catalogItem'], name='unique_subrent_catalog_item'),
+        ]
+        indexes = [
+            models.Index(fields=['catalogItem', 'dateFrom', 'dateTo'], name='idx_subrentitem_item_window'),
+        ]
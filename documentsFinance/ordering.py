@@ -0,0 +1,250 @@
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Max
+
+# Ordering modes for QuoteLine and QuoteSection
+ORDERING_SHIFT = 'shift'
+ORDERING_GAPPED = 'gapped'
+
+# Gapped keys stay strictly below 2**30, which leaves room for the
+# temporary offset used while renumbering within a 32-bit column
+GAPPED_MAX_ORDER = 2 ** 30
+# Orders (parked ones included) must stay below this on PostgreSQL's int4
+ORDER_COLUMN_LIMIT = 2 ** 31
+
+BULK_BATCH_SIZE = 1000
+
+
+def is_gapped(model):
+    """
+    Whether a QuoteLine or QuoteSection class (or instance) uses gapped orders.
+
+    The model's ORDERING_MODE wins when set; otherwise the
+    QUOTE_ORDERING_MODE setting decides, defaulting to 'shift'.
+    """
+    mode = model.ORDERING_MODE or getattr(settings, 'QUOTE_ORDERING_MODE', ORDERING_SHIFT)
+    return mode == ORDERING_GAPPED
+
+
+def parking_offset(last, count, step):
+    """
+    Offset that moves a quote's rows past both their current maximum and
+    the final range step..count * step, so rewriting them never collides.
+
+    Raises:
+        ValueError: if the final or parked orders would not fit the column
+    """
+    offset = max(last, count * step)
+    if count * step >= GAPPED_MAX_ORDER or last + offset >= ORDER_COLUMN_LIMIT:
+        raise ValueError("Too many rows to renumber this quote")
+    return offset
+
+
+def shift_orders(model, quote, delta, **range_filter):
+    """
+    Add delta to the orders of a range of a quote's rows.
+
+    A plain update(order=F('order') + 1) trips the (quoteId, order) unique
+    constraint row by row whenever orders are dense, so the range is first
+    parked above every shift-mode order and then moved to its final place.
+
+    Args:
+        model: QuoteLine or QuoteSection
+        quote: The Quote object or ID
+        delta: amount to add to each order
+        **range_filter: order lookups selecting the rows, e.g. order__gte=3
+    """
+    with transaction.atomic():
+        model.objects.filter(quoteId=quote, **range_filter).update(order=F('order') + GAPPED_MAX_ORDER)
+        (model.objects
+         .filter(quoteId=quote, order__gte=GAPPED_MAX_ORDER)
+         .update(order=F('order') - GAPPED_MAX_ORDER + delta))
+
+
+def apply_orders(model, quote, pks, step):
+    """
+    Store step, 2 * step, ... as the orders of the given rows, in sequence.
+
+    Runs in two statements: every row of the quote is first moved past both
+    the current maximum and the final range, then the final values are
+    written with one bulk_update, so the (quoteId, order) unique constraint
+    never sees a duplicate half-way through.
+
+    Args:
+        model: QuoteLine or QuoteSection
+        quote: The Quote object or ID
+        pks: primary keys of all rows of the quote, in their new sequence
+        step: distance between consecutive orders
+    """
+    rows = model.objects.filter(quoteId=quote)
+    with transaction.atomic():
+        last = rows.aggregate(max_o=Max('order'))['max_o'] or 0
+        rows.update(order=F('order') + parking_offset(last, len(pks), step))
+        model.objects.bulk_update(
+            [model(pk=pk, order=i * step) for i, pk in enumerate(pks, 1)],
+            ['order'], batch_size=BULK_BATCH_SIZE,
+        )
+
+
+def _supports_update_from(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 33, 0)
+    return False
+
+
+def _renumber_sql(model, quote_id, step):
+    """
+    Final pass of renumber() as one UPDATE ... FROM over ROW_NUMBER().
+    """
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    order = qn(model._meta.get_field('order').column)
+    quote_col = qn(model._meta.get_field('quoteId').column)
+    pk = qn(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {order} = ranked.rn * %s "
+            f"FROM (SELECT {pk} AS row_id, ROW_NUMBER() OVER (ORDER BY {order}, {pk}) AS rn "
+            f"      FROM {table} WHERE {quote_col} = %s) AS ranked "
+            f"WHERE {table}.{pk} = ranked.row_id",
+            [step, quote_id],
+        )
+        return cursor.rowcount
+
+
+def renumber(model, quote, step, set_based=True):
+    """
+    Rewrite the orders of a quote's rows to step, 2 * step, ... keeping their sequence.
+
+    Set-based: one aggregate, one offset update past the final range and
+    one UPDATE ... FROM (ROW_NUMBER() ...) where the database supports it,
+    otherwise the ids are read once and written back with bulk_update.
+    No row goes through the model's save().
+
+    Args:
+        model: QuoteLine or QuoteSection
+        quote: The Quote object or ID
+        step: distance between consecutive orders
+        set_based: use the window-function update when available
+
+    Returns:
+        int: number of rows renumbered
+    """
+    quote_id = getattr(quote, 'pk', quote)
+    rows = model.objects.filter(quoteId=quote_id)
+    connection = connections[router.db_for_write(model)]
+    with transaction.atomic(using=connection.alias):
+        stats = rows.aggregate(max_o=Max('order'), n=Count('pk'))
+        if not stats['n']:
+            return 0
+        if not (set_based and _supports_update_from(connection)):
+            pks = list(rows.select_for_update().order_by('order', 'id').values_list('pk', flat=True))
+            apply_orders(model, quote_id, pks, step)
+            return len(pks)
+        rows.update(order=F('order') + parking_offset(stats['max_o'] or 0, stats['n'], step))
+        return _renumber_sql(model, quote_id, step)
+
+
+def reorder(model, quote, ordered_ids, step):
+    """
+    Apply a full new sequence of a quote's rows, as sent by a drag-and-drop editor.
+
+    Args:
+        model: QuoteLine or QuoteSection
+        quote: The Quote object or ID
+        ordered_ids: ids of every row of the quote, in their new sequence
+        step: distance between consecutive orders
+
+    Raises:
+        ValueError: if ordered_ids is not a permutation of the quote's rows
+    """
+    ordered_ids = [int(pk) for pk in ordered_ids]
+    with transaction.atomic():
+        current = set(model.objects.select_for_update()
+                      .filter(quoteId=quote)
+                      .values_list('pk', flat=True))
+        if len(ordered_ids) != len(current) or set(ordered_ids) != current:
+            raise ValueError("ordered_ids must list every row of the quote exactly once")
+        if ordered_ids:
+            apply_orders(model, quote, ordered_ids, step)
+
+
+def lock_quote(model, quote):
+    """
+    Lock the parent Quote row of a quote's lines or sections.
+
+    Gapped keys are derived from the neighbours' orders, so two concurrent
+    inserts into the same quote must not read them at the same time; the
+    lock serializes them until the caller's transaction ends.
+    """
+    quote_model = model._meta.get_field('quoteId').related_model
+    list(quote_model.objects.select_for_update().filter(pk=getattr(quote, 'pk', quote)).values_list('pk', flat=True))
+
+
+def next_gapped_order(model, quote):
+    """
+    Order for a row appended at the end of a gapped quote.
+
+    Must run inside the transaction that saves the row.
+    """
+    lock_quote(model, quote)
+    last = model.objects.filter(quoteId=quote).aggregate(max_o=Max('order'))['max_o'] or 0
+    if last + model.ORDER_GAP >= GAPPED_MAX_ORDER:
+        renumber(model, quote, model.ORDER_GAP)
+        last = model.objects.filter(quoteId=quote).count() * model.ORDER_GAP
+        if last + model.ORDER_GAP >= GAPPED_MAX_ORDER:
+            raise ValueError("No free order key left for this quote")
+    return last + model.ORDER_GAP
+
+
+def gapped_order_at(model, quote, position, exclude_pk=None):
+    """
+    Free order key that places a row at the given 1-based position.
+
+    Only the two neighbours of the target position are read; the key is
+    their midpoint. When they are adjacent the quote is renumbered to
+    ORDER_GAP spacing first, which is the only case touching other rows.
+
+    Args:
+        model: QuoteLine or QuoteSection
+        quote: The Quote object or ID
+        position: 1-based position among the other rows of the quote
+        exclude_pk: the row being moved, ignored when counting positions
+
+    Returns:
+        int: order key to store on the row
+
+    Must run inside the transaction that saves the row, which holds the
+    lock on the parent quote until then.
+    """
+    position = max(int(position), 1)
+    lock_quote(model, quote)
+    for attempt in range(2):
+        siblings = model.objects.filter(quoteId=quote)
+        if exclude_pk is not None:
+            siblings = siblings.exclude(pk=exclude_pk)
+        start = max(position - 2, 0)
+        neighbours = list(siblings.order_by('order', 'id')
+                          .values_list('order', flat=True)[start:position])
+
+        if position == 1:
+            before, after = 0, (neighbours[0] if neighbours else None)
+        elif neighbours:
+            before, after = neighbours[0], (neighbours[1] if len(neighbours) > 1 else None)
+        else:
+            # Past the end: append
+            before = siblings.aggregate(max_o=Max('order'))['max_o'] or 0
+            after = None
+
+        if after is None:
+            if before + model.ORDER_GAP < GAPPED_MAX_ORDER:
+                return before + model.ORDER_GAP
+        elif after - before > 1:
+            return (before + after) // 2
+
+        if attempt == 0:
+            renumber(model, quote, model.ORDER_GAP)
+    raise ValueError("No free order key left for this quote")
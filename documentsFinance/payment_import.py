@@ -0,0 +1,275 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from company.csvfiles import open_csv
+
+from .models import Invoice, Payment
+from .receivables import refresh_invoice_balances
+
+BATCH_SIZE = 500
+UNMATCHED_REPORT_LIMIT = 1000
+
+# CSV headers understood for each column, lower-cased
+CSV_COLUMNS = {
+    'amount': ('amount', 'sum', 'credit'),
+    'date': ('date', 'booking date', 'value date', 'bookingdate', 'valuedate'),
+    'reference': ('reference', 'ref', 'invoice', 'invoice number', 'payment reference'),
+    'text': ('description', 'details', 'text', 'remittance', 'message'),
+    'bankRef': ('transaction id', 'transaction', 'id', 'bank reference', 'archive id'),
+}
+DATE_FORMATS = ('%d.%m.%Y', '%d/%m/%Y')
+TOKEN = re.compile(r'[\w/-]+')
+
+StatementRow = namedtuple('StatementRow', ['line', 'amount', 'date', 'reference', 'text', 'bankRef', 'error'])
+ImportResult = namedtuple('ImportResult', ['rows', 'created', 'duplicates', 'unmatched', 'unmatchedCount'])
+
+
+def _normalize(value):
+    return (value or '').strip().upper()
+
+
+def _amount(value):
+    value = (value or '').replace('\xa0', '').replace(' ', '')
+    if ',' in value and '.' not in value:
+        value = value.replace(',', '.')
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() else None
+
+
+def _fits_payment(amount):
+    field = Payment._meta.get_field('amount')
+    try:
+        DecimalValidator(field.max_digits, field.decimal_places)(amount)
+    except ValidationError:
+        return False
+    return True
+
+
+def _date(value):
+    value = (value or '').strip()
+    try:
+        parsed = parse_date(value[:10])
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+    return parsed
+
+
+def _row(line, amount, booked, reference, text, bank_ref):
+    amount_value, date_value = _amount(amount), _date(booked)
+    error = None
+    if amount_value is None:
+        error = 'invalid amount'
+    elif not _fits_payment(amount_value):
+        error = 'amount out of range'
+    elif date_value is None:
+        error = 'invalid date'
+    return StatementRow(line, amount_value, date_value, (reference or '').strip(), (text or '').strip(),
+                        (bank_ref or '').strip() or None, error)
+
+
+def read_csv(fileobj):
+    """
+    Yield StatementRows from a bank CSV export, one line at a time.
+
+    The delimiter is sniffed from the header line and columns are matched
+    by name (see CSV_COLUMNS).
+    """
+    names, reader = open_csv(fileobj)
+    columns = {
+        key: next((names.index(alias) for alias in aliases if alias in names), None)
+        for key, aliases in CSV_COLUMNS.items()
+    }
+    if columns['amount'] is None:
+        raise ValueError("The CSV has no amount column")
+
+    def cell(values, key):
+        index = columns[key]
+        return values[index] if index is not None and index < len(values) else ''
+
+    for line, values in enumerate(reader, 2):
+        if not any(values):
+            continue
+        yield _row(line, cell(values, 'amount'), cell(values, 'date'), cell(values, 'reference'),
+                   cell(values, 'text'), cell(values, 'bankRef'))
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find(element, *path):
+    for name in path:
+        element = next((child for child in element if _local(child.tag) == name), None)
+        if element is None:
+            return None
+    return element
+
+
+def _text(element, *path):
+    found = _find(element, *path)
+    return found.text if found is not None else None
+
+
+def read_camt(fileobj):
+    """
+    Yield StatementRows for the credit entries of a CAMT.053/054 statement.
+
+    The XML is parsed with iterparse and every <Ntry> is dropped from the
+    tree once read, so memory stays flat whatever the statement size.
+    Debits are skipped.
+    """
+    stack = []
+    entries = 0
+    for event, element in iterparse(fileobj, events=('start', 'end')):
+        if event == 'start':
+            stack.append(element)
+            continue
+        stack.pop()
+        if _local(element.tag) != 'Ntry':
+            continue
+        entries += 1
+        if _text(element, 'CdtDbtInd') == 'CRDT':
+            details = _find(element, 'NtryDtls', 'TxDtls')
+            remittance = _find(details, 'RmtInf') if details is not None else None
+            reference = text = None
+            if remittance is not None:
+                reference = _text(remittance, 'Strd', 'CdtrRefInf', 'Ref')
+                text = ' '.join(child.text or '' for child in remittance if _local(child.tag) == 'Ustrd')
+            bank_ref = _text(element, 'AcctSvcrRef') or _text(element, 'NtryRef')
+            if details is not None:
+                bank_ref = _text(details, 'Refs', 'AcctSvcrRef') or bank_ref
+            booked = _text(element, 'BookgDt', 'Dt') or _text(element, 'BookgDt', 'DtTm') or _text(element, 'ValDt', 'Dt')
+            yield _row(entries, _text(element, 'Amt'), booked, reference, text, bank_ref)
+        if stack:
+            stack[-1].remove(element)
+
+
+def read_statement(fileobj, name='', fmt=None):
+    """
+    Statement rows from a CSV or CAMT file, picked by fmt or the file name.
+    """
+    if fmt is None:
+        fmt = 'camt' if name.lower().endswith('.xml') else 'csv'
+    return read_camt(fileobj) if fmt == 'camt' else read_csv(fileobj)
+
+
+class ReconciliationIndex:
+    """
+    Invoice numbers and payment references of one company, loaded once.
+
+    Statement rows are matched with dictionary lookups instead of a query
+    per row.
+    """
+
+    def __init__(self, company):
+        self.invoices = {
+            _normalize(number): pk
+            for pk, number in Invoice.objects.filter(projectId__account__company=company).values_list('pk', 'number')
+        }
+        self.references = {
+            _normalize(ref): invoice_id
+            for ref, invoice_id in Payment.objects
+            .filter(invoiceId__projectId__account__company=company, ref__isnull=False)
+            .values_list('ref', 'invoiceId')
+        }
+
+    def match(self, row):
+        """The invoice id a row pays, or None."""
+        reference = _normalize(row.reference)
+        if reference:
+            if reference in self.invoices:
+                return self.invoices[reference]
+            if reference in self.references:
+                return self.references[reference]
+        for token in TOKEN.findall(row.text.upper()):
+            if token in self.invoices:
+                return self.invoices[token]
+        return None
+
+    def seen(self, bank_ref):
+        return bank_ref is not None and _normalize(bank_ref) in self.references
+
+    def add(self, bank_ref, invoice_id):
+        if bank_ref is not None:
+            self.references[_normalize(bank_ref)] = invoice_id
+
+
+def _flush(batch):
+    with transaction.atomic():
+        Payment.objects.bulk_create(batch)
+        # bulk_create skips the Payment signals
+        refresh_invoice_balances([payment.invoiceId_id for payment in batch])
+
+
+def import_payments(rows, company, on_unmatched=None):
+    """
+    Create payments for the statement rows that match a company invoice.
+
+    Matched rows are written with bulk_create every BATCH_SIZE rows, each
+    batch in its own transaction together with the invoice balances.
+    Rows whose bank reference was already imported are counted as
+    duplicates, so a statement can be imported again safely.
+
+    Args:
+        rows: iterable of StatementRow
+        company: Company whose invoices are matched
+        on_unmatched: optional callable(row, reason) for each unmatched row
+
+    Returns:
+        ImportResult: counts plus the first UNMATCHED_REPORT_LIMIT unmatched
+        rows as {'line', 'reason', 'amount', 'reference', 'text'}
+    """
+    index = ReconciliationIndex(company)
+    batch, unmatched = [], []
+    total = created = duplicates = unmatched_count = 0
+    for row in rows:
+        total += 1
+        reason = row.error
+        invoice_id = None
+        if reason is None:
+            if row.amount <= 0:
+                reason = 'not a credit'
+            elif index.seen(row.bankRef):
+                duplicates += 1
+                continue
+            else:
+                invoice_id = index.match(row)
+                if invoice_id is None:
+                    reason = 'no matching invoice'
+        if reason is not None:
+            unmatched_count += 1
+            if len(unmatched) < UNMATCHED_REPORT_LIMIT:
+                unmatched.append({'line': row.line, 'reason': reason, 'amount': str(row.amount or ''),
+                                  'reference': row.reference, 'text': row.text})
+            if on_unmatched:
+                on_unmatched(row, reason)
+            continue
+
+        index.add(row.bankRef, invoice_id)
+        batch.append(Payment(invoiceId_id=invoice_id, amount=row.amount, date=row.date,
+                             method='bank_transfer', ref=row.bankRef))
+        if len(batch) == BATCH_SIZE:
+            _flush(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        _flush(batch)
+        created += len(batch)
+    return ImportResult(total, created, duplicates, unmatched, unmatched_count)
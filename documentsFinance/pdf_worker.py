@@ -0,0 +1,45 @@
+"""
+Process-pool side of batch PDF rendering.
+
+Kept free of Django imports so workers start cheaply under any
+multiprocessing start method: they receive ready-made HTML and return PDF
+bytes. Each worker parses the shared stylesheet and builds its font
+configuration once, in init_worker(), instead of once per document.
+"""
+import time
+
+_state = {}
+
+
+def init_worker(stylesheet):
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    font_config = FontConfiguration()
+    _state['font_config'] = font_config
+    _state['stylesheets'] = [CSS(string=stylesheet, font_config=font_config)]
+
+
+def write_pdf(html):
+    from weasyprint import HTML
+
+    return HTML(string=html).write_pdf(stylesheets=_state['stylesheets'], font_config=_state['font_config'])
+
+
+def render(job):
+    """
+    Render one document.
+
+    Args:
+        job: (key, filename, html)
+
+    Returns:
+        tuple: (key, filename, pdf bytes or None, seconds, error or None)
+    """
+    key, filename, html = job
+    started = time.perf_counter()
+    try:
+        pdf = write_pdf(html)
+    except Exception as exc:
+        return key, filename, None, time.perf_counter() - started, f"{type(exc).__name__}: {exc}"
+    return key, filename, pdf, time.perf_counter() - started, None
@@ -0,0 +1,174 @@
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import (
+    Case, CharField, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .totals import ZERO, money
+
+# Aging buckets by days past due: (key, first day, last day or None)
+AGING_BUCKETS = (
+    ('0-30', 0, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+)
+
+# Statuses whose balance is owed by the client
+RECEIVABLE_STATUSES = ('sent', 'overdue', 'paid')
+
+AGING_CACHE_TIMEOUT = 5 * 60
+
+
+AGING_VERSION_KEY = 'documentsFinance:aging:version'
+
+
+def _aging_cache_key(today):
+    # Cached reports of every date go stale together when the version moves
+    version = cache.get_or_set(AGING_VERSION_KEY, 1, None)
+    return f"documentsFinance:aging:{version}:{today.isoformat()}"
+
+
+def invalidate_aging_reports():
+    try:
+        cache.incr(AGING_VERSION_KEY)
+    except ValueError:
+        cache.set(AGING_VERSION_KEY, 1, None)
+
+
+def invoice_total(totals):
+    """The grand total of an invoice from its totals JSON, in cents."""
+    try:
+        return money((totals or {}).get('total') or 0)
+    except (InvalidOperation, TypeError, ValueError, AttributeError):
+        return ZERO
+
+
+def refresh_invoice_balances(invoice_ids, reopen=True):
+    """
+    Recompute paidAmount and balance of invoices from their payments.
+
+    One UPDATE with a correlated SUM keeps the stored amounts exact however
+    payments were written, followed by one UPDATE moving fully paid
+    invoices to 'paid' and, with reopen, paid ones with an open balance
+    back to 'sent'/'overdue'. Drafts keep their status.
+
+    Args:
+        invoice_ids: ids of the invoices to refresh
+        reopen: whether paid invoices with an open balance are reopened
+    """
+    from .models import Invoice, Payment
+
+    invoice_ids = [pk for pk in set(invoice_ids) if pk is not None]
+    if not invoice_ids:
+        return
+    money_field = DecimalField(max_digits=12, decimal_places=2)
+    paid = Coalesce(
+        Subquery(Payment.objects
+                 .filter(invoiceId=OuterRef('pk'))
+                 .order_by()
+                 .values('invoiceId')
+                 .annotate(total=Sum('amount'))
+                 .values('total')),
+        Value(ZERO), output_field=money_field,
+    )
+    invoices = Invoice.objects.filter(pk__in=invoice_ids)
+    invoices.update(paidAmount=paid, balance=F('totalAmount') - paid)
+
+    invalidate_aging_reports()
+
+    today = timezone.localdate()
+    settled = Q(status__in=['sent', 'overdue'], balance__lte=0, totalAmount__gt=0)
+    if reopen:
+        settled |= Q(status='paid', balance__gt=0)
+    invoices.filter(settled).update(status=Case(
+        When(balance__lte=0, then=Value('paid')),
+        When(dueDate__lt=today, then=Value('overdue')),
+        default=Value('sent'),
+        output_field=CharField(),
+    ))
+
+
+def mark_overdue_invoices(today=None):
+    """
+    Flip sent invoices past their due date with an open balance to overdue.
+
+    Returns:
+        int: number of invoices updated
+    """
+    from .models import Invoice
+
+    today = today or timezone.localdate()
+    return Invoice.objects.filter(status='sent', dueDate__lt=today, balance__gt=0).update(status='overdue')
+
+
+def aging_report(today=None, company=None):
+    """
+    Open balances per company, bucketed by days past due, in one grouped query.
+
+    Args:
+        today: reference date (default today)
+        company: optional Company to restrict the report to
+
+    Returns:
+        dict: {companyId: {'current': amount, '0-30': amount, ..., '90+': amount,
+               'total': amount, 'invoices': count}} with amounts as decimal strings.
+               'current' holds balances not yet due.
+    """
+    from .models import Invoice
+
+    today = today or timezone.localdate()
+    money_field = DecimalField(max_digits=14, decimal_places=2)
+
+    def bucket(condition):
+        return Coalesce(Sum('balance', filter=condition), Value(ZERO), output_field=money_field)
+
+    columns = {'current': bucket(Q(dueDate__gte=today))}
+    for key, first, last in AGING_BUCKETS:
+        # Past due by `first` days or more: due on or before today - first
+        condition = Q(dueDate__lte=today - timedelta(days=max(first, 1)))
+        if last is not None:
+            condition &= Q(dueDate__gte=today - timedelta(days=last))
+        columns[key] = bucket(condition)
+
+    rows = Invoice.objects.filter(status__in=RECEIVABLE_STATUSES, balance__gt=0)
+    if company is not None:
+        rows = rows.filter(projectId__account__company=company)
+    rows = (rows
+            .order_by()
+            .values(companyId=F('projectId__account__company'))
+            .annotate(total=Coalesce(Sum('balance'), Value(ZERO), output_field=money_field),
+                      invoices=Count('pk'), **columns))
+
+    report = {}
+    for row in rows:
+        company_id = row.pop('companyId')
+        report[company_id] = {
+            key: value if key == 'invoices' else str(money(value or Decimal(0)))
+            for key, value in row.items()
+        }
+    return report
+
+
+def cached_aging_report(today=None):
+    """
+    The all-company aging report, shared by every request for a few minutes.
+
+    Balance changes invalidate every cached report.
+    """
+    today = today or timezone.localdate()
+    key = _aging_cache_key(today)
+    report = cache.get(key)
+    if report is None:
+        report = aging_report(today)
+        cache.set(key, report, AGING_CACHE_TIMEOUT)
+    return report
+
+
+def empty_aging_row():
+    return {'total': str(ZERO), 'invoices': 0, 'current': str(ZERO),
+            **{key: str(ZERO) for key, _, _ in AGING_BUCKETS}}
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import Quote, RenderJob
+
+logger = logging.getLogger(__name__)
+
+# Bump when the template changes so cached renders are not reused
+QUOTE_TEMPLATE = 'documentsFinance/quote_pdf.html'
+QUOTE_TEMPLATE_VERSION = 1
+
+_executor = None
+_executor_lock = Lock()
+
+
+class RenderError(RuntimeError):
+    """Raised when a document cannot be rendered to PDF."""
+
+
+def html_to_pdf(html, base_url=None, **options):
+    """
+    Render HTML to PDF bytes with weasyprint, imported on first use.
+
+    Raises:
+        RenderError: if weasyprint is not installed
+    """
+    try:
+        from weasyprint import HTML
+    except ImportError as exc:
+        raise RenderError("weasyprint is not installed") from exc
+    return HTML(string=html, base_url=base_url).write_pdf(**options)
+
+
+def _logo_url(company):
+    if not company.logo:
+        return None
+    try:
+        return Path(company.logo.path).as_uri()
+    except (NotImplementedError, ValueError):
+        return company.logo.url
+
+
+def quote_context(quote):
+    """
+    Everything the quote PDF shows, read in four queries.
+    """
+    quote = Quote.objects.select_related('projectId__account__company').get(pk=quote.pk)
+    company = quote.projectId.account.company
+    return {
+        'quote': quote,
+        'project': quote.projectId,
+        'client': quote.projectId.account,
+        'company': company,
+        'logo_url': _logo_url(company),
+        'sections': list(quote.sections.order_by('order', 'id')),
+        'lines': list(quote.lines.select_related('taxRuleId').order_by('order', 'id')),
+        'totals': quote.totals,
+    }
+
+
+def quote_content_hash(context):
+    """
+    SHA-256 over the quote, its lines, sections and company branding.
+    """
+    quote, company, client = context['quote'], context['company'], context['client']
+    payload = {
+        'template': QUOTE_TEMPLATE_VERSION,
+        'quote': [quote.number, quote.version, quote.status, quote.totals],
+        'project': [context['project'].code, context['project'].name],
+        'client': [client.clientName, client.vatNumber, client.billingAddress],
+        'company': [
+            company.legalName, company.tradeName, company.vatNumber, company.iban, company.currency,
+            company.street_address, company.city, company.zip_postal_code, company.country,
+            company.logo.name if company.logo else None,
+        ],
+        'sections': [[s.order, s.name, s.description] for s in context['sections']],
+        'lines': [
+            [line.order, line.itemRef, line.qty, str(line.rate), line.days, str(line.discount),
+             line.taxRuleId_id, line.notes]
+            for line in context['lines']
+        ],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'QUOTE_RENDER_WORKERS', 2),
+                thread_name_prefix='quote-render',
+            )
+    return _executor
+
+
+def _run_in_worker(func, *args):
+    try:
+        func(*args)
+    finally:
+        # Pool threads hold their own connections; don't leak them
+        connections.close_all()
+
+
+def run_in_background(func, *args):
+    """Run func(*args) on the shared render thread pool."""
+    _pool().submit(_run_in_worker, func, *args)
+
+
+def _enqueue(job_id):
+    run_in_background(render_job, job_id)
+
+
+def request_quote_pdf(quote):
+    """
+    Return the render job for the current content of a quote.
+
+    A finished render with the same content hash is reused as is, and a
+    render already in flight is returned instead of queueing a duplicate.
+    Otherwise a job is created and handed to the worker pool once the
+    surrounding transaction commits.
+
+    Returns:
+        RenderJob
+    """
+    content_hash = quote_content_hash(quote_context(quote))
+    with transaction.atomic():
+        existing = (RenderJob.objects
+                    .filter(quoteId=quote, contentHash=content_hash, status__in=['queued', 'rendering', 'done'])
+                    .order_by('-created_at')
+                    .first())
+        if existing is not None and (existing.status != 'done' or existing.pdf):
+            return existing
+        job = RenderJob.objects.create(quoteId=quote, contentHash=content_hash)
+        transaction.on_commit(partial(_enqueue, job.pk))
+    return job
+
+
+def render_job(job_id):
+    """
+    Render one queued job; runs on a pool thread or from run_render_jobs.
+
+    Returns:
+        RenderJob, or None if another worker already claimed the job
+    """
+    claimed = (RenderJob.objects
+               .filter(pk=job_id, status='queued')
+               .update(status='rendering', started_at=timezone.now()))
+    if not claimed:
+        return None
+    job = RenderJob.objects.select_related('quoteId').get(pk=job_id)
+    try:
+        context = quote_context(job.quoteId)
+        # The quote may have changed since the job was queued
+        job.contentHash = quote_content_hash(context)
+        pdf = html_to_pdf(render_to_string(QUOTE_TEMPLATE, context))
+    except Exception as exc:
+        logger.exception("Rendering quote %s failed", job.quoteId_id)
+        job.status, job.error = 'failed', str(exc)
+    else:
+        name = get_valid_filename(f"quote-{job.quoteId.number}-v{job.quoteId.version}-{job.contentHash[:12]}.pdf")
+        job.pdf.save(name, ContentFile(pdf), save=False)
+        job.status, job.error = 'done', None
+        Quote.objects.filter(pk=job.quoteId_id).update(pdf=job.pdf.name)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['contentHash', 'status', 'error', 'pdf', 'finished_at'])
+    return job
@@ -0,0 +1,30 @@
+from rest_framework import serializers
+
+from .models import Invoice
+
+
+class BulkReorderSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_ids(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('ids must not contain duplicates.')
+        return value
+
+
+class InvoiceBatchSerializer(serializers.Serializer):
+    MAX_INVOICES = 1000
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False,
+                                max_length=MAX_INVOICES)
+    status = serializers.ChoiceField(choices=Invoice.STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if 'ids' not in attrs and 'status' not in attrs:
+            raise serializers.ValidationError('Pass ids or status to select invoices.')
+        return attrs
+
+
+class PaymentImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=['csv', 'camt'], required=False)
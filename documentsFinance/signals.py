@@ -0,0 +1,100 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from refdata.models import TaxRule
+from .models import Invoice, Payment, Quote, QuoteLine, SubRent
+from .receivables import invalidate_aging_reports, refresh_invoice_balances
+from .subrents import sync_subrent_items
+from .totals import apply_line_delta, recalculate_quote_totals
+
+
+def _contribution(line):
+    return line.grossAmount, line.discountAmount, line.taxRuleId_id
+
+
+@receiver(pre_save, sender=QuoteLine)
+def remember_quote_line(sender, instance, **kwargs):
+    instance._totals_previous = None
+    if instance.pk is not None:
+        instance._totals_previous = (sender.objects.filter(pk=instance.pk)
+                                     .values_list('quoteId_id', 'grossAmount', 'discountAmount', 'taxRuleId_id')
+                                     .first())
+
+
+@receiver(post_save, sender=QuoteLine)
+def update_totals_for_quote_line(sender, instance, **kwargs):
+    previous = getattr(instance, '_totals_previous', None)
+    current = _contribution(instance)
+    if previous is None:
+        apply_line_delta(instance.quoteId_id, current=current)
+        return
+    quote_id, previous = previous[0], previous[1:]
+    if quote_id != instance.quoteId_id:
+        apply_line_delta(quote_id, previous=previous)
+        apply_line_delta(instance.quoteId_id, current=current)
+    elif previous != current:
+        apply_line_delta(quote_id, previous, current)
+
+
+@receiver(post_delete, sender=QuoteLine)
+def release_totals_for_quote_line(sender, instance, origin=None, **kwargs):
+    # Lines deleted along with their quote have nothing left to update
+    if isinstance(origin, Quote):
+        return
+    apply_line_delta(instance.quoteId_id, previous=_contribution(instance))
+
+
+def _draft_quotes_using(tax_rule):
+    return list(Quote.objects.filter(status='draft', lines__taxRuleId=tax_rule).distinct().values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=TaxRule)
+def refresh_totals_for_tax_rule(sender, instance, created, **kwargs):
+    # Sent and accepted quotes keep the rate they were issued with
+    if not created:
+        for quote_id in _draft_quotes_using(instance):
+            recalculate_quote_totals(quote_id)
+
+
+@receiver(pre_delete, sender=TaxRule)
+def remember_tax_rule_quotes(sender, instance, **kwargs):
+    instance._totals_quotes = _draft_quotes_using(instance)
+
+
+@receiver(post_delete, sender=TaxRule)
+def refresh_totals_for_deleted_tax_rule(sender, instance, **kwargs):
+    for quote_id in getattr(instance, '_totals_quotes', ()):
+        recalculate_quote_totals(quote_id)
+
+
+@receiver(pre_save, sender=Payment)
+def remember_payment_invoice(sender, instance, **kwargs):
+    instance._balance_previous_invoice = None
+    if instance.pk is not None:
+        instance._balance_previous_invoice = (sender.objects.filter(pk=instance.pk)
+                                              .values_list('invoiceId_id', flat=True).first())
+
+
+@receiver(post_save, sender=Payment)
+def update_balance_for_payment(sender, instance, **kwargs):
+    refresh_invoice_balances([instance.invoiceId_id, getattr(instance, '_balance_previous_invoice', None)])
+
+
+@receiver(post_delete, sender=Payment)
+def release_balance_for_payment(sender, instance, origin=None, **kwargs):
+    # Payments deleted along with their invoice have nothing left to update
+    if isinstance(origin, Invoice):
+        return
+    refresh_invoice_balances([instance.invoiceId_id])
+
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Payment)
+def invalidate_aging_for_deleted(sender, **kwargs):
+    # Deletes that skip refresh_invoice_balances still change the receivables
+    invalidate_aging_reports()
+
+
+@receiver(post_save, sender=SubRent)
+def sync_items_for_subrent(sender, instance, **kwargs):
+    sync_subrent_items(instance)
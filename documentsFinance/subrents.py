@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from equipment.models import CatalogItem
+from .models import SubRentItem
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def subrent_quantities(items):
+    """
+    {catalogItemId: qty} from SubRent.items JSON, summing repeated items.
+
+    Entries without a catalogItemId (free-text vendor stock) are skipped,
+    as are malformed ones (ids or quantities that are not integers), so a
+    bad entry never breaks saving the SubRent.
+    """
+    quantities = defaultdict(int)
+    for entry in items if isinstance(items, list) else []:
+        if not isinstance(entry, dict) or not entry.get('catalogItemId'):
+            continue
+        catalog_id, qty = _as_int(entry['catalogItemId']), _as_int(entry.get('qty', 1))
+        if catalog_id is not None and qty is not None:
+            quantities[catalog_id] += qty
+    return {catalog_id: qty for catalog_id, qty in quantities.items() if qty > 0}
+
+
+def sync_subrent_items(subrent):
+    """
+    Rewrite the SubRentItem rows of a SubRent from its items JSON.
+
+    Unknown catalog items are ignored.
+
+    Returns:
+        int: number of rows written
+    """
+    quantities = subrent_quantities(subrent.items)
+    known = set(CatalogItem.objects.filter(pk__in=quantities).values_list('pk', flat=True)) if quantities else set()
+    rows = [
+        SubRentItem(subRentId=subrent, catalogItem_id=catalog_id, qty=qty,
+                    dateFrom=subrent.dateFrom, dateTo=subrent.dateTo)
+        for catalog_id, qty in quantities.items() if catalog_id in known
+    ]
+    with transaction.atomic():
+        SubRentItem.objects.filter(subRentId=subrent).delete()
+        SubRentItem.objects.bulk_create(rows)
+    return len(rows)
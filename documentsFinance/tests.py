@@ -1,3 +1,809 @@
-from django.test import TestCase
+import tempfile
+import zipfile
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from company.testing import make_company, make_project
+from refdata.models import TaxRule
+from .diff import diff_quotes
+from .invoice_batch import invoice_documents, render_documents, render_invoice_batch, request_invoice_batch
+from .models import Invoice, InvoiceBatchJob, Payment, Quote, QuoteLine, QuoteSection
+from .ordering import GAPPED_MAX_ORDER, ORDER_COLUMN_LIMIT, lock_quote, parking_offset, renumber
+from .payment_import import import_payments, read_camt, read_csv
+from .receivables import aging_report, mark_overdue_invoices
+from .rendering import RenderError, render_job, request_quote_pdf
+from .totals import compute_totals, line_amounts
+
+
+def make_quote(project, number='Q-1'):
+    return Quote.objects.create(projectId=project, number=number, totals={})
+
+
+def line_writes(queries):
+    table = QuoteLine._meta.db_table
+    return [q['sql'] for q in queries if q['sql'].startswith(('UPDATE', 'INSERT')) and table in q['sql']]
+
+
+@override_settings(QUOTE_ORDERING_MODE='gapped')
+class GappedOrderingTestCase(TestCase):
+    """Test cases for the gapped ordering mode of quote lines and sections"""
+
+    def setUp(self):
+        self.quote = make_quote(make_project(make_company()))
+        self.lines = [self.add_line(f'item-{n}') for n in range(5)]
+
+    def add_line(self, item_ref, **fields):
+        return QuoteLine.objects.create(quoteId=self.quote, itemRef=item_ref, rate=10, **fields)
+
+    def refs(self):
+        return list(QuoteLine.objects.filter(quoteId=self.quote).values_list('itemRef', flat=True))
+
+    def test_append_leaves_gaps(self):
+        self.assertEqual([line.order for line in self.lines], [1024, 2048, 3072, 4096, 5120])
+
+    def test_insert_writes_one_row(self):
+        with CaptureQueriesContext(connection) as ctx:
+            QuoteLine.insert_at(self.quote, 2, itemRef='new', rate=10)
+        self.assertEqual(len(line_writes(ctx.captured_queries)), 1)
+        self.assertEqual(self.refs(), ['item-0', 'new', 'item-1', 'item-2', 'item-3', 'item-4'])
+
+    def test_move_writes_one_row(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.lines[4].move_to(1)
+        self.assertEqual(len(line_writes(ctx.captured_queries)), 1)
+        self.assertEqual(self.refs(), ['item-4', 'item-0', 'item-1', 'item-2', 'item-3'])
+
+        self.lines[0].move_to(4)
+        self.assertEqual(self.refs(), ['item-4', 'item-1', 'item-2', 'item-0', 'item-3'])
+
+    def test_placing_a_row_locks_the_quote_first(self):
+        with patch('documentsFinance.ordering.lock_quote', wraps=lock_quote) as lock:
+            QuoteLine.insert_at(self.quote, 2, itemRef='new', rate=10)
+            self.lines[4].move_to(1)
+            self.add_line('appended')
+            QuoteSection.insert_at(self.quote, 1, name='Audio')
+        self.assertEqual(lock.call_count, 4)
+        self.assertEqual(
+            [call.args[0] for call in lock.call_args_list],
+            [QuoteLine, QuoteLine, QuoteLine, QuoteSection],
+        )
+
+    def test_move_past_end_appends(self):
+        self.lines[1].move_to(99)
+        self.assertEqual(self.refs(), ['item-0', 'item-2', 'item-3', 'item-4', 'item-1'])
+
+    def test_exhausted_gap_renumbers(self):
+        for n in range(12):
+            QuoteLine.insert_at(self.quote, 2, itemRef=f'dense-{n}', rate=10)
+        refs = self.refs()
+        self.assertEqual(refs[:2], ['item-0', 'dense-11'])
+        self.assertEqual(refs[-4:], ['item-1', 'item-2', 'item-3', 'item-4'])
+        self.assertEqual(len(refs), 17)
+
+    def test_reindex_respaces(self):
+        self.lines[3].move_to(1)
+        QuoteLine.reindex(self.quote)
+        orders = list(QuoteLine.objects.filter(quoteId=self.quote).values_list('order', flat=True))
+        self.assertEqual(orders, [1024 * n for n in range(1, 6)])
+        self.assertEqual(self.refs(), ['item-3', 'item-0', 'item-1', 'item-2', 'item-4'])
+
+    def test_keys_stay_below_limit(self):
+        with self.assertRaises(ValidationError):
+            self.add_line('too-far', order=GAPPED_MAX_ORDER)
+        self.add_line('last', order=GAPPED_MAX_ORDER - 1)
+        self.add_line('appended')
+        orders = list(QuoteLine.objects.filter(quoteId=self.quote).values_list('order', flat=True))
+        self.assertEqual(orders, [1024 * n for n in range(1, 8)])
+        self.assertEqual(self.refs()[-2:], ['last', 'appended'])
+
+    def test_parking_offset_fits_32_bits(self):
+        offset = parking_offset(GAPPED_MAX_ORDER - 1, 5, 1024)
+        self.assertLess(GAPPED_MAX_ORDER - 1 + offset, ORDER_COLUMN_LIMIT)
+        with self.assertRaises(ValueError):
+            parking_offset(0, GAPPED_MAX_ORDER // 1024, 1024)
+
+    def test_sections(self):
+        for name in ('a', 'b', 'c'):
+            QuoteSection.objects.create(quoteId=self.quote, name=name)
+        QuoteSection.insert_at(self.quote, 1, name='intro')
+        QuoteSection.objects.get(name='c').move_to(2)
+        names = list(QuoteSection.objects.filter(quoteId=self.quote).values_list('name', flat=True))
+        self.assertEqual(names, ['intro', 'c', 'a', 'b'])
+
+
+class BulkReorderTestCase(TestCase):
+    """Test cases for applying a full new ordering of quote lines and sections"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.quote = make_quote(make_project(self.company))
+        self.lines = [
+            QuoteLine.objects.create(quoteId=self.quote, itemRef=f'item-{n}', rate=10) for n in range(5)
+        ]
+
+    def refs(self):
+        return list(QuoteLine.objects.filter(quoteId=self.quote).values_list('itemRef', flat=True))
+
+    def test_permutation_is_applied(self):
+        ids = [line.id for line in reversed(self.lines)]
+        QuoteLine.bulk_reorder(self.quote, ids)
+        self.assertEqual(self.refs(), ['item-4', 'item-3', 'item-2', 'item-1', 'item-0'])
+        orders = list(QuoteLine.objects.filter(quoteId=self.quote).values_list('order', flat=True))
+        self.assertEqual(orders, [1, 2, 3, 4, 5])
+
+    def test_query_count_is_constant(self):
+        for n in range(5, 300):
+            QuoteLine.objects.create(quoteId=self.quote, itemRef=f'item-{n}', rate=10)
+        ids = list(QuoteLine.objects.filter(quoteId=self.quote).order_by('-order').values_list('id', flat=True))
+        # select, max, offset update, bulk_update (savepoints excluded)
+        with CaptureQueriesContext(connection) as ctx:
+            QuoteLine.bulk_reorder(self.quote, ids)
+        statements = [q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 4)
+        self.assertEqual(self.refs()[0], 'item-299')
+
+    def test_gapped_mode_spaces_orders(self):
+        with patch.object(QuoteLine, 'ORDERING_MODE', 'gapped'):
+            QuoteLine.bulk_reorder(self.quote, [line.id for line in self.lines])
+        orders = list(QuoteLine.objects.filter(quoteId=self.quote).values_list('order', flat=True))
+        self.assertEqual(orders, [1024, 2048, 3072, 4096, 5120])
+
+    def test_partial_list_is_rejected(self):
+        with self.assertRaises(ValueError):
+            QuoteLine.bulk_reorder(self.quote, [line.id for line in self.lines[1:]])
+        self.assertEqual(self.refs(), [f'item-{n}' for n in range(5)])
+
+    def test_api_reorders_sections(self):
+        sections = [QuoteSection.objects.create(quoteId=self.quote, name=name) for name in ('a', 'b', 'c')]
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        url = f'/api/documents/quotes/{self.quote.id}/sections/reorder/'
+
+        response = client.post(url, {'ids': [sections[2].id, sections[0].id, sections[1].id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        names = list(QuoteSection.objects.filter(quoteId=self.quote).values_list('name', flat=True))
+        self.assertEqual(names, ['c', 'a', 'b'])
+
+        response = client.post(url, {'ids': [sections[0].id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_hides_other_companies_quotes(self):
+        other = make_company('other@example.com')
+        client = APIClient()
+        client.force_authenticate(other.owner)
+        url = f'/api/documents/quotes/{self.quote.id}/lines/reorder/'
+        response = client.post(url, {'ids': [line.id for line in self.lines]}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class ReindexTestCase(TestCase):
+    """Test cases for set-based reindexing of quote lines"""
+
+    def setUp(self):
+        self.quote = make_quote(make_project(make_company()))
+        for n, order in enumerate([40, 7, 900, 12, 3]):
+            QuoteLine.objects.create(quoteId=self.quote, itemRef=f'item-{n}', rate=10, order=order)
+
+    def rows(self):
+        return list(QuoteLine.objects.filter(quoteId=self.quote).values_list('itemRef', 'order'))
+
+    def test_reindex_compacts_in_sequence(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(QuoteLine.reindex(self.quote), 5)
+        statements = [q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(self.rows(), [('item-4', 1), ('item-1', 2), ('item-3', 3), ('item-0', 4), ('item-2', 5)])
+
+    def test_bulk_update_fallback_matches(self):
+        renumber(QuoteLine, self.quote, 1, set_based=False)
+        self.assertEqual(self.rows(), [('item-4', 1), ('item-1', 2), ('item-3', 3), ('item-0', 4), ('item-2', 5)])
+
+    def test_other_quotes_untouched(self):
+        other = make_quote(self.quote.projectId, number='Q-2')
+        QuoteLine.objects.create(quoteId=other, itemRef='other', rate=10, order=77)
+        QuoteLine.reindex(self.quote)
+        self.assertEqual(QuoteLine.objects.get(quoteId=other).order, 77)
+
+    def test_bench_command(self):
+        out = StringIO()
+        call_command('bench_quote_reindex', lines=200, stdout=out)
+        self.assertIn('Set-based:', out.getvalue())
+        self.assertEqual(Quote.objects.filter(number='BENCH').count(), 0)
+
+
+class QuoteTotalsTestCase(TestCase):
+    """Test cases for the quote totals engine"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.quote = make_quote(make_project(self.company))
+        self.vat = TaxRule.objects.create(name='VAT', rate=Decimal('22.00'), company=self.company)
+        self.reduced = TaxRule.objects.create(name='Reduced', rate=Decimal('9.00'), company=self.company)
+
+    def add_line(self, qty, rate, days=1, discount=0, tax_rule=None):
+        return QuoteLine.objects.create(
+            quoteId=self.quote, itemRef='item', qty=qty, rate=Decimal(rate), days=days,
+            discount=Decimal(discount), taxRuleId=tax_rule,
+        )
+
+    def stored(self):
+        self.quote.refresh_from_db()
+        return self.quote.totals
+
+    def test_line_amounts_round_half_up(self):
+        self.assertEqual(line_amounts(3, Decimal('3.33'), 1, Decimal('12.5')), (Decimal('9.99'), Decimal('1.25')))
+
+    def test_totals_by_rule(self):
+        self.add_line(2, '100.00', days=3, discount=10, tax_rule=self.vat)
+        self.add_line(1, '49.99', tax_rule=self.reduced)
+        self.add_line(4, '2.50')
+
+        totals = self.stored()
+        self.assertEqual(totals['subtotal'], '659.99')
+        self.assertEqual(totals['discount'], '60.00')
+        self.assertEqual(totals['net'], '599.99')
+        self.assertEqual(totals['taxByRule'][str(self.vat.id)], {'rate': '22.00', 'net': '540.00', 'tax': '118.80'})
+        self.assertEqual(totals['taxByRule'][str(self.reduced.id)]['tax'], '4.50')
+        self.assertEqual(totals['taxByRule']['none']['tax'], '0.00')
+        self.assertEqual(totals['tax'], '123.30')
+        self.assertEqual(totals['total'], '723.29')
+        self.assertEqual(totals, compute_totals(self.quote))
+
+    def test_single_line_change_does_not_rescan(self):
+        lines = [self.add_line(1, '10.00', tax_rule=self.vat) for _ in range(20)]
+        with CaptureQueriesContext(connection) as ctx:
+            lines[3].qty = 5
+            lines[3].save()
+        self.assertFalse([q for q in ctx.captured_queries if 'SUM' in q['sql'].upper()])
+        self.assertEqual(self.stored()['subtotal'], '240.00')
+        self.assertEqual(self.stored(), compute_totals(self.quote))
+
+    def test_rule_change_and_delete(self):
+        line = self.add_line(1, '100.00', tax_rule=self.vat)
+        self.add_line(1, '100.00', tax_rule=self.vat)
+        line.taxRuleId = self.reduced
+        line.save()
+        self.assertEqual(self.stored()['tax'], '31.00')
+        line.delete()
+        self.assertEqual(self.stored(), compute_totals(self.quote))
+        self.assertEqual(self.stored()['total'], '122.00')
+
+    def test_legacy_totals_are_recomputed(self):
+        self.assertNotIn('taxByRule', self.quote.totals)
+        self.add_line(1, '10.00')
+        self.assertEqual(self.stored()['total'], '10.00')
+
+    def test_tax_rule_rate_change_updates_drafts(self):
+        self.add_line(1, '100.00', tax_rule=self.vat)
+        self.vat.rate = Decimal('24.00')
+        self.vat.save()
+        self.assertEqual(self.stored()['tax'], '24.00')
+        self.vat.delete()
+        self.assertEqual(self.stored()['tax'], '0.00')
+        self.assertEqual(self.stored()['total'], '100.00')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class QuotePdfRenderingTestCase(TestCase):
+    """Test cases for background quote PDF rendering"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.quote = make_quote(make_project(self.company))
+        QuoteLine.objects.create(quoteId=self.quote, itemRef='item', rate=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.company.owner)
+        self.url = f'/api/documents/quotes/{self.quote.id}/pdf/'
+        # Run the pool inline and skip weasyprint
+        for target, kwargs in (('_enqueue', {'side_effect': render_job}),
+                               ('html_to_pdf', {'return_value': b'%PDF-1.7 test'})):
+            patcher = patch(f'documentsFinance.rendering.{target}', **kwargs)
+            setattr(self, target.strip('_'), patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_request_returns_202_then_done(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertTrue(response['Location'].endswith(f"/api/documents/render-jobs/{response.data['id']}/"))
+
+        for callback in callbacks:
+            callback()
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'done')
+        self.quote.refresh_from_db()
+        self.assertEqual(self.quote.pdf.read(), b'%PDF-1.7 test')
+
+    def test_unchanged_quote_is_not_rerendered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = request_quote_pdf(self.quote)
+        with self.captureOnCommitCallbacks(execute=True):
+            again = request_quote_pdf(self.quote)
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(self.html_to_pdf.call_count, 1)
+
+        QuoteLine.objects.create(quoteId=self.quote, itemRef='extra', rate=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            changed = request_quote_pdf(self.quote)
+        self.assertNotEqual(changed.pk, first.pk)
+        self.assertEqual(self.html_to_pdf.call_count, 2)
+
+    def test_in_flight_job_is_reused(self):
+        with self.captureOnCommitCallbacks():
+            first = request_quote_pdf(self.quote)
+            second = request_quote_pdf(self.quote)
+        self.assertEqual(first.pk, second.pk)
+
+    def test_failed_render_is_reported(self):
+        self.html_to_pdf.side_effect = RenderError('weasyprint is not installed')
+        with self.assertLogs('documentsFinance.rendering', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            job = request_quote_pdf(self.quote)
+        response = self.client.get(f'/api/documents/render-jobs/{job.id}/')
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertEqual(response.data['error'], 'weasyprint is not installed')
+
+    def test_run_render_jobs_picks_up_queued(self):
+        self.enqueue.side_effect = None
+        with self.captureOnCommitCallbacks(execute=True):
+            job = request_quote_pdf(self.quote)
+        call_command('run_render_jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+
+def fake_pdf(html):
+    return b'%PDF-1.7 ' + html.split('<title>')[1].split('</title>')[0].encode()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), INVOICE_RENDER_WORKERS=0)
+class InvoiceBatchTestCase(TestCase):
+    """Test cases for parallel invoice PDF batches"""
+
+    def setUp(self):
+        self.company = make_company()
+        project = make_project(self.company)
+        self.invoices = [
+            Invoice.objects.create(projectId=project, number=f'INV-{n}', dueDate=date(2026, 6, 30),
+                                   totals={'total': '100.00'}, status='sent')
+            for n in range(3)
+        ]
+        # Run the background pool inline and skip weasyprint
+        for target, kwargs in (('pdf_worker.init_worker', {}),
+                               ('pdf_worker.write_pdf', {'side_effect': fake_pdf}),
+                               ('views.ensure_renderer', {}),
+                               ('invoice_batch._enqueue', {'side_effect': render_invoice_batch})):
+            patcher = patch(f'documentsFinance.{target}', **kwargs)
+            setattr(self, target.split('.')[-1].strip('_'), patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_api_queues_zip_with_timings(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post('/api/documents/invoices/batch-pdf/', {'status': 'sent'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data['status'], response.data['invoices']), ('queued', 3))
+        self.assertTrue(response['Location'].endswith(f"/api/documents/invoices/batch-pdf/{response.data['id']}/"))
+
+        for callback in callbacks:
+            callback()
+        response = client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['timings']['documents'], 3)
+        job = InvoiceBatchJob.objects.get()
+        archive = zipfile.ZipFile(BytesIO(job.archive.read()))
+        names = archive.namelist()
+        self.assertEqual(names[-1], 'timings.csv')
+        self.assertEqual(len(names), 4)
+        self.assertEqual(archive.read(names[0]), b'%PDF-1.7 Invoice INV-0')
+        self.assertEqual(len(archive.read('timings.csv').decode().strip().splitlines()), 4)
+
+    def test_api_caps_batch_size(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        with self.settings(INVOICE_BATCH_API_LIMIT=2):
+            response = client.post('/api/documents/invoices/batch-pdf/', {'status': 'sent'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('render_invoices', response.data['detail'])
+
+    def test_api_is_scoped_to_company(self):
+        client = APIClient()
+        client.force_authenticate(make_company('other@example.com').owner)
+        response = client.post('/api/documents/invoices/batch-pdf/',
+                               {'ids': [invoice.id for invoice in self.invoices]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        job = request_invoice_batch(self.company, Invoice.objects.all())
+        response = client.get(f'/api/documents/invoices/batch-pdf/{job.id}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_run_render_jobs_picks_up_queued_batches(self):
+        self.enqueue.side_effect = None
+        with self.captureOnCommitCallbacks(execute=True):
+            job = request_invoice_batch(self.company, Invoice.objects.filter(pk=self.invoices[0].pk))
+        call_command('run_render_jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(zipfile.ZipFile(BytesIO(job.archive.read())).namelist()[-1], 'timings.csv')
+
+    def test_failures_are_reported_not_fatal(self):
+        documents = list(invoice_documents(Invoice.objects.all()))
+        with patch('documentsFinance.pdf_worker.write_pdf', side_effect=[b'%PDF', ValueError('bad'), b'%PDF']):
+            results = list(render_documents(documents, workers=0))
+        self.assertEqual([result.error for result in results], [None, 'ValueError: bad', None])
+
+    def test_command_writes_to_storage(self):
+        out = StringIO()
+        with patch('documentsFinance.management.commands.render_invoices.ensure_renderer'):
+            call_command('render_invoices', '--workers', '0', '--storage', 'batch', stdout=out)
+        self.assertIn('[3/3]', out.getvalue())
+        self.assertIn('Rendered 3/3', out.getvalue())
+        self.assertTrue(default_storage.exists('batch/timings.csv'))
+        self.assertTrue(default_storage.exists(f'batch/invoice-INV-1-{self.invoices[1].id}.pdf'))
+
+
+class QuoteVersionTestCase(TestCase):
+    """Test cases for branching quote versions"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.quote = make_quote(make_project(self.company))
+        self.vat = TaxRule.objects.create(name='VAT', rate=Decimal('22.00'), company=self.company)
+        for name in ('Audio', 'Light'):
+            QuoteSection.objects.create(quoteId=self.quote, name=name)
+        for n in range(200):
+            QuoteLine.objects.create(quoteId=self.quote, itemRef=f'item-{n}', qty=2, rate=Decimal('10.50'),
+                                     discount=5, taxRuleId=self.vat if n % 2 else None)
+        self.quote.refresh_from_db()
+
+    def snapshot(self, quote):
+        return list(quote.lines.values_list(*QuoteLine.COPIED_FIELDS))
+
+    def test_copies_sections_lines_and_totals(self):
+        with CaptureQueriesContext(connection) as ctx:
+            clone = self.quote.new_version()
+        self.assertLess(len(ctx.captured_queries), 25)
+
+        self.assertEqual((clone.number, clone.version, clone.status), (self.quote.number, 2, 'draft'))
+        self.assertEqual(self.snapshot(clone), self.snapshot(self.quote))
+        self.assertEqual(list(clone.sections.values_list('order', 'name')), [(1, 'Audio'), (2, 'Light')])
+        clone.refresh_from_db()
+        self.assertEqual(clone.totals, compute_totals(clone))
+
+    def test_versions_number_after_latest(self):
+        self.quote.new_version()
+        third = self.quote.new_version()
+        self.assertEqual(third.version, 3)
+        self.assertEqual(Quote.objects.filter(number=self.quote.number).count(), 3)
+
+    def test_copy_stays_editable(self):
+        clone = self.quote.new_version()
+        QuoteLine.insert_at(clone, 1, itemRef='new', rate=1)
+        self.assertEqual(clone.lines.first().itemRef, 'new')
+        self.assertEqual(self.quote.lines.first().itemRef, 'item-0')
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        response = client.post(f'/api/documents/quotes/{self.quote.id}/versions/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['version'], 2)
+
+
+class ShiftOrderingTestCase(TestCase):
+    """Test cases for the default shifting order mode on dense orders"""
+
+    def setUp(self):
+        self.quote = make_quote(make_project(make_company()))
+        self.lines = [QuoteLine.objects.create(quoteId=self.quote, itemRef=f'item-{n}', rate=1) for n in range(4)]
+
+    def rows(self):
+        return list(QuoteLine.objects.filter(quoteId=self.quote).values_list('itemRef', 'order'))
+
+    def test_insert_shifts_dense_orders(self):
+        QuoteLine.insert_at(self.quote, 1, itemRef='new', rate=1)
+        self.assertEqual(self.rows(), [('new', 1), ('item-0', 2), ('item-1', 3), ('item-2', 4), ('item-3', 5)])
+
+    def test_moves_shift_dense_orders(self):
+        self.lines[3].move_to(1)
+        self.assertEqual(self.rows(), [('item-3', 1), ('item-0', 2), ('item-1', 3), ('item-2', 4)])
+        self.lines[3].move_to(4)
+        self.assertEqual(self.rows(), [('item-0', 1), ('item-1', 2), ('item-2', 3), ('item-3', 4)])
+
+
+class QuoteDiffTestCase(TestCase):
+    """Test cases for diffing quote versions"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.v1 = make_quote(make_project(self.company))
+        for ref, qty in [('mic', 4), ('stand', 4), ('cable', 10), ('cable', 5), ('speaker', 2)]:
+            QuoteLine.objects.create(quoteId=self.v1, itemRef=ref, qty=qty, rate=Decimal('10.00'))
+        self.v2 = self.v1.new_version()
+
+    def line(self, quote, ref, nth=0):
+        return quote.lines.filter(itemRef=ref)[nth]
+
+    def test_identical_versions(self):
+        result = diff_quotes(self.v1, self.v2)
+        self.assertEqual([result[key] for key in ('added', 'removed', 'changed', 'moved')], [[], [], [], []])
+        self.assertEqual(result['impact']['total'], '0.00')
+
+    def test_added_removed_changed_moved(self):
+        self.line(self.v2, 'stand').delete()
+        cable = self.line(self.v2, 'cable', 1)
+        cable.qty = 8
+        cable.save()
+        self.line(self.v2, 'speaker').move_to(1)
+        QuoteLine.objects.create(quoteId=self.v2, itemRef='sub', qty=1, rate=Decimal('99.00'), discount=10)
+
+        result = diff_quotes(self.v1, self.v2)
+        self.assertEqual([line['itemRef'] for line in result['added']], ['sub'])
+        self.assertEqual([line['itemRef'] for line in result['removed']], ['stand'])
+        self.assertEqual(len(result['changed']), 1)
+        self.assertEqual(result['changed'][0]['fields'], {'qty': {'from': '5', 'to': '8'}})
+        self.assertEqual(result['changed'][0]['impact'], '30.00')
+        self.assertEqual([(m['itemRef'], m['from'], m['to']) for m in result['moved']], [('speaker', 5, 1)])
+        self.assertEqual(result['impact'], {
+            'from': '250.00', 'to': '329.10', 'added': '89.10', 'removed': '-40.00',
+            'changed': '30.00', 'total': '79.10',
+        })
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        response = client.get(f'/api/documents/quotes/{self.v1.id}/diff/{self.v2.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['to']['version'], 2)
+
+        client.force_authenticate(make_company('other@example.com').owner)
+        response = client.get(f'/api/documents/quotes/{self.v1.id}/diff/{self.v2.id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class ReceivablesTestCase(TestCase):
+    """Test cases for invoice balances, overdue marking and aging"""
+
+    def setUp(self):
+        cache.clear()
+        self.company = make_company()
+        self.project = make_project(self.company)
+        self.invoice = self.make_invoice('INV-1', date(2026, 6, 30))
+
+    def make_invoice(self, number, due, total='100.00', project=None):
+        return Invoice.objects.create(projectId=project or self.project, number=number, dueDate=due,
+                                      totals={'total': total}, status='sent')
+
+    def pay(self, invoice, amount):
+        return Payment.objects.create(invoiceId=invoice, amount=Decimal(amount), date=date(2026, 7, 1), method='cash')
+
+    def test_balance_follows_payments(self):
+        self.assertEqual(self.invoice.totalAmount, Decimal('100.00'))
+        self.assertEqual(self.invoice.balance, Decimal('100.00'))
+
+        first = self.pay(self.invoice, '40.00')
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.paidAmount, self.invoice.balance), (Decimal('40.00'), Decimal('60.00')))
+        self.assertEqual(self.invoice.status, 'sent')
+
+        second = self.pay(self.invoice, '60.00')
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.balance, Decimal('0.00'))
+        self.assertEqual(self.invoice.status, 'paid')
+
+        second.amount = Decimal('50.00')
+        second.save()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.balance, Decimal('10.00'))
+        self.assertEqual(self.invoice.status, 'overdue')
+
+        first.delete()
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.paidAmount, self.invoice.balance), (Decimal('50.00'), Decimal('50.00')))
+
+    def test_moving_payment_updates_both_invoices(self):
+        other = self.make_invoice('INV-2', date(2026, 6, 30))
+        payment = self.pay(self.invoice, '30.00')
+        payment.invoiceId = other
+        payment.save()
+        self.invoice.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.invoice.balance, Decimal('100.00'))
+        self.assertEqual(other.balance, Decimal('70.00'))
+
+    def test_total_change_keeps_payments(self):
+        self.pay(self.invoice, '40.00')
+        self.invoice.totals = {'total': '150.00'}
+        self.invoice.save()
+        self.assertEqual((self.invoice.totalAmount, self.invoice.balance), (Decimal('150.00'), Decimal('110.00')))
+
+    def test_mark_overdue_is_one_update(self):
+        self.make_invoice('INV-2', date(2026, 8, 1))
+        paid = self.make_invoice('INV-3', date(2026, 6, 1), total='10.00')
+        self.pay(paid, '10.00')
+        with CaptureQueriesContext(connection) as queries:
+            updated = mark_overdue_invoices(date(2026, 7, 15))
+        self.assertEqual(updated, 1)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(dict(Invoice.objects.values_list('number', 'status')),
+                         {'INV-1': 'overdue', 'INV-2': 'sent', 'INV-3': 'paid'})
+
+        out = StringIO()
+        call_command('mark_overdue_invoices', '--date', '2026-08-15', stdout=out)
+        self.assertIn('Marked 1 invoice(s) overdue', out.getvalue())
+
+    def test_aging_buckets_in_one_query(self):
+        today = date(2026, 10, 1)
+        for number, due in (('A', date(2026, 10, 5)), ('B', date(2026, 9, 30)), ('C', date(2026, 8, 20)),
+                            ('D', date(2026, 7, 10)), ('E', date(2026, 1, 1))):
+            self.make_invoice(number, due)
+        self.pay(Invoice.objects.get(number='B'), '25.00')
+        other = make_company('other@example.com')
+        self.make_invoice('X', date(2026, 9, 1), project=make_project(other, code='P-2'))
+
+        with CaptureQueriesContext(connection) as queries:
+            report = aging_report(today)
+        self.assertEqual(len(queries), 1)
+        # INV-1 (due 2026-06-30) is 93 days past due
+        self.assertEqual(report[self.company.pk], {
+            'total': '575.00', 'invoices': 6, 'current': '100.00', '0-30': '75.00',
+            '31-60': '100.00', '61-90': '100.00', '90+': '200.00',
+        })
+        self.assertEqual(report[other.pk]['0-30'], '100.00')
+
+    def test_aging_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        response = client.get('/api/documents/invoices/aging/', {'date': '2026-07-15'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['0-30'], '100.00')
+
+        self.pay(self.invoice, '100.00')
+        response = client.get('/api/documents/invoices/aging/', {'date': '2026-07-15'})
+        self.assertEqual(response.data['total'], '0.00')
+
+        response = client.get('/api/documents/invoices/aging/', {'date': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_deletes_invalidate_cached_aging(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        other = self.make_invoice('INV-2', date(2026, 7, 10))
+        self.pay(other, '30.00')
+        response = client.get('/api/documents/invoices/aging/', {'date': '2026-07-15'})
+        self.assertEqual(response.data['total'], '170.00')
+
+        self.invoice.delete()
+        response = client.get('/api/documents/invoices/aging/', {'date': '2026-07-15'})
+        self.assertEqual(response.data['total'], '70.00')
+
+        # The payment goes with its invoice, skipping the balance refresh
+        other.delete()
+        response = client.get('/api/documents/invoices/aging/', {'date': '2026-07-15'})
+        self.assertEqual((response.data['total'], response.data['invoices']), ('0.00', 0))
+
+
+CAMT_STATEMENT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt><Stmt>
+    <Ntry>
+      <Amt Ccy="EUR">60.00</Amt><CdtDbtInd>CRDT</CdtDbtInd>
+      <BookgDt><Dt>2026-07-02</Dt></BookgDt><AcctSvcrRef>BANK-1</AcctSvcrRef>
+      <NtryDtls><TxDtls><RmtInf><Ustrd>Payment for inv-1 thanks</Ustrd></RmtInf></TxDtls></NtryDtls>
+    </Ntry>
+    <Ntry>
+      <Amt Ccy="EUR">15.00</Amt><CdtDbtInd>DBIT</CdtDbtInd>
+      <BookgDt><Dt>2026-07-02</Dt></BookgDt><AcctSvcrRef>BANK-2</AcctSvcrRef>
+    </Ntry>
+    <Ntry>
+      <Amt Ccy="EUR">20.00</Amt><CdtDbtInd>CRDT</CdtDbtInd>
+      <BookgDt><Dt>2026-07-03</Dt></BookgDt><AcctSvcrRef>BANK-3</AcctSvcrRef>
+      <NtryDtls><TxDtls><RmtInf><Strd><CdtrRefInf><Ref>NOPE-9</Ref></CdtrRefInf></Strd></RmtInf></TxDtls></NtryDtls>
+    </Ntry>
+  </Stmt></BkToCstmrStmt>
+</Document>
+"""
+
+
+class PaymentImportTestCase(TestCase):
+    """Test cases for bank statement imports"""
+
+    def setUp(self):
+        self.company = make_company()
+        project = make_project(self.company)
+        self.invoice = Invoice.objects.create(projectId=project, number='INV-1', dueDate=date(2026, 6, 30),
+                                              totals={'total': '100.00'}, status='sent')
+        self.second = Invoice.objects.create(projectId=project, number='INV-2', dueDate=date(2026, 6, 30),
+                                             totals={'total': '50.00'}, status='sent')
+        Payment.objects.create(invoiceId=self.second, amount=Decimal('10.00'), date=date(2026, 6, 1),
+                               method='bank_transfer', ref='RF-2')
+
+    def csv_statement(self):
+        return BytesIO(
+            'Date;Amount;Reference;Description;Transaction ID\n'
+            '02.07.2026;40,00;INV-1;;T-1\n'
+            '03.07.2026;15,00;rf-2;;T-2\n'
+            '03.07.2026;5,00;;unknown client;T-3\n'
+            'soon;5,00;INV-1;;T-4\n'.encode()
+        )
+
+    def test_csv_import_matches_number_and_ref(self):
+        result = import_payments(read_csv(self.csv_statement()), self.company)
+        self.assertEqual((result.rows, result.created, result.duplicates, result.unmatchedCount), (4, 2, 0, 2))
+        self.assertEqual([row['reason'] for row in result.unmatched], ['no matching invoice', 'invalid date'])
+        self.invoice.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.invoice.balance, Decimal('60.00'))
+        self.assertEqual(self.second.balance, Decimal('25.00'))
+
+        # Importing the same statement again skips the known transactions
+        result = import_payments(read_csv(self.csv_statement()), self.company)
+        self.assertEqual((result.created, result.duplicates), (0, 2))
+
+    def test_non_finite_and_oversized_amounts_are_row_errors(self):
+        statement = BytesIO(
+            b'date,amount,reference,text,id\n'
+            b'2026-07-02,NaN,INV-1,,T-1\n'
+            b'2026-07-02,Infinity,INV-1,,T-2\n'
+            b'2026-07-02,1e15,INV-1,,T-3\n'
+            b'2026-07-02,1.005,INV-1,,T-4\n'
+            b'2026-07-02,40.00,INV-1,,T-5\n'
+        )
+        result = import_payments(read_csv(statement), self.company)
+        self.assertEqual((result.rows, result.created, result.unmatchedCount), (5, 1, 4))
+        self.assertEqual([row['reason'] for row in result.unmatched],
+                         ['invalid amount', 'invalid amount', 'amount out of range', 'amount out of range'])
+
+    def test_import_queries_do_not_grow_with_rows(self):
+        rows = ''.join(f'2026-07-02,1.00,INV-1,,T-{n}\n' for n in range(1200))
+        statement = BytesIO(('date,amount,reference,text,id\n' + rows).encode())
+        with CaptureQueriesContext(connection) as queries:
+            result = import_payments(read_csv(statement), self.company)
+        self.assertEqual(result.created, 1200)
+        # Two index queries plus a few per batch of BATCH_SIZE rows
+        self.assertLess(len(queries), 30)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paidAmount, Decimal('1200.00'))
+
+    def test_camt_reads_credit_entries(self):
+        rows = list(read_camt(BytesIO(CAMT_STATEMENT)))
+        self.assertEqual([(row.amount, row.bankRef) for row in rows],
+                         [(Decimal('60.00'), 'BANK-1'), (Decimal('20.00'), 'BANK-3')])
+        result = import_payments(rows, self.company)
+        self.assertEqual((result.created, result.unmatchedCount), (1, 1))
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.balance, Decimal('40.00'))
+
+    def test_endpoint_and_command(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        upload = SimpleUploadedFile('statement.xml', CAMT_STATEMENT, content_type='application/xml')
+        response = client.post('/api/documents/invoices/payments/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['unmatched'][0]['reference'], 'NOPE-9')
+
+        upload = SimpleUploadedFile('statement.csv', b'foo,bar\n1,2\n')
+        response = client.post('/api/documents/invoices/payments/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as statement:
+            statement.write(self.csv_statement().getvalue())
+            statement.flush()
+            out = StringIO()
+            call_command('import_payments', statement.name, '--company', str(self.company.pk), stdout=out)
+        self.assertIn('2 payment(s) created, 0 duplicate(s), 2 unmatched', out.getvalue())
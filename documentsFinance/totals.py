@@ -0,0 +1,150 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Sum
+
+# Key of the taxByRule entry for lines without a tax rule
+NO_TAX_RULE = 'none'
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def money(value):
+    """Round to cents, half up."""
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def line_amounts(qty, rate, days, discount):
+    """
+    Cached amounts of a quote line.
+
+    Returns:
+        tuple: (gross = qty x rate x days, discount = gross x discount%), both in cents
+    """
+    gross = money(Decimal(qty) * Decimal(rate) * Decimal(days))
+    return gross, money(gross * Decimal(discount or 0) / 100)
+
+
+def _rule_key(tax_rule_id):
+    return str(tax_rule_id) if tax_rule_id is not None else NO_TAX_RULE
+
+
+def _render(subtotal, discount, rules):
+    """
+    Quote.totals from running sums.
+
+    Tax is rounded once per rule on that rule's net amount, so an incremental
+    update and a full recompute always agree to the cent.
+
+    Args:
+        subtotal (Decimal): sum of line gross amounts
+        discount (Decimal): sum of line discounts
+        rules: {rule key: {'rate': Decimal, 'net': Decimal}}
+    """
+    tax_by_rule = {}
+    tax = ZERO
+    for key, rule in sorted(rules.items()):
+        if not rule['net']:
+            continue
+        rule_tax = money(rule['net'] * rule['rate'] / 100)
+        tax += rule_tax
+        tax_by_rule[key] = {'rate': str(rule['rate']), 'net': str(money(rule['net'])), 'tax': str(rule_tax)}
+    net = subtotal - discount
+    return {
+        'subtotal': str(money(subtotal)),
+        'discount': str(money(discount)),
+        'net': str(money(net)),
+        'tax': str(money(tax)),
+        'total': str(money(net + tax)),
+        'taxByRule': tax_by_rule,
+    }
+
+
+def compute_totals(quote):
+    """
+    Totals of a quote from its cached line amounts, in one grouped aggregate.
+
+    Args:
+        quote: The Quote object or ID
+
+    Returns:
+        dict: {'subtotal', 'discount', 'net', 'tax', 'total'} as decimal
+        strings, plus 'taxByRule': {ruleId | 'none': {'rate', 'net', 'tax'}}
+    """
+    from .models import QuoteLine
+
+    rows = (QuoteLine.objects
+            .filter(quoteId=quote)
+            .order_by()
+            .values('taxRuleId', 'taxRuleId__rate')
+            .annotate(gross=Sum('grossAmount'), discount=Sum('discountAmount')))
+    subtotal = discount = ZERO
+    rules = {}
+    for row in rows:
+        gross, line_discount = row['gross'] or ZERO, row['discount'] or ZERO
+        subtotal += gross
+        discount += line_discount
+        rules[_rule_key(row['taxRuleId'])] = {
+            'rate': money(row['taxRuleId__rate'] or 0),
+            'net': gross - line_discount,
+        }
+    return _render(subtotal, discount, rules)
+
+
+def recalculate_quote_totals(quote):
+    """
+    Recompute and store the totals of a quote.
+
+    Returns:
+        dict: the new Quote.totals
+    """
+    from .models import Quote
+
+    totals = compute_totals(quote)
+    Quote.objects.filter(pk=getattr(quote, 'pk', quote)).update(totals=totals)
+    return totals
+
+
+def apply_line_delta(quote_id, previous=None, current=None):
+    """
+    Update a quote's stored totals for one changed line without rescanning it.
+
+    Quotes whose totals were not produced by this engine are recomputed in
+    full instead.
+
+    Args:
+        quote_id: id of the quote the contributions belong to
+        previous: (gross, discount, taxRuleId) the line contributed before, or None
+        current: (gross, discount, taxRuleId) it contributes now, or None
+    """
+    from refdata.models import TaxRule
+    from .models import Quote
+
+    with transaction.atomic():
+        totals = Quote.objects.select_for_update().filter(pk=quote_id).values_list('totals', flat=True).first()
+        if totals is None:
+            return
+        if 'taxByRule' not in totals:
+            recalculate_quote_totals(quote_id)
+            return
+
+        subtotal = Decimal(totals['subtotal'])
+        discount = Decimal(totals['discount'])
+        rules = {
+            key: {'rate': Decimal(rule['rate']), 'net': Decimal(rule['net'])}
+            for key, rule in totals['taxByRule'].items()
+        }
+        for contribution, sign in ((previous, -1), (current, 1)):
+            if contribution is None:
+                continue
+            gross, line_discount, tax_rule_id = contribution
+            key = _rule_key(tax_rule_id)
+            if key not in rules:
+                rate = TaxRule.objects.filter(pk=tax_rule_id).values_list('rate', flat=True).first()
+                rules[key] = {'rate': money(rate or 0), 'net': ZERO}
+            subtotal += sign * gross
+            discount += sign * line_discount
+            rules[key]['net'] += sign * (gross - line_discount)
+
+        Quote.objects.filter(pk=quote_id).update(totals=_render(subtotal, discount, rules))
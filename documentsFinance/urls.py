@@ -0,0 +1,17 @@
+from django.urls import path
+from . import views
+
+app_name = 'documents'
+
+urlpatterns = [
+    path('quotes/<int:quote_id>/lines/reorder/', views.QuoteLineReorderAPIView.as_view(), name='quote-line-reorder'),
+    path('quotes/<int:quote_id>/sections/reorder/', views.QuoteSectionReorderAPIView.as_view(), name='quote-section-reorder'),
+    path('quotes/<int:quote_id>/versions/', views.QuoteNewVersionAPIView.as_view(), name='quote-new-version'),
+    path('quotes/<int:quote_id>/diff/<int:other_id>/', views.QuoteDiffAPIView.as_view(), name='quote-diff'),
+    path('quotes/<int:quote_id>/pdf/', views.QuotePdfAPIView.as_view(), name='quote-pdf'),
+    path('invoices/aging/', views.InvoiceAgingAPIView.as_view(), name='invoice-aging'),
+    path('invoices/payments/import/', views.PaymentImportAPIView.as_view(), name='payment-import'),
+    path('invoices/batch-pdf/', views.InvoiceBatchPdfAPIView.as_view(), name='invoice-batch-pdf'),
+    path('invoices/batch-pdf/<int:pk>/', views.InvoiceBatchJobAPIView.as_view(), name='invoice-batch-job'),
+    path('render-jobs/<int:pk>/', views.RenderJobAPIView.as_view(), name='render-job'),
+]
@@ -1,3 +1,245 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .models import InvoiceBatchJob, Quote, QuoteLine, QuoteSection, RenderJob
+from .diff import diff_quotes
+from .invoice_batch import company_invoices, ensure_renderer, request_invoice_batch
+from .payment_import import import_payments, read_statement
+from .receivables import cached_aging_report, empty_aging_row
+from .rendering import RenderError, request_quote_pdf
+from .serializers import BulkReorderSerializer, InvoiceBatchSerializer, PaymentImportSerializer
+
+
+class BulkReorderAPIView(APIView):
+    """
+    Base endpoint applying a drag-and-drop ordering to one quote in a single call.
+
+    Accepts {"ids": [...]} listing every row of the quote in its new order.
+    """
+    permission_classes = [IsAuthenticated]
+    model = None
+
+    def post(self, request, quote_id):
+        quote = get_object_or_404(Quote, pk=quote_id, projectId__account__company=request.user.company)
+        serializer = BulkReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            self.model.bulk_reorder(quote, serializer.validated_data['ids'])
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        orders = self.model.objects.filter(quoteId=quote).values_list('pk', 'order')
+        return Response({'orders': {pk: order for pk, order in orders}}, status=status.HTTP_200_OK)
+
+
+class QuoteLineReorderAPIView(BulkReorderAPIView):
+    """
+    API endpoint for reordering all lines of a quote.
+    """
+    model = QuoteLine
+
+
+class QuoteSectionReorderAPIView(BulkReorderAPIView):
+    """
+    API endpoint for reordering all sections of a quote.
+    """
+    model = QuoteSection
+
+
+class QuoteNewVersionAPIView(APIView):
+    """
+    API endpoint for branching a new draft version of a quote.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, quote_id):
+        quote = get_object_or_404(Quote, pk=quote_id, projectId__account__company=request.user.company)
+        clone = quote.new_version()
+        return Response({'id': clone.pk, 'number': clone.number, 'version': clone.version},
+                        status=status.HTTP_201_CREATED)
+
+
+class QuoteDiffAPIView(APIView):
+    """
+    API endpoint for the line-level changes between two versions of a quote.
+
+    Diffs from quotes/<quote_id>/ to quotes/<other_id>/: added, removed,
+    changed and moved lines with their impact on the net amount.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, quote_id, other_id):
+        quotes = Quote.objects.filter(projectId__account__company=request.user.company)
+        base = get_object_or_404(quotes, pk=quote_id)
+        other = get_object_or_404(quotes, pk=other_id)
+        data = diff_quotes(base, other)
+        data['from'] = {'id': base.pk, 'number': base.number, 'version': base.version}
+        data['to'] = {'id': other.pk, 'number': other.number, 'version': other.version}
+        return Response(data, status=status.HTTP_200_OK)
+
+
+def render_job_payload(request, job):
+    data = {
+        'id': job.pk,
+        'status': job.status,
+        'poll': request.build_absolute_uri(reverse('documents:render-job', args=[job.pk])),
+    }
+    if job.status == 'done':
+        data['pdf'] = request.build_absolute_uri(job.pdf.url)
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return data
+
+
+def invoice_batch_payload(request, job):
+    data = {
+        'id': job.pk,
+        'status': job.status,
+        'invoices': len(job.invoiceIds),
+        'poll': request.build_absolute_uri(reverse('documents:invoice-batch-job', args=[job.pk])),
+    }
+    if job.status == 'done':
+        data['archive'] = request.build_absolute_uri(job.archive.url)
+        data['timings'] = job.summary
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return data
+
+
+def render_job_response(request, job, payload=render_job_payload):
+    """200 with the file link once a job finished, 202 with a poll URL while it runs."""
+    data = payload(request, job)
+    if job.status in ('queued', 'rendering'):
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['poll']})
+    return Response(data, status=status.HTTP_200_OK)
+
+
+class QuotePdfAPIView(APIView):
+    """
+    API endpoint for requesting a quote PDF.
+
+    Renders happen on a background pool; unchanged quotes reuse their last
+    render. Responds 202 with a poll URL while the render is in progress.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, quote_id):
+        quote = get_object_or_404(Quote, pk=quote_id, projectId__account__company=request.user.company)
+        return render_job_response(request, request_quote_pdf(quote))
+
+
+class RenderJobAPIView(APIView):
+    """
+    API endpoint for polling a quote render job.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(RenderJob, pk=pk, quoteId__projectId__account__company=request.user.company)
+        return render_job_response(request, job)
+
+
+class InvoiceBatchPdfAPIView(APIView):
+    """
+    API endpoint for rendering many invoice PDFs into one zip.
+
+    Accepts {"ids": [...]} and/or {"status": ...} matching at most
+    max_invoices invoices (INVOICE_BATCH_API_LIMIT). The batch is rendered
+    in the background on the process pool; responds 202 with a poll URL
+    that links the archive once it is done. The archive ends with
+    timings.csv holding per-document render times.
+    """
+    permission_classes = [IsAuthenticated]
+    max_invoices = InvoiceBatchSerializer.MAX_INVOICES
+
+    def post(self, request):
+        serializer = InvoiceBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ensure_renderer()
+        except RenderError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        invoices = company_invoices(
+            request.user.company,
+            ids=serializer.validated_data.get('ids'),
+            status=serializer.validated_data.get('status'),
+        )
+        count = invoices.count()
+        if not count:
+            return Response({'detail': 'No invoices match.'}, status=status.HTTP_404_NOT_FOUND)
+        limit = getattr(settings, 'INVOICE_BATCH_API_LIMIT', self.max_invoices)
+        if count > limit:
+            return Response(
+                {'detail': f'{count} invoices match; at most {limit} can be rendered at once. '
+                           f'Use the render_invoices command for larger batches.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        job = request_invoice_batch(request.user.company, invoices)
+        return render_job_response(request, job, invoice_batch_payload)
+
+
+class InvoiceBatchJobAPIView(APIView):
+    """
+    API endpoint for polling an invoice batch.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(InvoiceBatchJob, pk=pk, company=request.user.company)
+        return render_job_response(request, job, invoice_batch_payload)
+
+
+class InvoiceAgingAPIView(APIView):
+    """
+    API endpoint for the receivables aging report of the user's company.
+
+    Open balances are bucketed by days past due (current, 0-30, 31-60,
+    61-90, 90+). The report is built for all companies in one grouped query
+    and shared between requests; ?date=YYYY-MM-DD ages as of another day.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        today = timezone.localdate()
+        if request.query_params.get('date'):
+            try:
+                today = parse_date(request.query_params['date'])
+            except ValueError:
+                today = None
+            if today is None:
+                return Response({'detail': 'date must be YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        report = cached_aging_report(today)
+        row = report.get(request.user.company_id) or empty_aging_row()
+        return Response({'date': today.isoformat(), **row}, status=status.HTTP_200_OK)
+
+
+class PaymentImportAPIView(APIView):
+    """
+    API endpoint for importing a bank statement as payments.
+
+    Accepts a multipart "file" with a CSV export or a CAMT.053/054 XML
+    statement (picked by "format" or the .xml extension). The file is read
+    row by row; rows are matched to the company's invoice numbers and
+    earlier payment references and unmatched rows are reported back.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = PaymentImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        try:
+            rows = read_statement(upload, upload.name, serializer.validated_data.get('format'))
+            result = import_payments(rows, request.user.company)
+        except (ValueError, SyntaxError, UnicodeDecodeError) as e:
+            # ParseError from iterparse is a SyntaxError
+            return Response({'detail': f'Unreadable statement: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result._asdict(), status=status.HTTP_200_OK)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EquipmentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'equipment'
+
+    def ready(self):
+        # Connect cache invalidation and search index handlers
+        from equipment import signals
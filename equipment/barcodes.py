@@ -0,0 +1,215 @@
+"""
+Barcode resolution for scanning.
+
+resolve_barcode turns a scanned value into a summary of what it labels
+(the asset with its catalog item, location and status, or a catalog
+item, case or kit). Summaries are cached at two levels:
+
+- an in-process LRU of LOCAL_CACHE_SIZE entries, each trusted for
+  LOCAL_CACHE_TTL seconds, so repeated scans on a handset skip even the
+  cache round trip;
+- the Django cache, for BARCODE_CACHE_TIMEOUT.
+
+Saving or deleting a barcode, asset, catalog item, case or kit evicts the
+affected summaries from the Django cache and from the LRU of the process
+that made the change; the LRU of other processes catches up within
+LOCAL_CACHE_TTL. Evictions only reach other processes if the Django cache
+is shared (Redis via REDIS_URL, see settings); with the in-memory
+fallback each process caches on its own. Unknown values are not cached,
+so barcodes created with bulk_create resolve right away.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from equipment.models import Asset, Barcode, Case, CatalogItem, Kit
+
+BARCODE_CACHE_TIMEOUT = 60 * 60
+LOCAL_CACHE_SIZE = 4096
+LOCAL_CACHE_TTL = 5
+WARM_BATCH_SIZE = 1000
+
+
+class LocalCache:
+    """
+    Small thread-safe LRU whose entries expire after ttl seconds.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+
+
+def _cache_key(value):
+    # Barcode values may hold characters memcached does not accept in keys
+    return f"equipment:barcode:{hashlib.sha1(value.encode()).hexdigest()}"
+
+
+def _asset_summary(asset):
+    item, location = asset.catalogItem, asset.location
+    return {
+        'asset': {'id': asset.pk, 'serial': asset.serial, 'condition': asset.condition, 'status': asset.status},
+        'catalogItem': _catalog_item_summary(item)['catalogItem'],
+        'location': location and {'id': location.pk, 'name': location.name, 'type': location.type},
+        'status': asset.status,
+    }
+
+
+def _catalog_item_summary(item):
+    return {'catalogItem': {
+        'id': item.pk, 'sku': item.sku, 'name': item.name, 'category': item.category,
+        'brand': item.brand, 'model': item.model,
+    }}
+
+
+def _case_summary(case):
+    return {'case': {'id': case.pk, 'code': case.code, 'caseType': case.caseType}}
+
+
+def _kit_summary(kit):
+    return {'kit': {'id': kit.pk, 'sku': kit.sku, 'name': kit.name}}
+
+
+ENTITY_LOADERS = {
+    'asset': (lambda: Asset.all_objects.select_related('catalogItem', 'location'), _asset_summary),
+    'catalog_item': (lambda: CatalogItem.all_objects.all(), _catalog_item_summary),
+    'case': (lambda: Case.all_objects.all(), _case_summary),
+    'kit': (lambda: Kit.all_objects.all(), _kit_summary),
+}
+
+
+def summarize(barcodes):
+    """
+    Summaries of barcodes, loading their entities with one query per entity type.
+
+    Args:
+        barcodes: Barcode instances
+
+    Returns:
+        dict: {value: summary}; barcodes whose entity no longer exists are left out
+    """
+    by_type = {}
+    for barcode in barcodes:
+        by_type.setdefault(barcode.entityType, []).append(barcode)
+    summaries = {}
+    for entity_type, group in by_type.items():
+        if entity_type not in ENTITY_LOADERS:
+            continue
+        queryset, summary = ENTITY_LOADERS[entity_type]
+        entities = queryset().in_bulk({barcode.entityId for barcode in group})
+        for barcode in group:
+            entity = entities.get(barcode.entityId)
+            if entity is not None:
+                summaries[barcode.value] = {
+                    'barcode': barcode.value, 'entityType': entity_type, 'entityId': barcode.entityId,
+                    'company': barcode.company_id,
+                    'asset': None, 'catalogItem': None, 'location': None, 'status': None,
+                    **summary(entity),
+                }
+    return summaries
+
+
+def resolve_barcode(company, value):
+    """
+    What a scanned barcode labels, as seen by a company.
+
+    Args:
+        company: Company (or id) doing the scan; other companies' barcodes
+            resolve to None
+        value: scanned barcode value
+
+    Returns:
+        dict or None: {'barcode', 'entityType', 'entityId', 'company',
+        'asset', 'catalogItem', 'location', 'status'}, plus 'case' or 'kit'
+        for those entity types
+    """
+    key = _cache_key(value)
+    summary = local_cache.get(key)
+    if summary is None:
+        summary = cache.get(key)
+        if summary is None:
+            barcode = Barcode.all_objects.filter(value=value).first()
+            summary = barcode and summarize([barcode]).get(value)
+            if summary is None:
+                return None
+            cache.set(key, summary, BARCODE_CACHE_TIMEOUT)
+        local_cache.set(key, summary)
+    if summary['company'] != getattr(company, 'pk', company):
+        return None
+    return summary
+
+
+def warm_barcodes(company):
+    """
+    Load every barcode of a company into the Django cache. Only useful
+    with a shared cache; with the in-memory fallback the summaries stay in
+    the calling process.
+
+    Returns:
+        int: number of barcodes cached
+    """
+    count = 0
+    batch = []
+    barcodes = Barcode.all_objects.filter(company=company).order_by('pk')
+    for barcode in barcodes.iterator(chunk_size=WARM_BATCH_SIZE):
+        batch.append(barcode)
+        if len(batch) == WARM_BATCH_SIZE:
+            count += _cache_summaries(batch)
+            batch = []
+    return count + _cache_summaries(batch)
+
+
+def _cache_summaries(barcodes):
+    summaries = summarize(barcodes)
+    cache.set_many({_cache_key(value): summary for value, summary in summaries.items()}, BARCODE_CACHE_TIMEOUT)
+    return len(summaries)
+
+
+def invalidate_barcodes(values):
+    keys = [_cache_key(value) for value in values]
+    if keys:
+        cache.delete_many(keys)
+        local_cache.delete_many(keys)
+
+
+def invalidate_entities(entity_type, ids):
+    """Evict the summaries of every barcode labelling the given entities."""
+    invalidate_barcodes(
+        Barcode.all_objects.filter(entityType=entity_type, entityId__in=list(ids)).values_list('value', flat=True)
+    )
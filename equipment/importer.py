@@ -0,0 +1,353 @@
+"""
+Bulk catalog and asset import from CSV or XLSX.
+
+One row per asset; rows without a serial only add (or reference) a
+catalog item. Columns, matched case-insensitively:
+
+- catalog item: sku, name, model, category, subcategory, brand,
+  defaultRate, pricePolicy (by name), rentable, sellable, weight, power
+- asset: serial, condition, status, location (StockLocation name)
+- barcode: labels the asset, or the catalog item on rows without a serial
+
+A row refers to an existing catalog item by sku, or by name and model.
+New items get a SKU from equipment.skus unless the row gives one.
+"""
+import zipfile
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.db import IntegrityError, transaction
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from company.csvfiles import open_csv
+from equipment.models import Asset, Barcode, CatalogItem, StockLocation
+from equipment.search import index_items
+from equipment.skus import allocate_skus, claim_skus, sku_base, skus_taken_elsewhere
+from refdata.models import PricePolicy
+
+CHUNK_SIZE = 2000
+BULK_BATCH_SIZE = 1000
+ERROR_REPORT_LIMIT = 1000
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', ''}
+ASSET_CONDITIONS = {value for value, _ in Asset.CONDITION_CHOICES}
+ASSET_STATUSES = {value for value, _ in Asset.STATUS_CHOICES}
+
+ImportRow = namedtuple('ImportRow', ['line', 'item', 'key', 'asset', 'barcode'])
+ImportResult = namedtuple('ImportResult', ['rows', 'catalogItems', 'assets', 'barcodes', 'errors', 'errorCount'])
+
+
+class RowError(ValueError):
+    """Raised for a row that cannot be imported."""
+
+
+def read_csv(fileobj):
+    """
+    Yield (line, {column: value}) from a CSV file, one line at a time.
+    """
+    names, reader = open_csv(fileobj)
+    for line, values in enumerate(reader, 2):
+        if any(value.strip() for value in values):
+            yield line, dict(zip(names, (value.strip() for value in values)))
+
+
+def read_xlsx(fileobj):
+    """
+    Yield (line, {column: value}) from the first sheet of an XLSX file.
+
+    The workbook is opened read-only so rows are streamed rather than
+    loaded at once.
+    """
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError) as exc:
+        raise ValueError(f"Not an .xlsx workbook: {exc}") from exc
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        names = [str(name or '').strip().lower() for name in next(rows, ())]
+        for line, values in enumerate(rows, 2):
+            values = ['' if value is None else str(value).strip() for value in values]
+            if any(values):
+                yield line, dict(zip(names, values))
+    finally:
+        workbook.close()
+
+
+def read_sheet(fileobj, name='', fmt=None):
+    if fmt is None:
+        fmt = 'xlsx' if name.lower().endswith('.xlsx') else 'csv'
+    return read_xlsx(fileobj) if fmt == 'xlsx' else read_csv(fileobj)
+
+
+def _decimal(value, column, field, required=False):
+    if not value:
+        if required:
+            raise RowError(f"{column} is required")
+        return None
+    try:
+        number = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        raise RowError(f"{column} is not a number: {value}")
+    if not number.is_finite():
+        raise RowError(f"{column} is not a number: {value}")
+    try:
+        DecimalValidator(field.max_digits, field.decimal_places)(number)
+    except ValidationError:
+        raise RowError(f"{column} does not fit {field.max_digits} digits "
+                       f"with {field.decimal_places} decimals: {value}")
+    return number
+
+
+def _text(values, column, field):
+    value = values.get(column.lower(), '')
+    if len(value) > field.max_length:
+        raise RowError(f"{column} is longer than {field.max_length} characters")
+    return value
+
+
+def _boolean(value, column, default):
+    value = (value or '').lower()
+    if not value:
+        return default
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f"{column} is not a yes/no value: {value}")
+
+
+class CatalogImporter:
+    """
+    Imports rows for one company.
+
+    Price policies, stock locations and the company's catalog are read once
+    into dicts; rows are then validated and written CHUNK_SIZE at a time
+    with bulk_create, one transaction per chunk. A row that fails is
+    reported and skipped, the rest of its chunk is written.
+    """
+
+    def __init__(self, company, on_error=None):
+        self.company = company
+        self.on_error = on_error
+        self.policies = {
+            name.lower(): pk for pk, name in PricePolicy.all_objects.filter(company=company).values_list('pk', 'name')
+        }
+        self.locations = {
+            name.lower(): pk for pk, name in StockLocation.all_objects.filter(company=company).values_list('pk', 'name')
+        }
+        self.by_sku = {}
+        self.by_name = {}
+        for pk, sku, name, model in CatalogItem.all_objects.filter(company=company).values_list(
+                'pk', 'sku', 'name', 'model'):
+            self.by_sku[sku.lower()] = pk
+            self.by_name.setdefault(self._name_key(name, model), pk)
+        # Ids of the items this import created, by ImportRow.key
+        self.new_item_ids = {}
+        self.rows = self.items_created = self.assets_created = self.barcodes_created = 0
+        self.errors, self.error_count = [], 0
+
+    @staticmethod
+    def _name_key(name, model):
+        return (name or '').strip().lower(), (model or '').strip().lower()
+
+    def error(self, line, message):
+        if self.on_error is not None:
+            self.on_error(line, message)
+        self.error_count += 1
+        if len(self.errors) < ERROR_REPORT_LIMIT:
+            self.errors.append({'line': line, 'error': message})
+
+    def parse(self, line, values):
+        """
+        Validate one row.
+
+        Returns:
+            ImportRow: item is an existing CatalogItem id or a dict of fields
+            for a new one, which key identifies across rows; asset is a dict
+            of Asset fields or None
+        """
+        item_field = CatalogItem._meta.get_field
+        sku = _text(values, 'sku', item_field('sku'))
+        name = _text(values, 'name', item_field('name'))
+        model = _text(values, 'model', item_field('model')) or None
+        item = key = None
+        if sku:
+            item = self.by_sku.get(sku.lower())
+        if item is None and name:
+            item = self.by_name.get(self._name_key(name, model))
+        if item is None:
+            if not name:
+                raise RowError("name is required for a new catalog item")
+            if not values.get('category'):
+                raise RowError("category is required for a new catalog item")
+            policy = values.get('pricepolicy', '')
+            if policy and policy.lower() not in self.policies:
+                raise RowError(f"unknown price policy: {policy}")
+            item = {
+                'sku': sku or None,
+                'name': name,
+                'model': model,
+                'category': _text(values, 'category', item_field('category')),
+                'subcategory': _text(values, 'subcategory', item_field('subcategory')) or None,
+                'brand': _text(values, 'brand', item_field('brand')) or None,
+                'defaultRate': _decimal(values.get('defaultrate'), 'defaultRate', item_field('defaultRate'),
+                                        required=True),
+                'pricePolicy_id': self.policies.get(policy.lower()) if policy else None,
+                'rentable': _boolean(values.get('rentable'), 'rentable', True),
+                'sellable': _boolean(values.get('sellable'), 'sellable', False),
+                'weight': _decimal(values.get('weight'), 'weight', item_field('weight')),
+                'power': _text(values, 'power', item_field('power')) or None,
+            }
+            key = ('sku', sku.lower()) if sku else ('name', self._name_key(name, model))
+
+        asset = None
+        if values.get('serial'):
+            condition = (values.get('condition') or 'good').lower()
+            status = (values.get('status') or 'available').lower()
+            if condition not in ASSET_CONDITIONS:
+                raise RowError(f"unknown condition: {condition}")
+            if status not in ASSET_STATUSES:
+                raise RowError(f"unknown status: {status}")
+            location = values.get('location', '')
+            if location and location.lower() not in self.locations:
+                raise RowError(f"unknown location: {location}")
+            asset = {
+                'serial': _text(values, 'serial', Asset._meta.get_field('serial')),
+                'condition': condition,
+                'status': status,
+                'location_id': self.locations.get(location.lower()) if location else None,
+            }
+        barcode = _text(values, 'barcode', Barcode._meta.get_field('value')) or None
+        return ImportRow(line, item, key, asset, barcode)
+
+    def without_taken_barcodes(self, rows):
+        """Report and drop rows whose barcode exists or repeats one earlier in the chunk."""
+        taken = set(Barcode.all_objects.filter(value__in=[row.barcode for row in rows if row.barcode])
+                    .values_list('value', flat=True))
+        accepted = []
+        for row in rows:
+            if row.barcode in taken:
+                self.error(row.line, f"barcode already in use: {row.barcode}")
+                continue
+            if row.barcode:
+                taken.add(row.barcode)
+            accepted.append(row)
+        return accepted
+
+    def without_foreign_skus(self, rows):
+        """Report and drop rows creating an item under a SKU another company uses (global SKUs only)."""
+        taken = skus_taken_elsewhere(self.company, [row.item['sku'] for row in rows if row.key and row.item['sku']])
+        accepted = []
+        for row in rows:
+            if row.key and row.item['sku'] in taken:
+                self.error(row.line, f"sku already used by another company: {row.item['sku']}")
+                continue
+            accepted.append(row)
+        return accepted
+
+    def write(self, rows):
+        """Write one chunk of validated rows in one transaction."""
+        with transaction.atomic():
+            # New catalog items, once each however many rows mention them
+            new_items = {}
+            for row in rows:
+                if row.key is not None and row.key not in self.new_item_ids:
+                    new_items.setdefault(row.key, row.item)
+            claim_skus(self.company, [fields['sku'] for fields in new_items.values() if fields['sku']])
+            unnamed = [key for key, fields in new_items.items() if not fields['sku']]
+            skus = dict(zip(unnamed, allocate_skus(
+                self.company, [sku_base(new_items[key]['name'], new_items[key]['model']) for key in unnamed])))
+            created = CatalogItem.all_objects.bulk_create(
+                [
+                    CatalogItem(company_id=self.company.pk, **{**fields, 'sku': fields['sku'] or skus[key]})
+                    for key, fields in new_items.items()
+                ],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            item_ids = {**self.new_item_ids, **{key: item.pk for key, item in zip(new_items, created)}}
+
+            def item_id(row):
+                return row.item if row.key is None else item_ids[row.key]
+
+            with_assets = [row for row in rows if row.asset]
+            assets = Asset.all_objects.bulk_create(
+                [Asset(company_id=self.company.pk, catalogItem_id=item_id(row), **row.asset) for row in with_assets],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            asset_ids = {row.line: asset.pk for row, asset in zip(with_assets, assets)}
+            barcodes = Barcode.all_objects.bulk_create(
+                [
+                    Barcode(company_id=self.company.pk, value=row.barcode,
+                            entityType='asset' if row.asset else 'catalog_item',
+                            entityId=asset_ids[row.line] if row.asset else item_id(row))
+                    for row in rows if row.barcode
+                ],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            # bulk_create skips the signals that keep the search index current
+            index_items(created)
+
+        # Later rows refer to these items instead of creating them again
+        self.new_item_ids = item_ids
+        for item in created:
+            self.by_sku[item.sku.lower()] = item.pk
+            self.by_name.setdefault(self._name_key(item.name, item.model), item.pk)
+        self.items_created += len(created)
+        self.assets_created += len(assets)
+        self.barcodes_created += len(barcodes)
+
+    def flush(self, rows):
+        rows = self.without_taken_barcodes(self.without_foreign_skus(rows))
+        if not rows:
+            return
+        try:
+            self.write(rows)
+        except IntegrityError:
+            # Something the checks above missed; find the offending rows
+            for row in rows:
+                try:
+                    self.write([row])
+                except IntegrityError as exc:
+                    self.error(row.line, f"could not be saved: {exc}")
+
+    def run(self, rows):
+        """
+        Import (line, {column: value}) rows.
+
+        Returns:
+            ImportResult: counts plus the first ERROR_REPORT_LIMIT errors as
+            {'line', 'error'}
+        """
+        chunk = []
+        for line, values in rows:
+            self.rows += 1
+            try:
+                chunk.append(self.parse(line, values))
+            except RowError as exc:
+                self.error(line, str(exc))
+            if len(chunk) == CHUNK_SIZE:
+                self.flush(chunk)
+                chunk = []
+        self.flush(chunk)
+        return ImportResult(self.rows, self.items_created, self.assets_created, self.barcodes_created,
+                            self.errors, self.error_count)
+
+
+def import_catalog(rows, company, on_error=None):
+    """
+    Import catalog items, assets and barcodes for a company.
+
+    Args:
+        rows: (line, {column: value}) pairs, e.g. from read_sheet
+        company: Company the rows belong to
+        on_error: optional callable(line, message) called for every
+            rejected row, including those past ERROR_REPORT_LIMIT
+
+    Returns:
+        ImportResult
+    """
+    return CatalogImporter(company, on_error).run(rows)
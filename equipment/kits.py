@@ -0,0 +1,182 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+
+from equipment.models import CatalogItem, Kit, KitItem
+
+KIT_CACHE_TIMEOUT = 60 * 60
+
+
+class KitCycleError(ValueError):
+    """Raised when a kit (directly or through nested kits) contains itself."""
+
+    def __init__(self, path):
+        self.path = path
+        super().__init__("Kit cycle detected: " + " -> ".join(str(kit_id) for kit_id in path))
+
+
+def _cache_key(company_id):
+    return f"equipment:kits:{company_id}"
+
+
+def _json_components(items):
+    """
+    Components from the legacy Kit.items JSON, [{catalogItemId|kitId, qty}].
+    """
+    for entry in items or []:
+        qty = int(entry.get('qty', 1))
+        if entry.get('catalogItemId'):
+            yield 'catalog', entry['catalogItemId'], qty
+        elif entry.get('kitId'):
+            yield 'kit', entry['kitId'], qty
+
+
+def _load_graph(company_id):
+    """
+    Direct components of every kit of a company: {kitId: [(kind, id, qty)]}.
+
+    KitItem rows are the source of truth; kits without any KitItem rows
+    fall back to their items JSON.
+    """
+    catalog_type = ContentType.objects.get_for_model(CatalogItem)
+    kit_type = ContentType.objects.get_for_model(Kit)
+    kinds = {catalog_type.pk: 'catalog', kit_type.pk: 'kit'}
+
+    graph = defaultdict(list)
+    rows = KitItem.objects.filter(kit__company_id=company_id).values_list(
+        'kit_id', 'content_type_id', 'object_id', 'quantity',
+    )
+    for kit_id, content_type_id, object_id, qty in rows:
+        if content_type_id in kinds:
+            graph[kit_id].append((kinds[content_type_id], object_id, qty))
+
+    for kit_id, items in Kit.objects.filter(company_id=company_id).values_list('pk', 'items'):
+        if kit_id not in graph:
+            graph[kit_id] = list(_json_components(items))
+    return graph
+
+
+def _flatten(graph):
+    """
+    Leaf catalog items of every kit in the graph.
+
+    Returns:
+        tuple: ({kitId: {catalogItemId: qty}}, {kitId: cycle path})
+    """
+    leaves = {}
+    cycles = {}
+
+    def visit(kit_id, path):
+        if kit_id in leaves:
+            return leaves[kit_id]
+        if kit_id in path:
+            raise KitCycleError(path[path.index(kit_id):] + [kit_id])
+        path.append(kit_id)
+        totals = defaultdict(int)
+        for kind, ref_id, qty in graph.get(kit_id, ()):
+            if kind == 'catalog':
+                totals[ref_id] += qty
+            else:
+                for catalog_id, leaf_qty in visit(ref_id, path).items():
+                    totals[catalog_id] += leaf_qty * qty
+        path.pop()
+        leaves[kit_id] = dict(totals)
+        return leaves[kit_id]
+
+    for kit_id in graph:
+        try:
+            visit(kit_id, [])
+        except KitCycleError as exc:
+            cycles[kit_id] = exc.path
+    return leaves, cycles
+
+
+def company_kits(company_id):
+    """
+    Flattened kits of a company, cached until a Kit or KitItem changes.
+
+    Returns:
+        dict: {'leaves': {kitId: {catalogItemId: qty}},
+               'cycles': {kitId: cycle path},
+               'containing': {catalogItemId: {kitId: qty}}}
+    """
+    key = _cache_key(company_id)
+    flattened = cache.get(key)
+    if flattened is None:
+        leaves, cycles = _flatten(_load_graph(company_id))
+        containing = defaultdict(dict)
+        for kit_id, parts in leaves.items():
+            for catalog_id, qty in parts.items():
+                containing[catalog_id][kit_id] = qty
+        flattened = {'leaves': leaves, 'cycles': cycles, 'containing': dict(containing)}
+        cache.set(key, flattened, KIT_CACHE_TIMEOUT)
+    return flattened
+
+
+def explode_kits(kit_ids, skip_cycles=False):
+    """
+    Leaf catalog items for several kits, as {kitId: {catalogItemId: qty}}.
+
+    Args:
+        kit_ids: ids of the kits to explode
+        skip_cycles: map kits that contain themselves to {} instead of raising
+
+    Raises:
+        KitCycleError: if one of the kits contains itself and skip_cycles is False
+    """
+    exploded = {}
+    companies = Kit.objects.filter(pk__in=kit_ids).values_list('pk', 'company_id')
+    for kit_id, company_id in companies:
+        flattened = company_kits(company_id)
+        if kit_id in flattened['cycles']:
+            if not skip_cycles:
+                raise KitCycleError(flattened['cycles'][kit_id])
+            exploded[kit_id] = {}
+            continue
+        exploded[kit_id] = dict(flattened['leaves'].get(kit_id, {}))
+    return exploded
+
+
+def explode_kit(kit_id):
+    """
+    Leaf catalog items of a kit, as {catalogItemId: qty}.
+    """
+    return explode_kits([kit_id]).get(kit_id, {})
+
+
+def kits_containing(catalog_ids):
+    """
+    Kits that hold the given catalog items, as {catalogItemId: {kitId: qty}}.
+    """
+    containing = {}
+    companies = set(CatalogItem.objects.filter(pk__in=catalog_ids).values_list('company_id', flat=True))
+    for company_id in companies:
+        for catalog_id, kits in company_kits(company_id)['containing'].items():
+            if catalog_id in catalog_ids:
+                containing[catalog_id] = dict(kits)
+    return containing
+
+
+def kits_containing_kits(company_id, kit_ids):
+    """
+    The given kits plus every kit of the company holding one of them,
+    directly or through nested kits.
+    """
+    parents = defaultdict(set)
+    for kit_id, components in _load_graph(company_id).items():
+        for kind, ref_id, _ in components:
+            if kind == 'kit':
+                parents[ref_id].add(kit_id)
+    found = set(kit_ids)
+    pending = list(found)
+    while pending:
+        for parent in parents.get(pending.pop(), ()):
+            if parent not in found:
+                found.add(parent)
+                pending.append(parent)
+    return found
+
+
+def invalidate_company_kits(company_id):
+    cache.delete(_cache_key(company_id))
@@ -0,0 +1,71 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from company.models import Company
+from equipment.models import CatalogItem
+from equipment.search import rebuild_index, search_catalog
+
+BRANDS = ('Shure', 'Sennheiser', 'Yamaha', 'Martin', 'Robe', 'Chauvet', 'Clay Paky', 'd&b', 'L-Acoustics', 'Neumann')
+WORDS = ('wireless', 'microphone', 'speaker', 'moving', 'head', 'wash', 'spot', 'console', 'amplifier', 'cable',
+         'truss', 'stand', 'projector', 'screen', 'monitor', 'subwoofer', 'dimmer', 'hazer', 'par', 'beam')
+CATEGORIES = ('audio', 'light', 'video', 'rigging', 'power')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark catalog typeahead search on a large synthetic catalog (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--company', type=int, help="Company to attach the items to (default: first)")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        companies = Company.objects.all()
+        if options['company'] is not None:
+            companies = companies.filter(pk=options['company'])
+        company = companies.first()
+        if company is None:
+            raise CommandError("A company is needed to attach the benchmark catalog to")
+
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                CatalogItem.all_objects.bulk_create([
+                    CatalogItem(
+                        sku=f'bench-{n}', name=f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {n % 997}',
+                        brand=rng.choice(BRANDS), model=f'{rng.choice("ABCDEFGHKMSX")}{rng.randint(1, 999)}',
+                        category=rng.choice(CATEGORIES), defaultRate=1, company=company,
+                    )
+                    for n in range(options['items'])
+                ], batch_size=1000)
+                started = time.perf_counter()
+                rebuild_index(company)
+                self.stdout.write(f"Indexed {options['items']} items in {time.perf_counter() - started:.1f}s")
+
+                timings = []
+                for _ in range(options['queries']):
+                    word = rng.choice(WORDS + BRANDS)
+                    query = word[:rng.randint(2, len(word))]
+                    if rng.random() < 0.3:
+                        query += ' ' + rng.choice(BRANDS)[:3]
+                    started = time.perf_counter()
+                    search_catalog(company, query)
+                    timings.append((time.perf_counter() - started) * 1000)
+                raise Rollback
+        except Rollback:
+            pass
+
+        timings.sort()
+        self.stdout.write(
+            f"{len(timings)} queries: median {statistics.median(timings):.2f} ms, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms, max {timings[-1]:.2f} ms"
+        )
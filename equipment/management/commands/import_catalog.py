@@ -0,0 +1,45 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from company.models import Company
+from equipment.importer import import_catalog, read_sheet
+
+
+class Command(BaseCommand):
+    help = "Import catalog items, assets and barcodes for a company from a CSV or XLSX sheet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Sheet file, one row per asset")
+        parser.add_argument('--company', type=int, required=True, help="Company id the rows belong to")
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help="Default: xlsx for .xlsx files, else csv")
+        parser.add_argument('--errors', dest='errors_path', help="Write every rejected row to this CSV")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Company {options['company']} does not exist")
+
+        try:
+            with open(options['path'], 'rb') as sheet:
+                rows = read_sheet(sheet, options['path'], options['format'])
+                if options['errors_path']:
+                    with open(options['errors_path'], 'w', newline='') as out:
+                        writer = csv.writer(out)
+                        writer.writerow(['line', 'error'])
+                        result = import_catalog(rows, company, on_error=lambda line, message: writer.writerow(
+                            [line, message]))
+                else:
+                    result = import_catalog(rows, company)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot import {options['path']}: {exc}")
+
+        self.stdout.write(
+            f"Read {result.rows} row(s): {result.catalogItems} catalog item(s), {result.assets} asset(s) "
+            f"and {result.barcodes} barcode(s) created, {result.errorCount} row(s) rejected"
+        )
+        if options['errors_path']:
+            return
+        for error in result.errors:
+            self.stdout.write(f"  line {error['line']}: {error['error']}")
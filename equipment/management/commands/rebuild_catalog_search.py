@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from company.models import Company
+from equipment.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the catalog search index, e.g. after bulk writes that bypassed signals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Only rebuild this company's items")
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company'] is not None:
+            company = Company.objects.filter(pk=options['company']).first()
+            if company is None:
+                raise CommandError(f"Company {options['company']} does not exist")
+        self.stdout.write(f"Indexed {rebuild_index(company)} catalog item(s)")
@@ -0,0 +1,22 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from company.models import Company
+from equipment.barcodes import warm_barcodes
+
+
+class Command(BaseCommand):
+    help = "Preload a company's barcode summaries into the shared cache, e.g. before a load-out"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, required=True, help="Company id whose barcodes are cached")
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            # This process exits with its memory; the web workers would never see it
+            raise CommandError("The cache is per-process; set REDIS_URL to a shared cache before warming it")
+        company = Company.objects.filter(pk=options['company']).first()
+        if company is None:
+            raise CommandError(f"Company {options['company']} does not exist")
+        self.stdout.write(f"Cached {warm_barcodes(company)} barcode(s)")
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0004_company_owner'),
+        ('equipment', '0002_remove_kit_upright_only_kititem'),
+        ('refdata', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['company', 'catalogItem', 'status'], name='idx_asset_company_item'),
+        ),
+        migrations.AddIndex(
+            model_name='barcode',
+            index=models.Index(fields=['company', 'entityType', 'entityId'], name='idx_barcode_company_entity'),
+        ),
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['company', 'code'], name='idx_case_company_code'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogitem',
+            index=models.Index(fields=['company', 'name'], name='idx_catalogitem_company_name'),
+        ),
+        migrations.AddIndex(
+            model_name='kit',
+            index=models.Index(fields=['company', 'name'], name='idx_kit_company_name'),
+        ),
+        migrations.AddIndex(
+            model_name='stocklocation',
+            index=models.Index(fields=['company', 'name'], name='idx_stocklocation_company_name'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0004_company_owner'),
+        ('equipment', '0003_company_indexes'),
+        ('refdata', '0002_company_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='catalogitem',
+            index=models.Index(fields=['company', 'category', 'id'], name='idx_catalogitem_company_cat'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+FTS_TABLE = 'equipment_catalogitem_fts'
+POSTGRES_DOCUMENT = (
+    "(coalesce(name, '') || ' ' || coalesce(brand, '') || ' ' || coalesce(model, '') || ' ' || sku)"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "name, brand, model, sku, category, company_id UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, brand, model, sku, category, company_id) "
+            "SELECT id, name, coalesce(brand, ''), coalesce(model, ''), sku, category, company_id "
+            "FROM equipment_catalogitem"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX idx_catalogitem_search_trgm ON equipment_catalogitem "
+            f"USING gin ({POSTGRES_DOCUMENT} gin_trgm_ops)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS idx_catalogitem_search_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0004_catalogitem_category_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
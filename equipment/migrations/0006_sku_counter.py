@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0004_company_owner'),
+        ('equipment', '0005_catalogitem_search'),
+        ('refdata', '0002_company_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkuCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base', models.CharField(max_length=50)),
+                ('last', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'sku counters',
+            },
+        ),
+        migrations.AlterField(
+            model_name='catalogitem',
+            name='sku',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='catalogitem',
+            constraint=models.UniqueConstraint(fields=('company', 'sku'), name='unique_catalogitem_company_sku'),
+        ),
+        migrations.AddField(
+            model_name='skucounter',
+            name='company',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sku_counters', to='company.company'),
+        ),
+        migrations.AddConstraint(
+            model_name='skucounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('company__isnull', True)), fields=('base',), name='unique_skucounter_global_base'),
+        ),
+        migrations.AddConstraint(
+            model_name='skucounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('company__isnull', False)), fields=('company', 'base'), name='unique_skucounter_company_base'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+FTS_TABLE = 'equipment_catalogitem_fts'
+OLD_POSTGRES_DOCUMENT = (
+    "(coalesce(name, '') || ' ' || coalesce(brand, '') || ' ' || coalesce(model, '') || ' ' || sku)"
+)
+POSTGRES_DOCUMENT = (
+    "(coalesce(name, '') || ' ' || coalesce(brand, '') || ' ' || coalesce(model, '') || ' ' || sku"
+    " || ' ' || category)"
+)
+
+
+def _create_fts(schema_editor, tenant):
+    tenant_column = "tenant, " if tenant else ""
+    tenant_value = "'company' || company_id, " if tenant else ""
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"name, brand, model, sku, category, {tenant_column}company_id UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, brand, model, sku, category, {tenant_column}company_id) "
+        f"SELECT id, name, coalesce(brand, ''), coalesce(model, ''), sku, category, {tenant_value}company_id "
+        "FROM equipment_catalogitem"
+    )
+
+
+def _create_trigram_index(schema_editor, document):
+    schema_editor.execute("DROP INDEX IF EXISTS idx_catalogitem_search_trgm")
+    schema_editor.execute(
+        "CREATE INDEX idx_catalogitem_search_trgm ON equipment_catalogitem "
+        f"USING gin ({document} gin_trgm_ops)"
+    )
+
+
+def add_tenant_and_category(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _create_fts(schema_editor, tenant=True)
+    elif vendor == 'postgresql':
+        _create_trigram_index(schema_editor, POSTGRES_DOCUMENT)
+
+
+def remove_tenant_and_category(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _create_fts(schema_editor, tenant=False)
+    elif vendor == 'postgresql':
+        _create_trigram_index(schema_editor, OLD_POSTGRES_DOCUMENT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0006_sku_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_tenant_and_category, remove_tenant_and_category),
+    ]
@@ -1,5 +1,7 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from company.models import Company
+from company.tenancy import TenantManager
 from refdata.models import PricePolicy
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -9,7 +11,10 @@ from django.contrib.contenttypes.models import ContentType
 
 # CatalogItem model for equipment catalog
 class CatalogItem(models.Model):
-    sku = models.CharField(max_length=50, unique=True)
+    # Unique per company in the database. Unless CATALOG_SKU_SCOPE is
+    # 'company', SKUs are also kept distinct across companies: allocated ones
+    # by equipment.skus, hand-set ones by validate_unique and the importer
+    sku = models.CharField(max_length=50)
     name = models.CharField(max_length=255)
     category = models.CharField(max_length=100)
     subcategory = models.CharField(max_length=100, blank=True, null=True)
@@ -27,11 +32,52 @@ class CatalogItem(models.Model):
     image = models.ImageField(upload_to='catalog_items/', blank=True, null=True)
     company = models.ForeignKey(Company, related_name='catalog_items', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return f"{self.sku} - {self.name}"
 
+    def validate_unique(self, exclude=None):
+        super().validate_unique(exclude)
+        if exclude and 'sku' in exclude:
+            return
+        from equipment.skus import skus_taken_elsewhere
+        if skus_taken_elsewhere(self.company_id, [self.sku]):
+            raise ValidationError({'sku': "This SKU is already used by another company."})
+
     class Meta:
         verbose_name_plural = "catalog items"
+        indexes = [
+            models.Index(fields=['company', 'name'], name='idx_catalogitem_company_name'),
+            models.Index(fields=['company', 'category', 'id'], name='idx_catalogitem_company_cat'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'sku'], name='unique_catalogitem_company_sku'),
+        ]
+
+class SkuCounter(models.Model):
+    """
+    Highest SKU suffix handed out for a base slug.
+
+    Global counters (company unset) are used when SKUs are unique across
+    companies, per-company counters otherwise; see equipment.skus.
+    """
+    company = models.ForeignKey(Company, related_name='sku_counters', on_delete=models.CASCADE, blank=True, null=True)
+    base = models.CharField(max_length=50)
+    last = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.base}: {self.last}"
+
+    class Meta:
+        verbose_name_plural = "sku counters"
+        constraints = [
+            models.UniqueConstraint(fields=['base'], condition=models.Q(company__isnull=True),
+                                    name='unique_skucounter_global_base'),
+            models.UniqueConstraint(fields=['company', 'base'], condition=models.Q(company__isnull=False),
+                                    name='unique_skucounter_company_base'),
+        ]
 
 # Asset model for individual equipment items
 class Asset(models.Model):
@@ -58,11 +104,17 @@ class Asset(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
     company = models.ForeignKey(Company, related_name='assets', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return f"{self.catalogItem.name} - {self.serial}"
 
     class Meta:
         verbose_name_plural = "assets"
+        indexes = [
+            models.Index(fields=['company', 'catalogItem', 'status'], name='idx_asset_company_item'),
+        ]
 
 # Kit model for equipment bundles
 class Kit(models.Model):
@@ -72,11 +124,17 @@ class Kit(models.Model):
     items = models.JSONField()  # Store as [{catalogItemId|kitId, qty}]
     company = models.ForeignKey(Company, related_name='kits', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name_plural = "kits"
+        indexes = [
+            models.Index(fields=['company', 'name'], name='idx_kit_company_name'),
+        ]
 
 
 class KitItem(models.Model):
@@ -110,11 +168,17 @@ class Case(models.Model):
     company = models.ForeignKey(Company, related_name='cases', on_delete=models.CASCADE)
     upright_only = models.BooleanField(default=False)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return f"{self.code} ({self.get_caseType_display()})"
 
     class Meta:
         verbose_name_plural = "cases"
+        indexes = [
+            models.Index(fields=['company', 'code'], name='idx_case_company_code'),
+        ]
 
 # StockLocation model for where equipment is stored
 class StockLocation(models.Model):
@@ -130,11 +194,17 @@ class StockLocation(models.Model):
     image = models.ImageField(upload_to='stock_locations/', blank=True, null=True)
     company = models.ForeignKey(Company, related_name='stock_locations', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return f"{self.name} ({self.get_type_display()})"
 
     class Meta:
         verbose_name_plural = "stock locations"
+        indexes = [
+            models.Index(fields=['company', 'name'], name='idx_stocklocation_company_name'),
+        ]
 
 # Barcode model for tracking equipment
 class Barcode(models.Model):
@@ -150,8 +220,14 @@ class Barcode(models.Model):
     entityId = models.IntegerField()
     company = models.ForeignKey(Company, related_name='barcodes', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return f"{self.value} ({self.get_entityType_display()})"
 
     class Meta:
         verbose_name_plural = "barcodes"
+        indexes = [
+            models.Index(fields=['company', 'entityType', 'entityId'], name='idx_barcode_company_entity'),
+        ]
@@ -0,0 +1,164 @@
+"""
+Catalog search for typeahead.
+
+On SQLite items are mirrored into an FTS5 table (FTS_TABLE) kept in sync
+by the CatalogItem signals; every query term is matched as a word prefix
+and results are ranked with bm25, sku and name weighing most. Each row
+also carries its company as a token in the indexed tenant column, which
+is part of the MATCH, so only the caller's items are ever candidates and
+all of them are ranked before the limit applies.
+
+On PostgreSQL a pg_trgm GIN index over name, brand, model, sku and
+category serves substring matches ranked by word similarity. Other
+databases fall back to icontains filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from equipment.models import CatalogItem
+
+FTS_TABLE = 'equipment_catalogitem_fts'
+SEARCH_COLUMNS = ('name', 'brand', 'model', 'sku', 'category')
+# bm25 weights in SEARCH_COLUMNS order; the tenant column does not rank
+COLUMN_WEIGHTS = (5.0, 3.0, 3.0, 10.0, 1.0, 0.0)
+MAX_TERMS = 8
+BULK_BATCH_SIZE = 1000
+
+# Kept in sync with the index expression created by the migration
+POSTGRES_DOCUMENT = (
+    "(coalesce(name, '') || ' ' || coalesce(brand, '') || ' ' || coalesce(model, '') || ' ' || sku"
+    " || ' ' || category)"
+)
+
+_TERM = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """Lower-cased word fragments of a query, at most MAX_TERMS."""
+    return _TERM.findall((query or '').lower())[:MAX_TERMS]
+
+
+def _tenant_token(company_id):
+    return f'company{company_id}'
+
+
+def _fts_rows(items):
+    return [
+        (item.pk, *(getattr(item, column) or '' for column in SEARCH_COLUMNS),
+         _tenant_token(item.company_id), item.company_id)
+        for item in items
+    ]
+
+
+def index_items(items):
+    """
+    Write catalog items into the FTS table (SQLite only).
+    """
+    if connection.vendor != 'sqlite':
+        return
+    rows = _fts_rows(items)
+    columns = ', '.join(('rowid',) + SEARCH_COLUMNS + ('tenant', 'company_id'))
+    placeholders = ', '.join(['%s'] * (len(SEARCH_COLUMNS) + 3))
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BULK_BATCH_SIZE):
+            batch = rows[start:start + BULK_BATCH_SIZE]
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in batch])
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} ({columns}) VALUES ({placeholders})", batch)
+
+
+def remove_items(ids):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in ids])
+
+
+def rebuild_index(company=None):
+    """
+    Refill the FTS table from CatalogItem, e.g. after bulk writes that
+    bypass signals.
+
+    Returns:
+        int: number of items indexed
+    """
+    if connection.vendor != 'sqlite':
+        return 0
+    items = CatalogItem.all_objects.only('company_id', *SEARCH_COLUMNS)
+    with connection.cursor() as cursor:
+        if company is None:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        else:
+            items = items.filter(company=company)
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE company_id = %s", [company.pk])
+    count = 0
+    batch = []
+    for item in items.iterator(chunk_size=BULK_BATCH_SIZE):
+        batch.append(item)
+        if len(batch) == BULK_BATCH_SIZE:
+            index_items(batch)
+            count += len(batch)
+            batch = []
+    index_items(batch)
+    return count + len(batch)
+
+
+def _sqlite_search(company_id, terms, limit):
+    # Query terms only look at the search columns; the tenant token narrows
+    # the match to the company inside the full-text index itself
+    columns = ' '.join(SEARCH_COLUMNS)
+    prefixes = ' '.join(f'"{term}"*' for term in terms)
+    match = f'tenant : "{_tenant_token(company_id)}" AND {{{columns}}} : ({prefixes})'
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgres_search(company_id, terms, limit):
+    table = CatalogItem._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id FROM {table} WHERE company_id = %s AND {POSTGRES_DOCUMENT} ILIKE ALL(%s) "
+            f"ORDER BY word_similarity(%s, {POSTGRES_DOCUMENT}) DESC, id LIMIT %s",
+            [company_id, [f'%{term}%' for term in terms], ' '.join(terms), limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search(company_id, terms, limit):
+    items = CatalogItem.all_objects.filter(company_id=company_id)
+    for term in terms:
+        condition = Q()
+        for column in SEARCH_COLUMNS:
+            condition |= Q(**{f'{column}__icontains': term})
+        items = items.filter(condition)
+    return list(items.order_by('name', 'pk').values_list('pk', flat=True)[:limit])
+
+
+def search_catalog(company, query, limit=20):
+    """
+    Ids of a company's catalog items matching a query, best match first.
+
+    Args:
+        company: Company whose catalog is searched
+        query: free text; every word fragment must match
+        limit: maximum number of ids
+
+    Returns:
+        list: CatalogItem ids
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    company_id = getattr(company, 'pk', company)
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(company_id, terms, limit)
+    if connection.vendor == 'postgresql':
+        return _postgres_search(company_id, terms, limit)
+    return _fallback_search(company_id, terms, limit)
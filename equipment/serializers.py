@@ -1,25 +1,56 @@
-from django.utils.text import slugify
+from django.db import transaction
 from rest_framework import serializers
 from equipment.models import CatalogItem
+from equipment.skus import allocate_sku, sku_base, sku_number
 
 class CatalogItemSerializer(serializers.ModelSerializer):
+    """
+    GET requests may pass ?fields=id,sku,name to receive only those fields.
+    """
     sku = serializers.CharField(read_only=True)
 
-    def _generate_sku(self, name: str, model: str | None) -> str:
-        base_slug = slugify("-".join(filter(None, [name, model])))
-        return base_slug or slugify(name)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.selected_fields(self.context.get('request'))
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, request):
+        """
+        Field names requested with ?fields=, or None for all of them.
+
+        Raises:
+            ValidationError: for names the serializer does not have
+        """
+        if request is None or request.method != 'GET' or not request.query_params.get('fields'):
+            return None
+        selected = [name.strip() for name in request.query_params['fields'].split(',') if name.strip()]
+        unknown = sorted(set(selected) - set(cls.Meta.fields))
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+        return selected
+
+    def _generate_sku(self, company, name: str, model: str | None) -> str:
+        return allocate_sku(company, sku_base(name, model))
 
     def create(self, validated_data):
         name = validated_data.get("name", "")
         model = validated_data.get("model")
-        validated_data["sku"] = self._generate_sku(name, model)
-        return super().create(validated_data)
+        with transaction.atomic():
+            validated_data["sku"] = self._generate_sku(validated_data.get("company"), name, model)
+            return super().create(validated_data)
 
     def update(self, instance, validated_data):
         name = validated_data.get("name", instance.name)
         model = validated_data.get("model", instance.model)
-        validated_data["sku"] = self._generate_sku(name, model)
-        return super().update(instance, validated_data)
+        base = sku_base(name, model)
+        with transaction.atomic():
+            # Keep the SKU unless the name or model moved it to another base
+            if sku_number(base, instance.sku) is None:
+                validated_data["sku"] = allocate_sku(validated_data.get("company", instance.company), base)
+            return super().update(instance, validated_data)
 
     class Meta:
         model = CatalogItem
@@ -27,4 +58,8 @@ class CatalogItemSerializer(serializers.ModelSerializer):
             'id', 'sku', 'name', 'category', 'subcategory', 'brand', 'model',
             'sellable', 'rentable', 'isConsumable', 'defaultRate', 'pricePolicy',
             'weight', 'power', 'dimensions', 'upright_only', 'image', 'company'
-        ]
\ No newline at end of file
+        ]
+
+class CatalogImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=['csv', 'xlsx'], required=False)
@@ -0,0 +1,66 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from equipment.barcodes import invalidate_barcodes, invalidate_entities
+from equipment.kits import invalidate_company_kits
+from equipment.models import Asset, Barcode, Case, CatalogItem, Kit, KitItem
+from equipment.search import index_items, remove_items
+
+
+@receiver([post_save, post_delete], sender=Kit)
+def invalidate_kits_on_kit_change(sender, instance, **kwargs):
+    invalidate_company_kits(instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=KitItem)
+def invalidate_kits_on_kit_item_change(sender, instance, **kwargs):
+    company_id = Kit.objects.filter(pk=instance.kit_id).values_list('company_id', flat=True).first()
+    if company_id is not None:
+        invalidate_company_kits(company_id)
+
+
+@receiver(post_save, sender=CatalogItem)
+def index_catalog_item(sender, instance, **kwargs):
+    index_items([instance])
+
+
+@receiver(post_delete, sender=CatalogItem)
+def unindex_catalog_item(sender, instance, **kwargs):
+    remove_items([instance.pk])
+
+
+@receiver(pre_save, sender=Barcode)
+def remember_barcode_value(sender, instance, **kwargs):
+    instance._previous_value = None
+    if instance.pk is not None:
+        instance._previous_value = sender.all_objects.filter(pk=instance.pk).values_list('value', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Barcode)
+def invalidate_barcode(sender, instance, **kwargs):
+    invalidate_barcodes(filter(None, {instance.value, getattr(instance, '_previous_value', None)}))
+
+
+@receiver([post_save, post_delete], sender=Asset)
+def invalidate_asset_barcodes(sender, instance, **kwargs):
+    invalidate_entities('asset', [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=CatalogItem)
+def invalidate_catalog_item_barcodes(sender, instance, **kwargs):
+    # Asset summaries embed their catalog item
+    invalidate_barcodes(Barcode.all_objects.filter(
+        Q(entityType='catalog_item', entityId=instance.pk)
+        | Q(entityType='asset', entityId__in=Asset.all_objects.filter(catalogItem_id=instance.pk).values('pk'))
+    ).values_list('value', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Case)
+def invalidate_case_barcodes(sender, instance, **kwargs):
+    invalidate_entities('case', [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Kit)
+def invalidate_kit_barcodes(sender, instance, **kwargs):
+    invalidate_entities('kit', [instance.pk])
@@ -0,0 +1,215 @@
+import re
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from equipment.models import CatalogItem, SkuCounter
+
+# CatalogItem.sku holds 50 characters; leave room for a "-NNNNNNNNN" suffix
+BASE_MAX_LENGTH = 40
+FALLBACK_BASE = 'item'
+# Bases seeded per LIKE lookup
+SEED_BATCH_SIZE = 100
+# From this many bases on, one pass over all SKUs beats the LIKE lookups
+SEED_SCAN_THRESHOLD = 1000
+
+_NUMBERED = re.compile(r'-\d+$')
+
+
+def company_scoped():
+    """
+    Whether SKUs only need to be unique within a company.
+
+    CATALOG_SKU_SCOPE = 'company' lets two companies both have "shure-sm58";
+    the default 'global' keeps SKUs distinct across companies.
+    """
+    return getattr(settings, 'CATALOG_SKU_SCOPE', 'global') == 'company'
+
+
+def skus_taken_elsewhere(company, skus):
+    """
+    Which of the given SKUs other companies already use, when SKUs are
+    global. The database only enforces uniqueness per company, so SKUs that
+    do not come from allocate_skus (imports, admin edits) are checked here.
+
+    Returns:
+        set: SKUs that may not be used; always empty with CATALOG_SKU_SCOPE = 'company'
+    """
+    skus = set(skus)
+    if company_scoped() or not skus:
+        return set()
+    items = CatalogItem.all_objects.filter(sku__in=skus)
+    if company is not None:
+        items = items.exclude(company=company)
+    return set(items.values_list('sku', flat=True))
+
+
+def sku_base(name, model=None):
+    """Slug an item's SKUs are built from, at most BASE_MAX_LENGTH long."""
+    text = "-".join(filter(None, [name, model]))
+    base = slugify(text) or slugify(text, allow_unicode=True)
+    return base[:BASE_MAX_LENGTH].strip('-') or FALLBACK_BASE
+
+
+def format_sku(base, number):
+    """
+    The number-th SKU of a base: the base itself, then base-2, base-3, ...
+
+    Bases already ending in -digits are always numbered, so no two bases
+    can produce the same SKU.
+    """
+    if number == 1 and not _NUMBERED.search(base):
+        return base
+    return f"{base}-{number}"
+
+
+def sku_number(base, sku):
+    """The number format_sku gave sku for base, or None if it is not one of base's."""
+    if sku == base:
+        return None if _NUMBERED.search(base) else 1
+    suffix = sku[len(base):]
+    if sku.startswith(base) and suffix[:1] == '-' and suffix[1:].isdigit():
+        return int(suffix[1:])
+    return None
+
+
+def _existing_skus(company, bases):
+    items = CatalogItem.all_objects.all()
+    if company_scoped():
+        items = items.filter(company=company)
+    condition = reduce(or_, (Q(sku__startswith=base) for base in bases))
+    return items.filter(condition).values_list('sku', flat=True)
+
+
+def _candidate_bases(sku):
+    """The bases sku can have been allocated from: itself, or itself without a -digits suffix."""
+    return {sku, _NUMBERED.sub('', sku)}
+
+
+def _scan_seed(company, bases):
+    seeds = dict.fromkeys(bases, 0)
+    items = CatalogItem.all_objects.all()
+    if company_scoped():
+        items = items.filter(company=company)
+    for sku in items.values_list('sku', flat=True).iterator(chunk_size=5000):
+        for base in _candidate_bases(sku):
+            if base in seeds:
+                number = sku_number(base, sku)
+                if number is not None:
+                    seeds[base] = max(seeds[base], number)
+    return seeds
+
+
+def _seed(company, bases):
+    """
+    Highest number already taken per base, from one LIKE lookup per
+    SEED_BATCH_SIZE bases, or one pass over all SKUs for large batches.
+    """
+    if len(bases) >= SEED_SCAN_THRESHOLD:
+        return _scan_seed(company, bases)
+    seeds = dict.fromkeys(bases, 0)
+    bases = sorted(bases, key=len, reverse=True)
+    for start in range(0, len(bases), SEED_BATCH_SIZE):
+        chunk = bases[start:start + SEED_BATCH_SIZE]
+        for sku in _existing_skus(company, chunk):
+            for base in chunk:
+                number = sku_number(base, sku)
+                if number is not None:
+                    seeds[base] = max(seeds[base], number)
+    return seeds
+
+
+def _save_counters(counters):
+    # One parametrised UPDATE run for every counter; bulk_update's CASE
+    # expression gets slow at import sizes
+    counters = list(counters)
+    if not counters:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {SkuCounter._meta.db_table} SET last = %s WHERE id = %s",
+            [(counter.last, counter.pk) for counter in counters],
+        )
+
+
+def allocate_skus(company, bases):
+    """
+    Reserve one SKU per base, e.g. for a bulk import.
+
+    Counters are read (and locked) in one query, bases seen for the first
+    time are seeded from existing SKUs (see _seed) and all counters are
+    advanced with one executemany, so a batch costs a handful of queries
+    however many rows it has. Call it inside the transaction that creates the items.
+
+    Args:
+        company: Company the items belong to
+        bases: iterable of base slugs (see sku_base), repeats allowed
+
+    Returns:
+        list: SKUs in the order of bases
+    """
+    bases = list(bases)
+    if not bases:
+        return []
+    needed = Counter(bases)
+    owner = company if company_scoped() else None
+    counters = SkuCounter.objects.filter(company=owner)
+
+    with transaction.atomic():
+        found = {c.base: c for c in counters.select_for_update().filter(base__in=list(needed))}
+        missing = [base for base in needed if base not in found]
+        if missing:
+            seeds = _seed(company, missing)
+            SkuCounter.objects.bulk_create(
+                [SkuCounter(company=owner, base=base, last=seeds[base]) for base in missing],
+                ignore_conflicts=True,
+            )
+            # Re-read: a concurrent allocation may have created some of them
+            found.update({c.base: c for c in counters.select_for_update().filter(base__in=missing)})
+
+        next_number = {}
+        for base, count in needed.items():
+            counter = found[base]
+            next_number[base] = counter.last + 1
+            counter.last += count
+        _save_counters(found.values())
+
+    skus = []
+    for base in bases:
+        skus.append(format_sku(base, next_number[base]))
+        next_number[base] += 1
+    return skus
+
+
+def claim_skus(company, skus):
+    """
+    Advance counters past SKUs that were set by hand, e.g. by an import, so
+    allocate_skus never hands them out again.
+
+    Bases without a counter need nothing: they are seeded from the
+    existing SKUs on first use.
+    """
+    claimed = {}
+    for sku in skus:
+        for base in _candidate_bases(sku):
+            number = sku_number(base, sku)
+            if number is not None:
+                claimed[base] = max(claimed.get(base, 0), number)
+    if not claimed:
+        return
+    owner = company if company_scoped() else None
+    with transaction.atomic():
+        counters = SkuCounter.objects.filter(company=owner, base__in=list(claimed)).select_for_update()
+        behind = [counter for counter in counters if counter.last < claimed[counter.base]]
+        for counter in behind:
+            counter.last = claimed[counter.base]
+        _save_counters(behind)
+
+
+def allocate_sku(company, base):
+    return allocate_skus(company, [base])[0]
@@ -1,3 +1,440 @@
+import tempfile
+from io import BytesIO, StringIO
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from company.testing import make_company
+from equipment.barcodes import local_cache, resolve_barcode
+from equipment.importer import import_catalog, read_csv, read_sheet
+from equipment.kits import KitCycleError, explode_kit, explode_kits, kits_containing
+from equipment.models import Asset, Barcode, CatalogItem, Kit, KitItem, StockLocation
+from equipment.search import rebuild_index, search_catalog
+from equipment.skus import allocate_sku, allocate_skus, sku_base
+from refdata.models import PricePolicy
+
+
+class KitExplosionTestCase(TestCase):
+    """Test cases for flattening kits into leaf catalog items"""
+
+    def setUp(self):
+        cache.clear()
+        self.company = make_company()
+        self.mic = CatalogItem.objects.create(sku='mic', name='Mic', category='audio', defaultRate=5, company=self.company)
+        self.stand = CatalogItem.objects.create(sku='stand', name='Stand', category='audio', defaultRate=2, company=self.company)
+        self.vocal = self.make_kit('vocal', (self.mic, 1), (self.stand, 1))
+        self.band = self.make_kit('band', (self.vocal, 4), (self.stand, 2))
+
+    def make_kit(self, sku, *components):
+        kit = Kit.objects.create(name=sku, sku=sku, rate=10, items=[], company=self.company)
+        for component, qty in components:
+            self.add(kit, component, qty)
+        return kit
+
+    def add(self, kit, component, qty):
+        return KitItem.objects.create(
+            kit=kit, content_type=ContentType.objects.get_for_model(component),
+            object_id=component.id, quantity=qty,
+        )
+
+    def test_nested_kits_flatten_to_leaves(self):
+        self.assertEqual(explode_kit(self.band.id), {self.mic.id: 4, self.stand.id: 6})
+
+    def test_json_items_used_without_kit_item_rows(self):
+        legacy = Kit.objects.create(
+            name='legacy', sku='legacy', rate=1, company=self.company,
+            items=[{'catalogItemId': self.mic.id, 'qty': 2}, {'kitId': self.vocal.id, 'qty': 1}],
+        )
+        self.assertEqual(explode_kit(legacy.id), {self.mic.id: 3, self.stand.id: 1})
+
+    def test_company_is_prefetched_once(self):
+        explode_kit(self.band.id)
+        with self.assertNumQueries(1):
+            explode_kits([self.band.id, self.vocal.id])
+
+    def test_kit_changes_invalidate_cache(self):
+        explode_kit(self.band.id)
+        KitItem.objects.get(kit=self.vocal, object_id=self.stand.id).delete()
+        cable = CatalogItem.objects.create(sku='cable', name='Cable', category='audio', defaultRate=1, company=self.company)
+        self.add(self.vocal, cable, 3)
+        self.assertEqual(explode_kit(self.band.id), {self.mic.id: 4, self.stand.id: 2, cable.id: 12})
+
+    def test_cycles_are_detected(self):
+        self.add(self.vocal, self.band, 1)
+        with self.assertRaises(KitCycleError):
+            explode_kit(self.band.id)
+        self.assertEqual(explode_kits([self.band.id], skip_cycles=True), {self.band.id: {}})
+
+    def test_kits_containing(self):
+        self.assertEqual(kits_containing({self.mic.id}), {self.mic.id: {self.vocal.id: 1, self.band.id: 4}})
+
+
+class CatalogItemListTestCase(TestCase):
+    """Test cases for the paginated catalog item list"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.client = APIClient()
+        self.client.force_authenticate(self.company.owner)
+        for n, category in enumerate(['video', 'audio', 'light', 'audio', 'video', 'audio', 'light']):
+            CatalogItem.objects.create(sku=f'item-{n}', name=f'Item {n}', category=category, defaultRate=n,
+                                       dimensions={'length': n}, company=self.company)
+        other = make_company('other@example.com')
+        CatalogItem.objects.create(sku='foreign', name='Foreign', category='audio', defaultRate=1, company=other)
+
+    def test_pages_follow_category_then_id(self):
+        url, seen = '/api/equipment/catalog-items/?page_size=3', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend((row['category'], row['id']) for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_sparse_fields(self):
+        response = self.client.get('/api/equipment/catalog-items/', {'fields': 'id,sku,name,defaultRate'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'sku', 'name', 'defaultRate'})
+
+        response = self.client.get('/api/equipment/catalog-items/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/equipment/catalog-items/', {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_create_still_returns_the_item(self):
+        response = self.client.post('/api/equipment/catalog-items/?fields=id',
+                                    {'name': 'Desk', 'category': 'audio', 'defaultRate': '5.00',
+                                     'company': self.company.id}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['sku'], 'desk')
+
+
+class CatalogSearchTestCase(TestCase):
+    """Test cases for catalog typeahead search"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.sm58 = self.make('shure-sm58', 'Vocal microphone', brand='Shure', model='SM58')
+        self.beta = self.make('shure-beta-58a', 'Supercardioid microphone', brand='Shure', model='Beta 58A')
+        self.mac = self.make('mac-aura', 'Moving head wash', brand='Martin', model='MAC Aura', category='light')
+        other = make_company('other@example.com')
+        CatalogItem.objects.create(sku='foreign-sm58', name='Vocal microphone', brand='Shure', model='SM58',
+                                   category='audio', defaultRate=1, company=other)
+
+    def make(self, sku, name, category='audio', **fields):
+        return CatalogItem.objects.create(sku=sku, name=name, category=category, defaultRate=1,
+                                          company=self.company, **fields)
+
+    def test_prefix_fragments_across_columns(self):
+        self.assertEqual(search_catalog(self.company, 'shu sm5'), [self.sm58.id])
+        self.assertEqual(set(search_catalog(self.company, 'micro')), {self.sm58.id, self.beta.id})
+        self.assertEqual(search_catalog(self.company, 'mart wash'), [self.mac.id])
+        self.assertEqual(search_catalog(self.company, '"*) OR'), [])
+        self.assertEqual(search_catalog(self.company, '  '), [])
+
+    def test_sku_outranks_other_columns(self):
+        case = self.make('mic-case', 'Case', brand='Generic', model='Box', category='misc')
+        self.assertEqual(search_catalog(self.company, 'mic'), [case.id, self.sm58.id, self.beta.id])
+        self.assertEqual(search_catalog(self.company, 'mac')[0], self.mac.id)
+
+    def test_only_the_company_items_are_candidates(self):
+        other = CatalogItem.all_objects.get(sku='foreign-sm58').company
+        CatalogItem.objects.bulk_create([
+            CatalogItem(sku=f'shure-{n}', name='Shure spare', category='audio', defaultRate=1, company=other)
+            for n in range(50)
+        ])
+        rebuild_index(other)
+        self.assertEqual(set(search_catalog(self.company, 'shure', limit=5)), {self.sm58.id, self.beta.id})
+        self.assertEqual(search_catalog(self.company, 'company'), [])
+
+    def test_category_is_searched(self):
+        self.assertEqual(search_catalog(self.company, 'light'), [self.mac.id])
+
+    def test_index_follows_changes(self):
+        self.sm58.name = 'Dynamic vocal'
+        self.sm58.save()
+        self.assertEqual(search_catalog(self.company, 'dynamic'), [self.sm58.id])
+        self.assertNotIn(self.sm58.id, search_catalog(self.company, 'microphone'))
+        self.beta.delete()
+        self.assertEqual(search_catalog(self.company, 'micro'), [])
+
+        CatalogItem.objects.filter(pk=self.mac.pk).update(name='Spot profile')
+        self.assertEqual(rebuild_index(self.company), 2)
+        self.assertEqual(search_catalog(self.company, 'spot'), [self.mac.id])
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        response = client.get('/api/equipment/catalog-items/search/', {'q': 'shure', 'fields': 'id,sku'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row['sku'] for row in response.data['results']}, {'shure-sm58', 'shure-beta-58a'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'sku'})
+
+
+class SkuAllocationTestCase(TestCase):
+    """Test cases for SKU allocation"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.other = make_company('other@example.com')
+
+    def create(self, company, name, model=None):
+        client = APIClient()
+        client.force_authenticate(company.owner)
+        response = client.post('/api/equipment/catalog-items/', {
+            'name': name, 'model': model, 'category': 'audio', 'defaultRate': '5.00', 'company': company.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def test_same_name_across_companies(self):
+        self.assertEqual(self.create(self.company, 'Shure', 'SM58')['sku'], 'shure-sm58')
+        self.assertEqual(self.create(self.other, 'Shure', 'SM58')['sku'], 'shure-sm58-2')
+        self.assertEqual(self.create(self.company, 'Shure', 'SM58')['sku'], 'shure-sm58-3')
+        with self.settings(CATALOG_SKU_SCOPE='company'):
+            third = make_company('third@example.com')
+            self.assertEqual(self.create(third, 'Shure', 'SM58')['sku'], 'shure-sm58')
+            # Seeded from the company's own SKUs only
+            self.assertEqual(allocate_skus(self.other, ['shure-sm58', 'shure-sm58']), ['shure-sm58-3', 'shure-sm58-4'])
+
+    def test_numbered_bases_never_collide(self):
+        self.assertEqual(allocate_skus(self.company, ['mixer', 'mixer', 'mixer-2', 'mixer-2']),
+                         ['mixer', 'mixer-2', 'mixer-2-1', 'mixer-2-2'])
+        self.assertEqual(sku_base('Колонка'), 'колонка')
+        self.assertEqual(sku_base('!!!'), 'item')
+
+    def test_counters_seed_from_existing_skus(self):
+        for sku in ('desk', 'desk-7', 'desk-lamp'):
+            CatalogItem.objects.create(sku=sku, name=sku, category='audio', defaultRate=1, company=self.company)
+        self.assertEqual(allocate_sku(self.company, 'desk'), 'desk-8')
+        self.assertEqual(allocate_sku(self.company, 'desk-lamp'), 'desk-lamp-2')
+
+    def test_bulk_allocation_query_count(self):
+        bases = [f'item-{n % 300}' for n in range(3000)]
+        with CaptureQueriesContext(connection) as queries:
+            skus = allocate_skus(self.company, bases)
+        self.assertEqual(len(set(skus)), 3000)
+        self.assertLess(len(queries), 15)
+        with self.assertNumQueries(4):
+            allocate_skus(self.company, bases)
+
+    def test_hand_set_skus_are_validated_globally(self):
+        CatalogItem.objects.create(sku='desk', name='Desk', category='audio', defaultRate=1, company=self.other)
+        item = CatalogItem(sku='desk', name='Desk', category='audio', defaultRate=1, company=self.company)
+        with self.assertRaises(ValidationError):
+            item.full_clean()
+        with self.settings(CATALOG_SKU_SCOPE='company'):
+            item.full_clean()
+
+    def test_update_keeps_sku_unless_base_changes(self):
+        item = self.create(self.company, 'Desk', 'X32')
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        url = f"/api/equipment/catalog-items/{item['id']}/"
+        response = client.patch(url, {'defaultRate': '7.00'}, format='json')
+        self.assertEqual(response.data['sku'], 'desk-x32')
+        response = client.patch(url, {'model': 'M32'}, format='json')
+        self.assertEqual(response.data['sku'], 'desk-m32')
+
+
+CATALOG_SHEET = """name,model,category,brand,defaultRate,pricePolicy,serial,condition,location,barcode
+Shure,SM58,audio,Shure,5.00,Standard,A1,good,Main,B1
+Shure,SM58,audio,Shure,5.00,Standard,A2,excellent,Main,B2
+Shure,SM58,audio,Shure,5.00,Standard,A3,,,TAKEN
+Par,64,light,,3.50,,,,,B4
+Desk,X32,audio,,,,A5,,,
+Desk,M32,audio,,40,Missing,A6,,,
+Shure,SM58,audio,,5.00,,A7,,Attic,
+Shure,SM58,audio,,5.00,,A8,,,B1
+Shure,SM58,audio,,5.00,,A9,broken,,
+"""
+
+
+class CatalogImportTestCase(TestCase):
+    """Test cases for the bulk catalog and asset import"""
+
+    def setUp(self):
+        self.company = make_company()
+        PricePolicy.objects.create(name='Standard', company=self.company)
+        self.main = StockLocation.objects.create(name='Main', type='warehouse', company=self.company)
+        other = make_company('other@example.com')
+        StockLocation.objects.create(name='Attic', type='warehouse', company=other)
+        Barcode.objects.create(value='TAKEN', entityType='kit', entityId=1, company=other)
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        result = import_catalog(read_csv(StringIO(CATALOG_SHEET)), self.company)
+
+        self.assertEqual((result.rows, result.catalogItems, result.assets, result.barcodes), (9, 2, 2, 3))
+        self.assertEqual(result.errorCount, 6)
+        self.assertEqual({error['line'] for error in result.errors}, {4, 6, 7, 8, 9, 10})
+
+        mic = CatalogItem.objects.get(company=self.company, name='Shure')
+        self.assertEqual(mic.sku, 'shure-sm58')
+        self.assertEqual(mic.pricePolicy.name, 'Standard')
+        self.assertEqual(list(mic.assets.order_by('serial').values_list('serial', 'location')),
+                         [('A1', self.main.pk), ('A2', self.main.pk)])
+        self.assertEqual(Barcode.objects.get(value='B4').entityType, 'catalog_item')
+        self.assertEqual(Barcode.objects.get(value='B1').entityId, Asset.objects.get(serial='A1').pk)
+        self.assertEqual(search_catalog(self.company, 'sm58'), [mic.pk])
+
+    def test_rows_refer_to_existing_items(self):
+        item = CatalogItem.objects.create(sku='mic-7', name='Mic', category='audio', defaultRate=1,
+                                          company=self.company)
+        sheet = "sku,serial\nMIC-7,S1\nmic-7,S2\n"
+        result = import_catalog(read_csv(StringIO(sheet)), self.company)
+        self.assertEqual((result.catalogItems, result.assets, result.errorCount), (0, 2, 0))
+        self.assertEqual(item.assets.count(), 2)
+
+    def test_given_skus_are_not_allocated_again(self):
+        allocate_sku(self.company, 'mic')
+        sheet = "sku,name,category,defaultRate\nmic-2,Mic,audio,1\n"
+        import_catalog(read_csv(StringIO(sheet)), self.company)
+        self.assertEqual(allocate_sku(self.company, 'mic'), 'mic-3')
+
+    def test_given_skus_stay_globally_unique(self):
+        other = make_company('third@example.com')
+        CatalogItem.objects.create(sku='shure-sm58', name='Shure', category='audio', defaultRate=1, company=other)
+        sheet = "sku,name,category,defaultRate\nshure-sm58,Shure,audio,1\n"
+        result = import_catalog(read_csv(StringIO(sheet)), self.company)
+        self.assertEqual((result.catalogItems, result.errorCount), (0, 1))
+        with self.settings(CATALOG_SKU_SCOPE='company'):
+            result = import_catalog(read_csv(StringIO(sheet)), self.company)
+        self.assertEqual((result.catalogItems, result.errorCount), (1, 0))
+
+    def test_bad_numbers_are_row_errors(self):
+        sheet = ("name,category,defaultRate,weight\n"
+                 "A,audio,NaN,\nB,audio,Infinity,\nC,audio,1e20,\nD,audio,1,1.005\nE,audio,2.50,12\n")
+        result = import_catalog(read_csv(StringIO(sheet)), self.company)
+        self.assertEqual((result.catalogItems, result.errorCount), (1, 4))
+        self.assertEqual([error['line'] for error in result.errors], [2, 3, 4, 5])
+        self.assertIn('does not fit', result.errors[2]['error'])
+
+    def test_failed_chunk_is_retried_row_by_row(self):
+        # The allocated SKU of the second row collides with the first row's
+        sheet = "sku,name,category,defaultRate,serial\nshure,Other,audio,1,S1\n,Shure,audio,1,S2\n"
+        result = import_catalog(read_csv(StringIO(sheet)), self.company)
+        self.assertEqual((result.catalogItems, result.assets, result.errorCount), (2, 2, 0))
+        self.assertEqual(CatalogItem.objects.get(name='Shure').sku, 'shure-2')
+
+    def test_query_count_does_not_grow_with_rows(self):
+        lines = ["name,model,category,defaultRate,serial,location,barcode"]
+        lines += [f"Item,{n % 50},audio,1,S{n},Main,BC{n}" for n in range(1500)]
+        with CaptureQueriesContext(connection) as queries:
+            result = import_catalog(read_csv(StringIO("\n".join(lines))), self.company)
+        self.assertEqual((result.catalogItems, result.assets, result.barcodes), (50, 1500, 1500))
+        self.assertLess(len(queries), 40)
+
+    def test_xlsx(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['Name', 'Model', 'Category', 'defaultRate', 'Serial', 'Location', 'Barcode'])
+        sheet.append(['Shure', 'SM58', 'audio', 5, 'A1', 'Main', 'X1'])
+        sheet.append([])
+        sheet.append(['Shure', 'SM58', 'audio', 5.5, 'A2', 'Attic', None])
+        out = BytesIO()
+        workbook.save(out)
+        out.seek(0)
+
+        result = import_catalog(read_sheet(out, 'catalog.xlsx'), self.company)
+        self.assertEqual((result.catalogItems, result.assets, result.barcodes), (1, 1, 1))
+        self.assertEqual(result.errors, [{'line': 4, 'error': 'unknown location: Attic'}])
+        self.assertEqual(CatalogItem.objects.get(sku='shure-sm58').defaultRate, 5)
+
+        with self.assertRaisesMessage(ValueError, 'Not an .xlsx workbook'):
+            list(read_sheet(BytesIO(b'not a zip'), 'catalog.xlsx'))
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        upload = SimpleUploadedFile('catalog.csv', CATALOG_SHEET.encode())
+        response = client.post('/api/equipment/catalog-items/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['assets'], 2)
+        self.assertEqual(response.data['errorCount'], 6)
+
+
+class BarcodeResolverTestCase(TestCase):
+    """Test cases for the cached barcode resolver"""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.company = make_company()
+        self.item = CatalogItem.objects.create(sku='sm58', name='Shure', model='SM58', category='audio',
+                                               defaultRate=5, company=self.company)
+        self.shelf = StockLocation.objects.create(name='Shelf A', type='shelf', company=self.company)
+        self.asset = Asset.objects.create(catalogItem=self.item, serial='S1', location=self.shelf,
+                                          company=self.company)
+        Barcode.objects.create(value='A-1', entityType='asset', entityId=self.asset.pk, company=self.company)
+        Barcode.objects.create(value='C-1', entityType='catalog_item', entityId=self.item.pk, company=self.company)
+
+    def test_resolves_hydrated_summary(self):
+        with self.assertNumQueries(2):
+            summary = resolve_barcode(self.company, 'A-1')
+        self.assertEqual(summary['asset']['serial'], 'S1')
+        self.assertEqual(summary['catalogItem']['sku'], 'sm58')
+        self.assertEqual(summary['location']['name'], 'Shelf A')
+        self.assertEqual(summary['status'], 'available')
+        self.assertEqual(resolve_barcode(self.company, 'C-1')['asset'], None)
+        self.assertIsNone(resolve_barcode(self.company, 'nope'))
+        self.assertIsNone(resolve_barcode(make_company('other@example.com'), 'A-1'))
+
+    def test_cached_at_both_levels(self):
+        resolve_barcode(self.company, 'A-1')
+        with self.assertNumQueries(0):
+            resolve_barcode(self.company, 'A-1')
+        # Another process only has the shared cache
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_barcode(self.company, 'A-1')['entityId'], self.asset.pk)
+
+    def test_changes_invalidate(self):
+        resolve_barcode(self.company, 'A-1')
+        self.asset.status = 'in_use'
+        self.asset.save()
+        self.assertEqual(resolve_barcode(self.company, 'A-1')['status'], 'in_use')
+
+        self.item.name = 'Shure Beta'
+        self.item.save()
+        self.assertEqual(resolve_barcode(self.company, 'A-1')['catalogItem']['name'], 'Shure Beta')
+
+        barcode = Barcode.objects.get(value='A-1')
+        barcode.value = 'A-2'
+        barcode.save()
+        self.assertIsNone(resolve_barcode(self.company, 'A-1'))
+        self.asset.delete()
+        self.assertIsNone(resolve_barcode(self.company, 'A-2'))
+
+    def test_warm_up_command(self):
+        with self.assertRaisesMessage(CommandError, 'REDIS_URL'):
+            call_command('warm_barcode_cache', company=self.company.pk)
+
+        with tempfile.TemporaryDirectory() as location, self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            out = StringIO()
+            call_command('warm_barcode_cache', company=self.company.pk, stdout=out)
+            self.assertIn('Cached 2 barcode(s)', out.getvalue())
+            with self.assertNumQueries(0):
+                resolve_barcode(self.company, 'A-1')
+                resolve_barcode(self.company, 'C-1')
 
-# Create your tests here.
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        response = client.get('/api/equipment/barcodes/A-1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['asset']['id'], self.asset.pk)
+        self.assertEqual(client.get('/api/equipment/barcodes/nope/').status_code, 404)
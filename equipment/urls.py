@@ -5,6 +5,9 @@ app_name = 'equipment'
 
 urlpatterns = [
     path('catalog-items/', views.CatalogItemListCreateAPIView.as_view(), name='catalog-item-list-create'),
+    path('catalog-items/search/', views.CatalogItemSearchAPIView.as_view(), name='catalog-item-search'),
+    path('catalog-items/import/', views.CatalogImportAPIView.as_view(), name='catalog-item-import'),
     path('create/catalog-item/', views.CatalogItemCreateAPIView.as_view(), name='catalog-item-create'),
     path('catalog-items/<int:pk>/', views.CatalogItemRetrieveUpdateDestroyAPIView.as_view(), name='catalog-item-detail'),
+    path('barcodes/<str:value>/', views.BarcodeResolveAPIView.as_view(), name='barcode-resolve'),
 ]
@@ -1,7 +1,13 @@
 from rest_framework.generics import CreateAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from equipment.barcodes import resolve_barcode
+from equipment.importer import import_catalog, read_sheet
 from equipment.models import CatalogItem
-from equipment.serializers import CatalogItemSerializer
+from equipment.pagination import CategoryKeysetPagination
+from equipment.search import search_catalog
+from equipment.serializers import CatalogImportSerializer, CatalogItemSerializer
 
 class CatalogItemCreateAPIView(CreateAPIView):
     """
@@ -14,17 +20,27 @@ class CatalogItemCreateAPIView(CreateAPIView):
 class CatalogItemListCreateAPIView(ListCreateAPIView):
     """
     API endpoint for listing and creating CatalogItem records.
+
+    Lists are paged by (category, id) with a cursor and accept
+    ?fields=id,sku,name,defaultRate to return only some fields.
     """
     queryset = CatalogItem.objects.all()
     serializer_class = CatalogItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CategoryKeysetPagination
 
     def get_queryset(self):
 
         """
         Filter queryset to only return CatalogItems belonging to the user's company.
         """
-        return CatalogItem.objects.filter(company=self.request.user.company)
+        queryset = CatalogItem.objects.filter(company=self.request.user.company)
+        selected = CatalogItemSerializer.selected_fields(self.request)
+        if selected is not None:
+            # Skip loading unrequested columns such as dimensions
+            columns = {'id', 'category'} | {name for name in selected if name != 'id'}
+            queryset = queryset.only(*columns)
+        return queryset
 
     def perform_create(self, serializer):
         """
@@ -46,3 +62,69 @@ class CatalogItemRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
         Filter queryset to only return CatalogItems belonging to the user's company.
         """
         return CatalogItem.objects.filter(company=self.request.user.company)
+
+
+class CatalogItemSearchAPIView(APIView):
+    """
+    API endpoint for ranked typeahead search over the company's catalog.
+
+    ?q= matches word fragments of name, brand, model, sku and category;
+    ?limit= caps the results (default 20, max 100) and ?fields= works as
+    on the list endpoint.
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        ids = search_catalog(request.user.company, request.query_params.get('q', ''), limit)
+        items = CatalogItem.objects.filter(company=request.user.company, pk__in=ids)
+        selected = CatalogItemSerializer.selected_fields(request)
+        if selected is not None:
+            items = items.only(*({'id'} | set(selected)))
+        by_id = {item.pk: item for item in items}
+        ranked = [by_id[pk] for pk in ids if pk in by_id]
+        serializer = CatalogItemSerializer(ranked, many=True, context={'request': request})
+        return Response({'results': serializer.data})
+
+
+class CatalogImportAPIView(APIView):
+    """
+    API endpoint for importing catalog items, assets and barcodes from a spreadsheet.
+
+    Accepts a multipart "file" with a CSV or XLSX sheet (picked by "format"
+    or the .xlsx extension), one row per asset. Rows that fail validation
+    are reported back by line; the other rows are imported.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = CatalogImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        try:
+            rows = read_sheet(upload, upload.name, serializer.validated_data.get('format'))
+            result = import_catalog(rows, request.user.company)
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'detail': f'Unreadable sheet: {e}'}, status=400)
+        return Response(result._asdict())
+
+
+class BarcodeResolveAPIView(APIView):
+    """
+    API endpoint resolving a scanned barcode to what it labels.
+
+    Returns the asset with its catalog item, location and status, or the
+    catalog item, case or kit the barcode is attached to.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, value):
+        summary = resolve_barcode(request.user.company, value)
+        if summary is None:
+            return Response({'detail': 'Unknown barcode'}, status=404)
+        return Response(summary)
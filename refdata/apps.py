@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RefdataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'refdata'
+
+    def ready(self):
+        # Connect cache invalidation handlers
+        from refdata import signals
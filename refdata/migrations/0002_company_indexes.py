@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0004_company_owner'),
+        ('refdata', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pricepolicy',
+            index=models.Index(fields=['company', 'name'], name='idx_pricepolicy_company_name'),
+        ),
+        migrations.AddIndex(
+            model_name='taxrule',
+            index=models.Index(fields=['company', 'name'], name='idx_taxrule_company_name'),
+        ),
+        migrations.AddIndex(
+            model_name='vendor',
+            index=models.Index(fields=['company', 'name'], name='idx_vendor_company_name'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['company', 'name'], name='idx_venue_company_name'),
+        ),
+    ]
@@ -1,5 +1,7 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from company.models import Company
+from company.tenancy import TenantManager
 
 class Venue(models.Model):
     name = models.CharField(max_length=255)
@@ -9,11 +11,17 @@ class Venue(models.Model):
     notes = models.TextField(blank=True, null=True)
     company = models.ForeignKey(Company, related_name='venues', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name_plural = "venues"
+        indexes = [
+            models.Index(fields=['company', 'name'], name='idx_venue_company_name'),
+        ]
 
 
 class Vendor(models.Model):
@@ -22,11 +30,17 @@ class Vendor(models.Model):
     contacts = models.JSONField(blank=True, null=True)
     company = models.ForeignKey(Company, related_name='vendors', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name_plural = "vendors"
+        indexes = [
+            models.Index(fields=['company', 'name'], name='idx_vendor_company_name'),
+        ]
 
 
 class TaxRule(models.Model):
@@ -35,11 +49,17 @@ class TaxRule(models.Model):
     region = models.CharField(max_length=255, blank=True, null=True)
     company = models.ForeignKey(Company, related_name='tax_rules', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name_plural = "tax rules"
+        indexes = [
+            models.Index(fields=['company', 'name'], name='idx_taxrule_company_name'),
+        ]
 
 
 class PricePolicy(models.Model):
@@ -49,8 +69,36 @@ class PricePolicy(models.Model):
     overtimeRule = models.JSONField(blank=True, null=True)
     company = models.ForeignKey(Company, related_name='price_policies', on_delete=models.CASCADE)
 
+    objects = TenantManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return self.name
 
+    def clean(self):
+        """Reject policy JSON that pricing could not compile"""
+        super().clean()
+        from .pricing import PricingError, compile_policy
+
+        errors = {}
+        for field, rules in (
+            ('degressive', {'degressive': self.degressive}),
+            ('weekendRule', {'weekend_rule': self.weekendRule}),
+            ('overtimeRule', {'overtime_rule': self.overtimeRule}),
+        ):
+            try:
+                compile_policy(**rules)
+            except PricingError as exc:
+                errors[field] = str(exc)
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        self.clean()
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = "price policies"
+        indexes = [
+            models.Index(fields=['company', 'name'], name='idx_pricepolicy_company_name'),
+        ]
@@ -0,0 +1,337 @@
+"""
+Rental pricing driven by PricePolicy.
+
+Policy JSON understood here:
+
+- degressive: per-day factors, either a list ``[1.0, 0.5, 0.5, 0.25]`` (day 1,
+  day 2, ...) or tiers ``{"1": 1.0, "2": 0.5, "4": 0.25}`` (from day -> factor).
+  The last factor applies to every later day.
+- weekendRule: ``{"days": [5, 6], "factor": 1.5}``; rental days falling on
+  those weekdays (Monday = 0) are multiplied by factor.
+- overtimeRule: ``{"graceHours": 2, "factor": 0.5}``; a window running past
+  its last whole day is charged an extra day at factor, unless the excess
+  stays within graceHours.
+
+Items without a policy are priced flat, rate x days. PricePolicy.clean()
+rejects JSON of any other shape; a malformed policy already stored only
+fails pricing (with PricingError) for the items that use it.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from equipment.models import CatalogItem, Kit
+from .models import PricePolicy
+
+POLICY_CACHE_TIMEOUT = 60 * 60
+
+ONE = Decimal('1')
+CENT = Decimal('0.01')
+DEFAULT_WEEKEND_DAYS = (5, 6)
+# Longest degressive table a policy may define, in days
+MAX_DEGRESSIVE_DAYS = 366
+
+CompiledPolicy = namedtuple('CompiledPolicy', [
+    'factors',          # per-day degressive factors, the last one repeating
+    'weekday_factors',  # weekend multiplier for Monday..Sunday
+    'table',            # table[start weekday][days] -> cumulative multiplier
+    'week',             # multiplier of one full week past the end of the table
+    'grace_hours',
+    'overtime_factor',
+])
+
+Price = namedtuple('Price', ['days', 'multiplier', 'unit_rate', 'line_total'])
+
+
+class PricingError(ValueError):
+    """Raised when a price cannot be computed for the requested window."""
+
+
+def _cache_key(company_id):
+    return f"refdata:price-policies:{company_id}"
+
+
+def _decimal(value, name, default=ONE):
+    """A non-negative finite number from policy JSON."""
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise PricingError(f"{name} must be a number")
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise PricingError(f"{name} must be a number")
+    if not number.is_finite() or number < 0:
+        raise PricingError(f"{name} must be a non-negative number")
+    return number
+
+
+def _day(value, name, low, high):
+    try:
+        day = int(value)
+    except (TypeError, ValueError):
+        raise PricingError(f"{name} must be whole numbers")
+    if isinstance(value, (bool, float)) or not low <= day <= high:
+        raise PricingError(f"{name} must be whole numbers from {low} to {high}")
+    return day
+
+
+def _rule(rule, name):
+    if rule is None:
+        return {}
+    if not isinstance(rule, dict):
+        raise PricingError(f"{name} must be an object")
+    return rule
+
+
+def _degressive_factors(degressive):
+    """Per-day factors from either JSON form; [1] when the policy has none."""
+    if isinstance(degressive, dict):
+        tiers = sorted(
+            (_day(day, 'degressive days', 1, MAX_DEGRESSIVE_DAYS), _decimal(factor, 'degressive factors'))
+            for day, factor in degressive.items()
+        )
+        if not tiers:
+            return (ONE,)
+        factors = []
+        for day in range(1, tiers[-1][0] + 1):
+            current = ONE
+            for start, factor in tiers:
+                if start <= day:
+                    current = factor
+            factors.append(current)
+        return tuple(factors)
+    if isinstance(degressive, (list, tuple)):
+        if len(degressive) > MAX_DEGRESSIVE_DAYS:
+            raise PricingError(f"degressive may list at most {MAX_DEGRESSIVE_DAYS} days")
+        return tuple(_decimal(factor, 'degressive factors') for factor in degressive) or (ONE,)
+    if degressive is not None:
+        raise PricingError("degressive must be a list of factors or an object of tiers")
+    return (ONE,)
+
+
+def compile_policy(degressive=None, weekend_rule=None, overtime_rule=None):
+    """
+    Turn policy JSON into a lookup table.
+
+    The table holds the cumulative multiplier for every start weekday and
+    day count up to one week past the last degressive tier; longer rentals
+    add whole weeks of the repeating tail factor.
+
+    Returns:
+        CompiledPolicy
+
+    Raises:
+        PricingError: if the JSON does not have the shape described above
+    """
+    factors = _degressive_factors(degressive)
+
+    weekday_factors = [ONE] * 7
+    weekend_rule = _rule(weekend_rule, 'weekendRule')
+    if weekend_rule:
+        weekend_days = weekend_rule.get('days', DEFAULT_WEEKEND_DAYS)
+        if not isinstance(weekend_days, (list, tuple)):
+            raise PricingError("weekendRule days must be a list")
+        weekend_factor = _decimal(weekend_rule.get('factor'), 'weekendRule factor')
+        for weekday in weekend_days:
+            weekday_factors[_day(weekday, 'weekendRule days', 0, 6)] = weekend_factor
+
+    length = len(factors) + 7
+    table = []
+    for start in range(7):
+        cumulative = [Decimal(0)]
+        for day in range(length):
+            factor = factors[min(day, len(factors) - 1)]
+            cumulative.append(cumulative[-1] + factor * weekday_factors[(start + day) % 7])
+        table.append(tuple(cumulative))
+
+    overtime_rule = _rule(overtime_rule, 'overtimeRule')
+    return CompiledPolicy(
+        factors=factors,
+        weekday_factors=tuple(weekday_factors),
+        table=tuple(table),
+        week=factors[-1] * sum(weekday_factors),
+        grace_hours=_decimal(overtime_rule.get('graceHours'), 'overtimeRule graceHours', Decimal(0)),
+        overtime_factor=_decimal(overtime_rule.get('factor'), 'overtimeRule factor'),
+    )
+
+
+FLAT = compile_policy()
+
+
+def _compile_row(pk, name, *rules):
+    try:
+        return compile_policy(*rules)
+    except PricingError as exc:
+        return PricingError(f"Price policy {name!r} is invalid: {exc}")
+
+
+def company_policies(company_id):
+    """
+    Compiled price policies of a company, cached until a policy changes.
+
+    Returns:
+        dict: {pricePolicyId: CompiledPolicy, or the PricingError of a
+        malformed policy}
+    """
+    key = _cache_key(company_id)
+    compiled = cache.get(key)
+    if compiled is None:
+        rows = PricePolicy.objects.filter(company_id=company_id).values_list(
+            'pk', 'name', 'degressive', 'weekendRule', 'overtimeRule',
+        )
+        compiled = {row[0]: _compile_row(*row) for row in rows}
+        cache.set(key, compiled, POLICY_CACHE_TIMEOUT)
+    return compiled
+
+
+def _policy(policies, policy_id):
+    """
+    Raises:
+        PricingError: if the policy is malformed
+    """
+    policy = policies.get(policy_id, FLAT)
+    if isinstance(policy, PricingError):
+        raise PricingError(*policy.args)
+    return policy
+
+
+def invalidate_company_policies(company_id):
+    cache.delete(_cache_key(company_id))
+
+
+def _cumulative(policy, start_weekday, days):
+    table = policy.table[start_weekday]
+    last = len(table) - 1
+    if days <= last:
+        return table[days]
+    # Past the table every day uses the tail factor, so whole weeks repeat
+    weeks, rest = divmod(days - last, 7)
+    tail_start = (start_weekday + last) % 7
+    tail = sum(policy.weekday_factors[(tail_start + day) % 7] for day in range(rest))
+    return table[last] + weeks * policy.week + tail * policy.factors[-1]
+
+
+def rental_days(date_from, date_to):
+    """
+    Whole rental days in a window and the hours it runs past the last one.
+
+    Returns:
+        tuple: (days, excess hours as Decimal, start weekday)
+    """
+    if date_to <= date_from:
+        raise PricingError("dateFrom must be earlier than dateTo")
+    elapsed = date_to - date_from
+    days, excess = elapsed.days, elapsed - timedelta(days=elapsed.days)
+    start_weekday = timezone.localtime(date_from).weekday() if timezone.is_aware(date_from) else date_from.weekday()
+    return days, Decimal(excess.total_seconds()) / 3600, start_weekday
+
+
+def window_multiplier(policy, days, excess_hours, start_weekday):
+    """
+    Price multiplier of a window under a compiled policy.
+
+    Returns:
+        tuple: (charged days, multiplier)
+    """
+    multiplier = _cumulative(policy, start_weekday, days)
+    charged = days
+    if excess_hours and (excess_hours > policy.grace_hours or not days):
+        extra = _cumulative(policy, start_weekday, days + 1) - multiplier
+        factor = policy.overtime_factor if days else ONE
+        multiplier += extra * factor
+        charged += 1
+    return charged, multiplier
+
+
+def _price(rate, qty, charged, multiplier):
+    line_total = (rate * multiplier * qty).quantize(CENT, rounding=ROUND_HALF_UP)
+    return Price(charged, multiplier, rate, line_total)
+
+
+def price_item(catalog_item, qty, date_from, date_to):
+    """
+    Price of renting qty units of a catalog item over a window.
+
+    Args:
+        catalog_item: CatalogItem to price
+        qty: number of units
+        date_from, date_to: rental window
+
+    Returns:
+        Price: charged days, multiplier, unit rate (the day-one rate) and line total
+
+    Raises:
+        PricingError: if the window is invalid or the item's policy is malformed
+    """
+    policy = FLAT
+    if catalog_item.pricePolicy_id is not None:
+        policy = _policy(company_policies(catalog_item.company_id), catalog_item.pricePolicy_id)
+    charged, multiplier = window_multiplier(policy, *rental_days(date_from, date_to))
+    return _price(catalog_item.defaultRate, qty, charged, multiplier)
+
+
+def _project_window(quote):
+    dates = quote.projectId.eventDates or {}
+    date_from = parse_datetime(dates.get('loadIn') or dates.get('showStart') or '')
+    date_to = parse_datetime(dates.get('loadOut') or dates.get('showEnd') or '')
+    if date_from is None or date_to is None:
+        raise PricingError("The project has no loadIn/loadOut dates to price the quote with")
+    return date_from, date_to
+
+
+def price_quote(quote, date_from=None, date_to=None):
+    """
+    Price every line of a quote in one pass.
+
+    Lines are matched to catalog items or kits by itemRef (their SKU). The
+    window is read once, items and kits are fetched in one query each and
+    every line is then priced with table lookups from the company's
+    compiled policies. Kits are priced flat at their own rate.
+
+    Args:
+        quote: Quote to price
+        date_from, date_to: rental window, defaults to the project's
+            loadIn/loadOut event dates
+
+    Returns:
+        dict: {quoteLineId: Price}; lines whose itemRef matches no SKU are left out
+
+    Raises:
+        PricingError: if no valid window is available, or a line's item
+            uses a malformed policy
+    """
+    if date_from is None or date_to is None:
+        date_from, date_to = _project_window(quote)
+    days, excess_hours, start_weekday = rental_days(date_from, date_to)
+
+    lines = list(quote.lines.values_list('pk', 'itemRef', 'qty'))
+    refs = {item_ref for _, item_ref, _ in lines}
+    company_id = quote.projectId.account.company_id
+
+    items = {
+        sku: (rate, policy_id)
+        for sku, rate, policy_id in CatalogItem.objects
+        .filter(company_id=company_id, sku__in=refs)
+        .values_list('sku', 'defaultRate', 'pricePolicy_id')
+    }
+    items.update({
+        sku: (rate, None)
+        for sku, rate in Kit.objects.filter(company_id=company_id, sku__in=refs - set(items)).values_list('sku', 'rate')
+    })
+
+    policies = company_policies(company_id)
+    multipliers = {}
+    prices = {}
+    for pk, item_ref, qty in lines:
+        if item_ref not in items:
+            continue
+        rate, policy_id = items[item_ref]
+        if policy_id not in multipliers:
+            multipliers[policy_id] = window_multiplier(_policy(policies, policy_id), days, excess_hours, start_weekday)
+        prices[pk] = _price(rate, qty, *multipliers[policy_id])
+    return prices
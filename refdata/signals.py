@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from refdata.models import PricePolicy
+from refdata.pricing import invalidate_company_policies
+
+
+@receiver([post_save, post_delete], sender=PricePolicy)
+def invalidate_policies_on_change(sender, instance, **kwargs):
+    invalidate_company_policies(instance.company_id)
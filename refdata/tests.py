@@ -1,3 +1,122 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-# Create your tests here.
+from company.testing import dt, make_company, make_project
+from documentsFinance.models import Quote, QuoteLine
+from equipment.models import CatalogItem, Kit
+from refdata.models import PricePolicy
+from refdata.pricing import PricingError, compile_policy, price_item, price_quote, window_multiplier
+
+
+class PricingTestCase(TestCase):
+    """Test cases for the PricePolicy pricing engine"""
+
+    def setUp(self):
+        cache.clear()
+        self.company = make_company()
+        self.policy = PricePolicy.objects.create(
+            name='Standard', company=self.company, degressive=[1, 0.5, 0.5, 0.25],
+            overtimeRule={'graceHours': 2, 'factor': 0.5},
+        )
+        self.speaker = CatalogItem.objects.create(
+            sku='A15', name='A15 Pair', category='audio', defaultRate=Decimal('250.00'),
+            pricePolicy=self.policy, company=self.company,
+        )
+
+    def test_degression(self):
+        price = price_item(self.speaker, 1, dt(1), dt(4))
+        self.assertEqual((price.days, price.line_total), (3, Decimal('500.00')))
+        price = price_item(self.speaker, 2, dt(1), dt(11))
+        # 1 + 0.5 + 0.5 + 7 x 0.25
+        self.assertEqual(price.multiplier, Decimal('3.75'))
+        self.assertEqual(price.line_total, Decimal('1875.00'))
+
+    def test_tier_form_matches_list_form(self):
+        tiers = compile_policy({'1': 1, '2': 0.5, '4': 0.25})
+        listed = compile_policy([1, 0.5, 0.5, 0.25])
+        for days in (1, 3, 9, 40, 400):
+            self.assertEqual(window_multiplier(tiers, days, 0, 2), window_multiplier(listed, days, 0, 2))
+
+    def test_long_rentals_extend_the_table(self):
+        policy = compile_policy([1, 0.5], {'days': [5, 6], 'factor': 2})
+        for start in range(7):
+            for days in (30, 365):
+                expected = sum(
+                    (Decimal(1) if day == 0 else Decimal('0.5')) * (2 if (start + day) % 7 in (5, 6) else 1)
+                    for day in range(days)
+                )
+                self.assertEqual(window_multiplier(policy, days, 0, start)[1], expected)
+
+    def test_weekend_rule(self):
+        self.policy.degressive = None
+        self.policy.weekendRule = {'days': [5, 6], 'factor': 1.5}
+        self.policy.save()
+        # Friday to Monday: Fri 1, Sat 1.5, Sun 1.5
+        self.assertEqual(price_item(self.speaker, 1, dt(5), dt(8)).multiplier, Decimal('4.0'))
+
+    def test_overtime(self):
+        self.assertEqual(price_item(self.speaker, 1, dt(1), dt(3, 2)).multiplier, Decimal('1.5'))
+        price = price_item(self.speaker, 1, dt(1), dt(3, 6))
+        self.assertEqual((price.days, price.multiplier), (3, Decimal('1.75')))
+        self.assertEqual(price_item(self.speaker, 1, dt(1, 8), dt(1, 20)).days, 1)
+
+    def test_policy_change_invalidates_cache(self):
+        price_item(self.speaker, 1, dt(1), dt(4))
+        self.policy.degressive = [1]
+        self.policy.save()
+        self.assertEqual(price_item(self.speaker, 1, dt(1), dt(4)).line_total, Decimal('750.00'))
+
+    def test_malformed_policy_json_is_rejected_on_save(self):
+        for field, value in [
+            ('degressive', {'two': 0.5}),
+            ('degressive', [1, 'half']),
+            ('degressive', 0.5),
+            ('weekendRule', [5, 6]),
+            ('weekendRule', {'days': [7], 'factor': 1.5}),
+            ('overtimeRule', {'graceHours': -1}),
+        ]:
+            policy = PricePolicy(name='Broken', company=self.company, **{field: value})
+            with self.assertRaises(ValidationError) as raised:
+                policy.save()
+            self.assertIn(field, raised.exception.message_dict)
+        self.assertEqual(PricePolicy.objects.filter(name='Broken').count(), 0)
+
+    def test_malformed_policy_only_fails_its_own_items(self):
+        broken = PricePolicy.objects.create(name='Broken', company=self.company)
+        PricePolicy.objects.filter(pk=broken.pk).update(weekendRule=[5, 6])
+        cache.clear()
+        light = CatalogItem.objects.create(
+            sku='PAR', name='PAR 64', category='lighting', defaultRate=Decimal('10.00'),
+            pricePolicy=broken, company=self.company,
+        )
+        with self.assertRaisesMessage(PricingError, "Price policy 'Broken' is invalid"):
+            price_item(light, 1, dt(1), dt(4))
+        self.assertEqual(price_item(self.speaker, 1, dt(1), dt(4)).line_total, Decimal('500.00'))
+
+        project = make_project(self.company, loadIn='2026-06-01T00:00:00Z', loadOut='2026-06-04T00:00:00Z')
+        quote = Quote.objects.create(projectId=project, number='Q-1', totals={})
+        line = QuoteLine.objects.create(quoteId=quote, itemRef='A15', qty=1, rate=0)
+        self.assertEqual(price_quote(quote)[line.id].line_total, Decimal('500.00'))
+        QuoteLine.objects.create(quoteId=quote, itemRef='PAR', qty=1, rate=0)
+        with self.assertRaises(PricingError):
+            price_quote(quote)
+
+    def test_quote_is_priced_in_one_pass(self):
+        project = make_project(self.company, loadIn='2026-06-01T00:00:00Z', loadOut='2026-06-04T00:00:00Z')
+        quote = Quote.objects.create(projectId=project, number='Q-1', totals={})
+        Kit.objects.create(name='Vocal', sku='VOCAL', rate=Decimal('40.00'), items=[], company=self.company)
+        lines = [
+            QuoteLine.objects.create(quoteId=quote, itemRef=ref, qty=qty, rate=0)
+            for ref, qty in [('A15', 2)] * 50 + [('VOCAL', 1), ('custom', 1)]
+        ]
+        quote = Quote.objects.select_related('projectId__account').get(pk=quote.pk)
+        price_quote(quote)
+        # lines, catalog items, kits; compiled policies come from the cache
+        with self.assertNumQueries(3):
+            prices = price_quote(quote)
+        self.assertEqual(prices[lines[0].id].line_total, Decimal('1000.00'))
+        self.assertEqual(prices[lines[50].id].line_total, Decimal('120.00'))
+        self.assertNotIn(lines[51].id, prices)
@@ -54,7 +54,12 @@ export async function action({ request }: Route.ActionArgs) {
 export async function loader({ request }: Route.LoaderArgs) {
   const session = await getSession(request.headers.get("Cookie"));
   if (session.has("user")){
-    const apiUrl = process.env.API_URL + '/api/equipment/catalog-items/'
+    const apiUrl = new URL(process.env.API_URL + '/api/equipment/catalog-items/')
+    // The API pages by cursor; pass the page's ?cursor= through
+    const cursor = new URL(request.url).searchParams.get("cursor")
+    if (cursor) {
+      apiUrl.searchParams.set("cursor", cursor)
+    }
     const tokens = session.get("tokens")
     const apiRes = await fetch(apiUrl, {
       method: 'GET',
@@ -67,7 +72,8 @@ export async function loader({ request }: Route.LoaderArgs) {
       throw new Error(apiRes.statusText)
     }
     const apiRestJson= await apiRes.json()
-    return apiRestJson
+    const next = apiRestJson.next && new URL(apiRestJson.next).searchParams.get("cursor")
+    return {items: apiRestJson.results, next}
   }
   return
 }
@@ -274,8 +280,9 @@ const CreateItemFormFields = () =>{
 }
 
 export default function CatalogItems() {
-  const loaderdata = useLoaderData()
-  const columns = loaderdata && Object.keys(loaderdata[0])
+  const page = useLoaderData()
+  const loaderdata = page?.items ?? []
+  const columns = loaderdata.length ? Object.keys(loaderdata[0]) : []
   const [open, setOpen] = useState(false);
   useSignals()
 
@@ -335,6 +342,16 @@ export default function CatalogItems() {
                 </tbody>
               </table>
             </div>
+            {page?.next && (
+              <div className="mt-4 flex justify-end">
+                <a
+                  href={"/catalog-items?cursor=" + encodeURIComponent(page.next)}
+                  className="rounded-md bg-white px-3 py-2 text-sm font-semibold text-gray-900 shadow-xs outline-1 outline-gray-300 hover:bg-gray-50 dark:bg-white/10 dark:text-white dark:outline-white/10"
+                >
+                  Next page
+                </a>
+              </div>
+            )}
           </div>
         </div>
       </div>
@@ -1,8 +1,21 @@
 from django.contrib import admin
-from .models import Reservation
+from .models import AssetAllocation, DailyAvailability, Reservation
 
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
     list_display = ('projectId', 'itemType', 'refId', 'qty', 'dateFrom', 'dateTo', 'status')
     list_filter = ('itemType', 'status', 'dateFrom', 'dateTo')
     search_fields = ('projectId__name', 'lineId', 'refId')
+
+
+@admin.register(DailyAvailability)
+class DailyAvailabilityAdmin(admin.ModelAdmin):
+    list_display = ('catalogItem', 'day', 'reservedQty', 'subrentedQty', 'company')
+    list_filter = ('company', 'day')
+    search_fields = ('catalogItem__name', 'catalogItem__sku')
+
+
+@admin.register(AssetAllocation)
+class AssetAllocationAdmin(admin.ModelAdmin):
+    list_display = ('reservationId', 'assetId', 'created_at')
+    search_fields = ('assetId__serial', 'reservationId__lineId')
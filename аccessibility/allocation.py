@@ -0,0 +1,156 @@
+import heapq
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from equipment.kits import kits_containing
+from .models import ACTIVE_RESERVATION_STATUSES, AssetAllocation, Reservation
+from .services import rentable_assets
+
+AllocationResult = namedtuple('AllocationResult', ['assignments', 'shortages', 'assets_used'])
+
+
+def _merge_windows(windows):
+    """Sort windows and merge overlapping ones, so they can be bisected."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _overlaps_busy(busy, start, end):
+    """Whether [start, end) overlaps one of the sorted, disjoint busy windows."""
+    if not busy:
+        return False
+    starts, ends = busy
+    idx = bisect_left(starts, end) - 1
+    return idx >= 0 and ends[idx] > start
+
+
+def allocate(reservations, assets, busy=None, preferred_location=None):
+    """
+    Assign concrete assets to catalog-level demand with the fewest assets.
+
+    Greedy interval partitioning: demand is taken in start order, assets
+    whose last assignment has ended return to the free pool through a heap
+    keyed on end time, and a fresh asset is only opened when no already-used
+    asset is free. Within each tier, assets at the preferred location win.
+
+    Args:
+        reservations: iterable of (reservation_id, start, end, qty)
+        assets: iterable of (asset_id, location_id)
+        busy: optional {asset_id: [(start, end), ...]} windows an asset is
+            already committed to elsewhere, e.g. asset-level reservations
+        preferred_location: optional location id to draw assets from first
+
+    Returns:
+        AllocationResult: {reservation_id: [asset_ids]}, {reservation_id: units
+        missing} and the number of distinct assets used
+    """
+    blocked = {}
+    for asset_id, windows in (busy or {}).items():
+        # Reservations and checked-out allocations may overlap each other
+        windows = _merge_windows(windows)
+        blocked[asset_id] = ([start for start, _ in windows], [end for _, end in windows])
+
+    # Stacks popped from the end: preferred assets are pushed last
+    ordered = sorted(assets, key=lambda asset: asset[1] == preferred_location)
+    fresh = [asset_id for asset_id, _ in ordered]
+    location = dict(assets)
+    reused = {True: [], False: []}
+    in_use = []
+
+    assignments = defaultdict(list)
+    shortages = {}
+    used = 0
+
+    for reservation_id, start, end, qty in sorted(reservations, key=lambda r: (r[1], r[2])):
+        while in_use and in_use[0][0] <= start:
+            _, asset_id = heapq.heappop(in_use)
+            reused[location[asset_id] == preferred_location].append(asset_id)
+
+        taken = []
+        for pool in (reused[True], reused[False], fresh):
+            skipped = []
+            while pool and len(taken) < qty:
+                asset_id = pool.pop()
+                if _overlaps_busy(blocked.get(asset_id), start, end):
+                    skipped.append(asset_id)
+                    continue
+                if pool is fresh:
+                    used += 1
+                taken.append(asset_id)
+            pool.extend(reversed(skipped))
+            if len(taken) == qty:
+                break
+
+        for asset_id in taken:
+            heapq.heappush(in_use, (end, asset_id))
+        assignments[reservation_id] = taken
+        if len(taken) < qty:
+            shortages[reservation_id] = qty - len(taken)
+
+    return AllocationResult(dict(assignments), shortages, used)
+
+
+def allocate_catalog_item(catalog_item, location=None, since=None, commit=True):
+    """
+    Allocate assets to every upcoming reservation of a catalog item.
+
+    Demand covers catalog reservations and kit reservations holding the item.
+    Reservations already checked out keep their assets, which stay blocked
+    for their window along with asset-level reservations. Assets under
+    maintenance, damaged or retired are never picked.
+
+    Args:
+        catalog_item: CatalogItem to allocate
+        location: optional StockLocation whose assets are preferred
+        since: ignore reservations that ended before this moment (default now)
+        commit: replace the stored AssetAllocation rows with the result
+
+    Returns:
+        AllocationResult
+    """
+    since = since or timezone.now()
+    live = Reservation.objects.filter(status__in=ACTIVE_RESERVATION_STATUSES, dateTo__gt=since)
+
+    kit_qty = kits_containing({catalog_item.pk}).get(catalog_item.pk, {})
+    demand = []
+    catalog_rows = live.filter(itemType='catalog', refId=catalog_item.pk).exclude(status='checkedOut')
+    for pk, start, end, qty in catalog_rows.values_list('pk', 'dateFrom', 'dateTo', 'qty'):
+        demand.append((pk, start, end, qty))
+    if kit_qty:
+        kit_rows = live.filter(itemType='kit', refId__in=list(kit_qty)).exclude(status='checkedOut')
+        for pk, kit_id, start, end, qty in kit_rows.values_list('pk', 'refId', 'dateFrom', 'dateTo', 'qty'):
+            demand.append((pk, start, end, qty * kit_qty[kit_id]))
+
+    assets = list(rentable_assets().filter(catalogItem=catalog_item).values_list('pk', 'location_id'))
+    asset_ids = [asset_id for asset_id, _ in assets]
+
+    busy = defaultdict(list)
+    fixed = live.filter(itemType='asset', refId__in=asset_ids).values_list('refId', 'dateFrom', 'dateTo')
+    for asset_id, start, end in fixed:
+        busy[asset_id].append((start, end))
+    checked_out = (AssetAllocation.objects
+                   .filter(assetId__in=asset_ids, reservationId__in=live.filter(status='checkedOut'))
+                   .values_list('assetId', 'reservationId__dateFrom', 'reservationId__dateTo'))
+    for asset_id, start, end in checked_out:
+        busy[asset_id].append((start, end))
+
+    result = allocate(demand, assets, busy, location.pk if location is not None else None)
+
+    if commit:
+        with transaction.atomic():
+            AssetAllocation.objects.filter(reservationId__in=[pk for pk, _, _, _ in demand],
+                                           assetId__in=asset_ids).delete()
+            AssetAllocation.objects.bulk_create([
+                AssetAllocation(reservationId_id=reservation_id, assetId_id=asset_id)
+                for reservation_id, allocated in result.assignments.items()
+                for asset_id in allocated
+            ], batch_size=1000)
+    return result
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class АccessibilityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'аccessibility'
+
+    def ready(self):
+        # Connect calendar maintenance handlers
+        from . import signals
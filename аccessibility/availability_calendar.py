@@ -0,0 +1,238 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from documentsFinance.models import SubRentItem
+from documentsFinance.subrents import subrent_quantities
+from equipment.kits import explode_kits, kits_containing_kits
+from equipment.models import Asset, CatalogItem
+from .models import DailyAvailability, Reservation
+from .services import ACTIVE_RESERVATION_STATUSES, overlapping_reservations, rentable_assets
+
+BULK_BATCH_SIZE = 1000
+
+
+def touched_days(date_from, date_to):
+    """
+    First and last calendar day touched by the half-open window [date_from, date_to).
+    """
+    first = timezone.localtime(date_from).date()
+    last = timezone.localtime(date_to - timedelta(microseconds=1)).date()
+    return first, last
+
+
+def _catalog_companies(catalog_ids):
+    return dict(CatalogItem.objects.filter(pk__in=catalog_ids).values_list('pk', 'company_id'))
+
+
+def reservation_usage(reservation):
+    """
+    Catalog items held by a reservation, as {catalogItemId: qty}.
+    """
+    if reservation.status not in ACTIVE_RESERVATION_STATUSES:
+        return {}
+    if reservation.itemType == 'catalog':
+        return {reservation.refId: reservation.qty}
+    if reservation.itemType == 'asset':
+        catalog_id = Asset.objects.filter(pk=reservation.refId).values_list('catalogItem_id', flat=True).first()
+        return {catalog_id: reservation.qty} if catalog_id else {}
+    if reservation.itemType == 'kit':
+        parts = explode_kits([reservation.refId], skip_cycles=True).get(reservation.refId, {})
+        return {catalog_id: qty * reservation.qty for catalog_id, qty in parts.items()}
+    return {}
+
+
+def subrent_usage(subrent):
+    """
+    Catalog items supplied by a SubRent, as {catalogItemId: qty}.
+    """
+    return subrent_quantities(subrent.items)
+
+
+def apply_usage(usage, date_from, date_to, field, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) usage from the calendar days it touches.
+
+    Costs one insert for missing day rows and one F() update per catalog
+    item, independent of how many other reservations those days hold.
+    """
+    if not usage:
+        return
+    first, last = touched_days(date_from, date_to)
+    days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+    companies = _catalog_companies(usage.keys())
+
+    with transaction.atomic():
+        for catalog_id, qty in usage.items():
+            company_id = companies.get(catalog_id)
+            if company_id is None or not qty:
+                continue
+            DailyAvailability.objects.bulk_create(
+                [DailyAvailability(company_id=company_id, catalogItem_id=catalog_id, day=day) for day in days],
+                ignore_conflicts=True,
+            )
+            (DailyAvailability.objects
+             .filter(company_id=company_id, catalogItem_id=catalog_id, day__gte=first, day__lte=last)
+             .update(**{field: F(field) + sign * qty}))
+
+
+def rebuild_calendar(date_from, date_to, company=None):
+    """
+    Recompute the calendar for days date_from..date_to (inclusive) from scratch.
+
+    Args:
+        date_from (date): first day to rebuild
+        date_to (date): last day to rebuild
+        company: optional Company (or id) to limit the rebuild to
+
+    Returns:
+        int: number of day rows written
+    """
+    window_from = timezone.make_aware(datetime.combine(date_from, time.min))
+    window_to = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+
+    totals = defaultdict(lambda: [0, 0])
+
+    def spread(usage, start, end, index):
+        first, last = touched_days(max(start, window_from), min(end, window_to))
+        for catalog_id, qty in usage.items():
+            day = first
+            while day <= last:
+                totals[(catalog_id, day)][index] += qty
+                day += timedelta(days=1)
+
+    reservations = overlapping_reservations(window_from, window_to)
+    subrents = SubRentItem.objects.filter(dateFrom__lt=window_to, dateTo__gt=window_from)
+    if company is not None:
+        reservations = reservations.filter(projectId__account__company=company)
+        subrents = subrents.filter(catalogItem__company=company)
+
+    reservations = list(reservations.values_list('itemType', 'refId', 'qty', 'dateFrom', 'dateTo'))
+    asset_ids = {ref_id for item_type, ref_id, _, _, _ in reservations if item_type == 'asset'}
+    kit_ids = {ref_id for item_type, ref_id, _, _, _ in reservations if item_type == 'kit'}
+    asset_catalog = dict(Asset.objects.filter(pk__in=asset_ids).values_list('pk', 'catalogItem_id'))
+    kit_parts = explode_kits(kit_ids, skip_cycles=True) if kit_ids else {}
+
+    for item_type, ref_id, qty, start, end in reservations:
+        if item_type == 'catalog':
+            usage = {ref_id: qty}
+        elif item_type == 'asset':
+            usage = {asset_catalog[ref_id]: qty} if ref_id in asset_catalog else {}
+        else:
+            usage = {catalog_id: part_qty * qty for catalog_id, part_qty in kit_parts.get(ref_id, {}).items()}
+        spread(usage, start, end, 0)
+
+    for catalog_id, qty, start, end in subrents.values_list('catalogItem_id', 'qty', 'dateFrom', 'dateTo').iterator():
+        spread({catalog_id: qty}, start, end, 1)
+
+    companies = _catalog_companies({catalog_id for catalog_id, _ in totals})
+    rows = [
+        DailyAvailability(
+            company_id=companies[catalog_id], catalogItem_id=catalog_id, day=day,
+            reservedQty=reserved, subrentedQty=subrented,
+        )
+        for (catalog_id, day), (reserved, subrented) in totals.items()
+        if catalog_id in companies and (company is None or companies[catalog_id] == getattr(company, 'pk', company))
+    ]
+
+    with transaction.atomic():
+        existing = DailyAvailability.objects.filter(day__gte=date_from, day__lte=date_to)
+        if company is not None:
+            existing = existing.filter(company=company)
+        existing.delete()
+        DailyAvailability.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+    return len(rows)
+
+
+def rebuild_kit_reservations(company, kit_ids):
+    """
+    Rebuild the days covered by live reservations of the given kits and of
+    every kit containing them.
+
+    Kit reservations are expanded into catalog items when they are saved,
+    so a kit changing composition (directly or through a nested kit)
+    leaves those days counting the old components until they are rebuilt.
+    Overlapping reservation windows are rebuilt together, once.
+
+    Args:
+        company: Company (or id) whose kits changed
+        kit_ids: ids of the changed kits
+
+    Returns:
+        int: number of day rows written
+    """
+    company_id = getattr(company, 'pk', company)
+    windows = (Reservation.objects
+               .filter(itemType='kit', refId__in=kits_containing_kits(company_id, kit_ids),
+                       status__in=ACTIVE_RESERVATION_STATUSES, projectId__account__company=company_id)
+               .order_by('dateFrom')
+               .values_list('dateFrom', 'dateTo'))
+    spans = []
+    for start, end in windows:
+        first, last = touched_days(start, end)
+        if spans and first <= spans[-1][1] + timedelta(days=1):
+            spans[-1][1] = max(spans[-1][1], last)
+        else:
+            spans.append([first, last])
+    return sum(rebuild_calendar(first, last, company=company_id) for first, last in spans)
+
+
+class KitRebuild:
+    """
+    Kits changed in the current transaction, rebuilt by one on_commit call.
+    """
+
+    def __init__(self):
+        self.kit_ids = defaultdict(set)
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        for company_id, kit_ids in self.kit_ids.items():
+            rebuild_kit_reservations(company_id, kit_ids)
+
+
+def schedule_kit_rebuild(company_id, kit_id, using=None):
+    """
+    Rebuild the reservations of a changed kit once the transaction commits,
+    however many of its rows the transaction touches.
+    """
+    connection = transaction.get_connection(using)
+    job = next((entry[1] for entry in connection.run_on_commit
+                if isinstance(entry[1], KitRebuild) and not entry[1].done), None)
+    if job is None:
+        job = KitRebuild()
+        transaction.on_commit(job, using=using)
+    job.kit_ids[company_id].add(kit_id)
+
+
+def calendar_grid(company, date_from, date_to, catalog_item_ids=None):
+    """
+    Day-by-day usage for a company's catalog, read from the materialized table.
+
+    Returns:
+        dict: {catalogItemId: {'total': owned, 'days': {day: {'reserved': n, 'subrented': n}}}}
+        Days without usage are omitted.
+    """
+    rows = DailyAvailability.objects.filter(company=company, day__gte=date_from, day__lte=date_to)
+    if catalog_item_ids is not None:
+        rows = rows.filter(catalogItem_id__in=catalog_item_ids)
+    rows = rows.exclude(reservedQty=0, subrentedQty=0)
+
+    grid = defaultdict(lambda: {'total': 0, 'days': {}})
+    for catalog_id, day, reserved, subrented in rows.values_list('catalogItem_id', 'day', 'reservedQty', 'subrentedQty'):
+        grid[catalog_id]['days'][day.isoformat()] = {'reserved': reserved, 'subrented': subrented}
+
+    if grid:
+        owned = (
+            rentable_assets(company)
+            .filter(catalogItem_id__in=list(grid))
+            .values_list('catalogItem_id')
+            .annotate(n=Count('id'))
+        )
+        for catalog_id, n in owned:
+            grid[catalog_id]['total'] = n
+    return dict(grid)
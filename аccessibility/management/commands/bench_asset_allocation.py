@@ -0,0 +1,47 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+
+from аccessibility.allocation import allocate
+
+
+def allocation_fixture(reservations=5000, assets=300, locations=3, days=365, seed=42):
+    """
+    Synthetic demand for one catalog item: (reservations, assets) in the
+    shapes allocate() takes. Windows run from a few hours to a week and
+    quantities from 1 to 4 units, spread over `days`.
+    """
+    rng = random.Random(seed)
+    origin = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+    demand = []
+    for pk in range(1, reservations + 1):
+        start = origin + timedelta(hours=rng.randrange(days * 24))
+        end = start + timedelta(hours=rng.randint(6, 24 * 7))
+        demand.append((pk, start, end, rng.randint(1, 4)))
+    stock = [(pk, rng.randint(1, locations)) for pk in range(1, assets + 1)]
+    return demand, stock
+
+
+class Command(BaseCommand):
+    help = "Benchmark the greedy asset allocator on a synthetic catalog item"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=5000)
+        parser.add_argument('--assets', type=int, default=300)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        demand, stock = allocation_fixture(options['reservations'], options['assets'], seed=options['seed'])
+
+        started = time.perf_counter()
+        result = allocate(demand, stock, preferred_location=1)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        units = sum(qty for _, _, _, qty in demand)
+        short = sum(result.shortages.values())
+        self.stdout.write(f"Reservations:  {len(demand)} ({units} units)")
+        self.stdout.write(f"Assets:        {len(stock)} owned, {result.assets_used} used")
+        self.stdout.write(f"Shortages:     {len(result.shortages)} reservations, {short} units")
+        self.stdout.write(f"Elapsed:       {elapsed_ms:.1f} ms")
@@ -0,0 +1,45 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+
+from аccessibility.peak import peak_usage
+
+
+class Command(BaseCommand):
+    help = "Benchmark sweep-line peak usage against the naive overlap sum"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=365, help="Span the reservations are spread over")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        origin = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        span_hours = options['days'] * 24
+
+        intervals = []
+        for _ in range(options['reservations']):
+            start = origin + timedelta(hours=rng.randrange(span_hours))
+            end = start + timedelta(hours=rng.randint(4, 24 * 7))
+            intervals.append((start, end, rng.randint(1, 4)))
+
+        window_from = origin + timedelta(days=options['days'] // 3)
+        window_to = window_from + timedelta(days=30)
+
+        started = time.perf_counter()
+        naive = sum(qty for start, end, qty in intervals if start < window_to and end > window_from)
+        naive_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        peak = peak_usage(intervals, window_from, window_to)
+        sweep_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(f"Reservations:  {len(intervals)}")
+        self.stdout.write(f"Window:        {window_from:%Y-%m-%d} .. {window_to:%Y-%m-%d}")
+        self.stdout.write(f"Naive sum:     {naive} ({naive_ms:.1f} ms)")
+        self.stdout.write(f"Sweep peak:    {peak.qty} at {peak.start} .. {peak.end} ({sweep_ms:.1f} ms)")
+        if naive:
+            self.stdout.write(f"Overstatement: {naive - peak.qty} units ({(naive - peak.qty) / naive:.0%})")
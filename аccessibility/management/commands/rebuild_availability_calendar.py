@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from company.models import Company
+from аccessibility.availability_calendar import rebuild_calendar
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized daily availability calendar for a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', required=True, help="First day, YYYY-MM-DD")
+        parser.add_argument('--to', dest='date_to', required=True, help="Last day, YYYY-MM-DD")
+        parser.add_argument('--company', type=int, help="Only rebuild rows for this company id")
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from'])
+            date_to = date.fromisoformat(options['date_to'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if date_from > date_to:
+            raise CommandError("--from must not be after --to")
+
+        company = None
+        if options['company'] is not None:
+            company = Company.objects.filter(pk=options['company']).first()
+            if company is None:
+                raise CommandError(f"Company {options['company']} does not exist")
+
+        written = rebuild_calendar(date_from, date_to, company=company)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} calendar rows for {date_from}..{date_to}"))
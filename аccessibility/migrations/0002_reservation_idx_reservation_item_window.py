@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_initial'),
+        ('аccessibility', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['itemType', 'refId', 'dateFrom', 'dateTo'], name='idx_reservation_item_window'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0004_company_owner'),
+        ('equipment', '0002_remove_kit_upright_only_kititem'),
+        ('аccessibility', '0002_reservation_idx_reservation_item_window'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('reservedQty', models.IntegerField(default=0)),
+                ('subrentedQty', models.IntegerField(default=0)),
+                ('catalogItem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_availability', to='equipment.catalogitem')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_availability', to='company.company')),
+            ],
+            options={
+                'verbose_name_plural': 'daily availability',
+                'indexes': [models.Index(fields=['company', 'day', 'catalogItem'], name='idx_daily_avail_company_day')],
+                'constraints': [models.UniqueConstraint(fields=('company', 'catalogItem', 'day'), name='uniq_daily_availability')],
+            },
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:02
+
+from django.core.management.base import CommandError
+from django.db import migrations, models
+
+ACTIVE = "('hold', 'reserved', 'checkedOut')"
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    f"""
+    ALTER TABLE "{{table}}" ADD CONSTRAINT excl_reservation_asset_overlap
+    EXCLUDE USING gist ("refId" WITH =, tstzrange("dateFrom", "dateTo") WITH &&)
+    WHERE ("itemType" = 'asset' AND "status" IN {ACTIVE})
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    'ALTER TABLE "{table}" DROP CONSTRAINT IF EXISTS excl_reservation_asset_overlap',
+]
+
+SQLITE_OVERLAP = f"""
+    SELECT RAISE(ABORT, 'asset is already booked in this window')
+    WHERE EXISTS (
+        SELECT 1 FROM "{{table}}" r
+        WHERE r."itemType" = 'asset' AND r."status" IN {ACTIVE}
+          AND r."refId" = NEW."refId"
+          AND r."dateFrom" < NEW."dateTo" AND r."dateTo" > NEW."dateFrom"
+          AND r."id" IS NOT NEW."id"
+    );
+"""
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER trg_reservation_asset_overlap_insert
+    BEFORE INSERT ON "{{table}}"
+    WHEN NEW."itemType" = 'asset' AND NEW."status" IN {ACTIVE}
+    BEGIN {SQLITE_OVERLAP} END
+    """,
+    f"""
+    CREATE TRIGGER trg_reservation_asset_overlap_update
+    BEFORE UPDATE OF "itemType", "refId", "dateFrom", "dateTo", "status" ON "{{table}}"
+    WHEN NEW."itemType" = 'asset' AND NEW."status" IN {ACTIVE}
+    BEGIN {SQLITE_OVERLAP} END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS trg_reservation_asset_overlap_insert",
+    "DROP TRIGGER IF EXISTS trg_reservation_asset_overlap_update",
+]
+
+
+# Longest list of conflicts spelled out in the error
+MAX_REPORTED_OVERLAPS = 50
+
+
+def refuse_existing_overlaps(apps, schema_editor):
+    """
+    Abort before adding the guard if live asset reservations already
+    double-book an asset. Bookings are never changed here: the conflicts
+    have to be resolved through the conflict report first.
+    """
+    Reservation = apps.get_model('аccessibility', 'Reservation')
+    rows = (Reservation.objects
+            .filter(itemType='asset', status__in=('hold', 'reserved', 'checkedOut'))
+            .order_by('refId', 'dateFrom', 'pk')
+            .values_list('pk', 'refId', 'dateFrom', 'dateTo'))
+    overlaps = []
+    current_asset, latest = None, None
+    for pk, asset_id, start, end in rows.iterator():
+        if asset_id != current_asset:
+            current_asset, latest = asset_id, None
+        if latest is not None and start < latest[1]:
+            overlaps.append((asset_id, latest[0], pk))
+        if latest is None or end > latest[1]:
+            latest = (pk, end)
+    if overlaps:
+        listed = '\n'.join(
+            f"  asset {asset_id}: reservations {first} and {second}"
+            for asset_id, first, second in overlaps[:MAX_REPORTED_OVERLAPS]
+        )
+        more = len(overlaps) - MAX_REPORTED_OVERLAPS
+        if more > 0:
+            listed += f"\n  ... and {more} more"
+        raise CommandError(
+            f"{len(overlaps)} live reservation(s) double-book an asset:\n{listed}\n"
+            "Resolve them (see GET /api/availability/conflicts/) and run migrate again."
+        )
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        table = apps.get_model('аccessibility', 'Reservation')._meta.db_table
+        for statement in statements:
+            schema_editor.execute(statement.format(table=table))
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_initial'),
+        ('аccessibility', '0003_dailyavailability'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('itemType', 'asset'), ('status__in', ('hold', 'reserved', 'checkedOut'))), fields=['refId', 'dateFrom', 'dateTo'], name='idx_reservation_asset_window'),
+        ),
+        migrations.RunPython(refuse_existing_overlaps, migrations.RunPython.noop),
+        # Database-level guard against double-booking a serialized asset:
+        # an exclusion constraint where supported, triggers backed by the
+        # partial index above on SQLite.
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
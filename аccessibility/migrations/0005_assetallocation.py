@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0002_remove_kit_upright_only_kititem'),
+        ('аccessibility', '0004_reservation_asset_overlap_guard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('assetId', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='equipment.asset')),
+                ('reservationId', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='аccessibility.reservation')),
+            ],
+            options={
+                'verbose_name_plural': 'asset allocations',
+                'constraints': [models.UniqueConstraint(fields=('reservationId', 'assetId'), name='uniq_asset_allocation')],
+            },
+        ),
+    ]
@@ -1,5 +1,10 @@
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.utils import timezone
+from django.db.models import Q
+
+# Reservation statuses that hold stock for their whole window
+ACTIVE_RESERVATION_STATUSES = ('hold', 'reserved', 'checkedOut')
+
 
 class Reservation(models.Model):
     """
@@ -37,6 +42,43 @@ class Reservation(models.Model):
 
     class Meta:
         verbose_name_plural = "reservations"
+        indexes = [
+            # Window lookups for a single item: itemType/refId equality, then range on dates
+            models.Index(fields=["itemType", "refId", "dateFrom", "dateTo"], name="idx_reservation_item_window"),
+            # Double-booking checks only ever look at live asset reservations
+            models.Index(
+                fields=["refId", "dateFrom", "dateTo"],
+                condition=Q(itemType="asset", status__in=ACTIVE_RESERVATION_STATUSES),
+                name="idx_reservation_asset_window",
+            ),
+        ]
+
+    def conflicting_reservations(self):
+        """
+        Live reservations of the same asset whose window overlaps this one.
+
+        Empty unless this is an active asset reservation.
+        """
+        if self.itemType != 'asset' or self.status not in ACTIVE_RESERVATION_STATUSES:
+            return Reservation.objects.none()
+        return (Reservation.objects
+                .filter(itemType='asset', refId=self.refId, status__in=ACTIVE_RESERVATION_STATUSES,
+                        dateFrom__lt=self.dateTo, dateTo__gt=self.dateFrom)
+                .exclude(pk=self.pk))
+
+    def clean(self):
+        """Validate model data before saving"""
+        super().clean()
+        if self.dateFrom and self.dateTo and self.dateFrom >= self.dateTo:
+            raise ValidationError({"dateTo": "dateTo must be later than dateFrom"})
+        conflict = self.conflicting_reservations().values_list('pk', flat=True).first()
+        if conflict is not None:
+            raise ValidationError(f"Asset {self.refId} is already booked by reservation {conflict} in this window")
+
+    def save(self, *args, **kwargs):
+        """Save the reservation, refusing to double-book a serialized asset"""
+        self.clean()
+        super().save(*args, **kwargs)
 
 
 class AvailabilityView(models.Model):
@@ -64,31 +106,52 @@ class AvailabilityView(models.Model):
         Returns:
             dict: Availability information for the specified time window
         """
-        # This is a placeholder for the actual calculation logic
-        # In a real implementation, this would query:
-        # 1. Total inventory of the item
-        # 2. Active reservations during the time window
-        # 3. Subrents during the time window
-        # 4. Expected returns during the time window
-
-        # Example implementation (pseudocode):
-        # total_inventory = get_total_inventory(item_type, item_id)
-        # active_reservations = Reservation.objects.filter(
-        #     itemType=item_type, 
-        #     refId=item_id,
-        #     status__in=['hold', 'reserved', 'checkedOut'],
-        #     dateFrom__lt=date_to,
-        #     dateTo__gt=date_from
-        # ).aggregate(Sum('qty'))
-        # subrents = SubRent.objects.filter(...)
-        # returns = Return.objects.filter(...)
-        # availability = total_inventory - active_reservations - subrents + returns
-
-        return {
-            'item_type': item_type,
-            'item_id': item_id,
-            'date_from': date_from,
-            'date_to': date_to,
-            'availability': 0,  # Placeholder value
-            'calculation_time': timezone.now(),
-        }
+        from .services import calculate_availability
+
+        return calculate_availability(item_type, item_id, date_from, date_to)
+
+
+class DailyAvailability(models.Model):
+    """
+    Materialized per-day usage of a catalog item.
+
+    Maintained incrementally by Reservation and SubRent signals, and rebuilt in
+    bulk with the rebuild_availability_calendar command. A day counts every
+    reservation touching it, so this is a planning grid, not a peak figure.
+    """
+    company = models.ForeignKey('company.Company', on_delete=models.CASCADE, related_name='daily_availability')
+    catalogItem = models.ForeignKey('equipment.CatalogItem', on_delete=models.CASCADE, related_name='daily_availability')
+    day = models.DateField()
+    reservedQty = models.IntegerField(default=0)
+    subrentedQty = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.catalogItem_id} on {self.day}: {self.reservedQty} reserved"
+
+    class Meta:
+        verbose_name_plural = "daily availability"
+        constraints = [
+            models.UniqueConstraint(fields=["company", "catalogItem", "day"], name="uniq_daily_availability"),
+        ]
+        indexes = [
+            # Month grid reads: one company, a day range, every item
+            models.Index(fields=["company", "day", "catalogItem"], name="idx_daily_avail_company_day"),
+        ]
+
+
+class AssetAllocation(models.Model):
+    """
+    Concrete asset assigned to a catalog- or kit-level reservation for check-out.
+    """
+    reservationId = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name='allocations')
+    assetId = models.ForeignKey('equipment.Asset', on_delete=models.CASCADE, related_name='allocations')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Asset {self.assetId_id} for reservation {self.reservationId_id}"
+
+    class Meta:
+        verbose_name_plural = "asset allocations"
+        constraints = [
+            models.UniqueConstraint(fields=["reservationId", "assetId"], name="uniq_asset_allocation"),
+        ]
@@ -0,0 +1,52 @@
+from collections import namedtuple
+
+PeakUsage = namedtuple('PeakUsage', ['qty', 'start', 'end'])
+
+
+def peak_usage(intervals, window_from=None, window_to=None):
+    """
+    Maximum concurrent quantity over a set of half-open intervals.
+
+    Sweeps the sorted start/end events once, so the cost is O(n log n) in
+    the number of intervals. Reservations that overlap the window but not
+    each other are never counted together, unlike a plain sum.
+
+    Args:
+        intervals: iterable of (start, end, qty) tuples
+        window_from: optional lower bound intervals are clipped to
+        window_to: optional upper bound intervals are clipped to
+
+    Returns:
+        PeakUsage: peak quantity and the first [start, end) sub-interval
+        where it is reached; start and end are None when nothing is in use
+    """
+    events = []
+    for start, end, qty in intervals:
+        if window_from is not None and start < window_from:
+            start = window_from
+        if window_to is not None and end > window_to:
+            end = window_to
+        if start >= end or qty <= 0:
+            continue
+        events.append((start, qty))
+        events.append((end, -qty))
+
+    # Ends sort before starts at the same instant: back-to-back bookings don't overlap
+    events.sort()
+
+    peak = PeakUsage(0, None, None)
+    current = 0
+    peak_open = False
+    i = 0
+    while i < len(events):
+        moment = events[i][0]
+        while i < len(events) and events[i][0] == moment:
+            current += events[i][1]
+            i += 1
+        if current > peak.qty:
+            peak = PeakUsage(current, moment, None)
+            peak_open = True
+        elif peak_open and current < peak.qty:
+            peak = peak._replace(end=moment)
+            peak_open = False
+    return peak
@@ -0,0 +1,34 @@
+from rest_framework import serializers
+
+from .services import ITEM_TYPES
+
+
+class AvailabilityRequestSerializer(serializers.Serializer):
+    itemType = serializers.ChoiceField(choices=ITEM_TYPES)
+    refId = serializers.IntegerField()
+    dateFrom = serializers.DateTimeField()
+    dateTo = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['dateFrom'] >= attrs['dateTo']:
+            raise serializers.ValidationError('dateFrom must be earlier than dateTo.')
+        return attrs
+
+
+class BatchAvailabilitySerializer(serializers.Serializer):
+    items = AvailabilityRequestSerializer(many=True, allow_empty=False)
+
+
+class CalendarQuerySerializer(serializers.Serializer):
+    MAX_DAYS = 366
+
+    dateFrom = serializers.DateField()
+    dateTo = serializers.DateField()
+    catalogItems = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        if attrs['dateFrom'] > attrs['dateTo']:
+            raise serializers.ValidationError('dateFrom must not be after dateTo.')
+        if (attrs['dateTo'] - attrs['dateFrom']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f'The calendar can span at most {self.MAX_DAYS} days.')
+        return attrs
@@ -0,0 +1,325 @@
+import heapq
+from collections import defaultdict
+
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from documentsFinance.models import SubRentItem
+from equipment.kits import explode_kits, kits_containing
+from equipment.models import Asset, CatalogItem, Kit
+from .models import ACTIVE_RESERVATION_STATUSES, Reservation
+from .peak import peak_usage
+
+# Assets in these statuses can't be rented out regardless of reservations
+UNAVAILABLE_ASSET_STATUSES = ('maintenance', 'damaged', 'retired')
+
+ITEM_TYPES = ('catalog', 'kit', 'asset')
+
+
+def overlapping_reservations(date_from, date_to, company=None):
+    """
+    Active reservations whose window intersects [date_from, date_to),
+    optionally only those of a company's projects.
+
+    Served by the (itemType, refId, dateFrom, dateTo) index once the caller
+    narrows it down by item.
+    """
+    reservations = Reservation.objects.filter(
+        status__in=ACTIVE_RESERVATION_STATUSES,
+        dateFrom__lt=date_to,
+        dateTo__gt=date_from,
+    )
+    if company is not None:
+        reservations = reservations.filter(projectId__account__company=company)
+    return reservations
+
+
+def rentable_assets(company=None):
+    """Assets that count towards owned stock."""
+    assets = Asset.objects.exclude(status__in=UNAVAILABLE_ASSET_STATUSES)
+    if company is not None:
+        assets = assets.filter(company=company)
+    return assets
+
+
+def _reserved_by_item(catalog_ids, asset_ids, kit_usage, date_from, date_to, company=None):
+    """
+    Peak reserved quantities in one window, as {(itemType, refId): qty}.
+
+    Two grouped aggregates regardless of how many items are asked for: one
+    over direct reservations of the requested items and of the kits holding
+    them, and one folding asset reservations into the catalog item the asset
+    belongs to. Kit reservations count towards each leaf catalog item times
+    the quantity the kit holds (kit_usage, {catalogItemId: {kitId: qty}}).
+
+    Where a single reservation hits an item its quantity is the answer; items
+    hit by several reservations are re-read as rows and swept for true peak
+    usage, since reservations that don't overlap each other must not be summed.
+    """
+    kit_parts = defaultdict(dict)
+    for catalog_id, kits in kit_usage.items():
+        for kit_id, qty in kits.items():
+            kit_parts[kit_id][catalog_id] = qty
+
+    reserved = defaultdict(int)
+    counts = defaultdict(int)
+    window = overlapping_reservations(date_from, date_to, company)
+
+    direct = window.filter(
+        Q(itemType='catalog', refId__in=catalog_ids)
+        | Q(itemType='kit', refId__in=list(kit_parts))
+        | Q(itemType='asset', refId__in=asset_ids)
+    )
+    for row in direct.values('itemType', 'refId').annotate(total=Sum('qty'), n=Count('id')):
+        if row['itemType'] == 'kit':
+            for catalog_id, qty in kit_parts[row['refId']].items():
+                reserved[('catalog', catalog_id)] += row['total'] * qty
+                counts[('catalog', catalog_id)] += row['n']
+        else:
+            key = (row['itemType'], row['refId'])
+            reserved[key] += row['total']
+            counts[key] += row['n']
+
+    folded = window.none()
+    if catalog_ids:
+        asset_catalog = Asset.objects.filter(pk=OuterRef('refId')).values('catalogItem_id')
+        folded = window.filter(
+            itemType='asset',
+            refId__in=Asset.objects.filter(catalogItem_id__in=catalog_ids).values('id'),
+        ).annotate(catalog_id=Subquery(asset_catalog))
+        for row in folded.values('catalog_id').annotate(total=Sum('qty'), n=Count('id')):
+            key = ('catalog', row['catalog_id'])
+            reserved[key] += row['total']
+            counts[key] += row['n']
+
+    contended = {key for key, n in counts.items() if n > 1}
+    if not contended:
+        return reserved
+
+    contended_catalog = {ref_id for item_type, ref_id in contended if item_type == 'catalog'}
+    contended_assets = {ref_id for item_type, ref_id in contended if item_type == 'asset'}
+    contended_kits = {kit_id for kit_id, parts in kit_parts.items() if contended_catalog.intersection(parts)}
+
+    intervals = defaultdict(list)
+    rows = direct.filter(
+        Q(itemType='catalog', refId__in=contended_catalog)
+        | Q(itemType='kit', refId__in=contended_kits)
+        | Q(itemType='asset', refId__in=contended_assets)
+    ).values_list('itemType', 'refId', 'dateFrom', 'dateTo', 'qty')
+    for item_type, ref_id, start, end, qty in rows:
+        if item_type == 'kit':
+            for catalog_id, part_qty in kit_parts[ref_id].items():
+                if catalog_id in contended_catalog:
+                    intervals[('catalog', catalog_id)].append((start, end, qty * part_qty))
+        else:
+            intervals[(item_type, ref_id)].append((start, end, qty))
+
+    if contended_catalog:
+        rows = (
+            folded.filter(catalog_id__in=contended_catalog)
+            .values_list('catalog_id', 'dateFrom', 'dateTo', 'qty')
+        )
+        for catalog_id, start, end, qty in rows:
+            intervals[('catalog', catalog_id)].append((start, end, qty))
+
+    for key in contended:
+        reserved[key] = peak_usage(intervals[key], date_from, date_to).qty
+    return reserved
+
+
+def _subrented_by_item(catalog_ids, date_from, date_to, company=None):
+    """
+    Sub-rented quantities per catalog item for SubRents covering the whole window.
+
+    Summed in SQL over SubRentItem, served by its (catalogItem, dateFrom, dateTo) index.
+    """
+    subrented = defaultdict(int)
+    if not catalog_ids:
+        return subrented
+    rows = SubRentItem.objects.filter(catalogItem_id__in=catalog_ids, dateFrom__lte=date_from, dateTo__gte=date_to)
+    if company is not None:
+        rows = rows.filter(subRentId__projectId__account__company=company)
+    rows = rows.values_list('catalogItem_id').annotate(qty=Sum('qty'))
+    subrented.update(rows)
+    return subrented
+
+
+ITEM_MODELS = {'catalog': CatalogItem, 'kit': Kit, 'asset': Asset}
+
+
+def foreign_items(requests, company):
+    """
+    Requested (item_type, item_id) pairs that are not the company's own,
+    checked with one query per item type.
+    """
+    requested = defaultdict(set)
+    for item_type, item_id, _, _ in requests:
+        requested[item_type].add(item_id)
+    foreign = []
+    for item_type, ids in requested.items():
+        owned = set(ITEM_MODELS[item_type].all_objects.filter(company=company, pk__in=ids)
+                    .values_list('pk', flat=True))
+        foreign.extend((item_type, item_id) for item_id in sorted(ids - owned))
+    return foreign
+
+
+def batch_availability(requests, company=None):
+    """
+    Availability for many items in one pass.
+
+    Args:
+        requests: iterable of (item_type, item_id, date_from, date_to) tuples
+        company: optional Company; every item must then belong to it, and
+            only its assets, reservations and subrents are counted
+
+    Raises:
+        ValueError: for an unsupported item type, an empty window or an
+            item of another company
+
+    Returns:
+        dict: {(item_type, item_id): breakdown} where breakdown holds total,
+        reserved, subrented and availability. If an item is requested more
+        than once, the last window wins.
+
+    The number of queries depends on the number of distinct windows, not on
+    the number of items: a whole quote priced for one event window costs a
+    handful of grouped aggregates.
+    """
+    requests = list(requests)
+    for item_type, _, date_from, date_to in requests:
+        if item_type not in ITEM_TYPES:
+            raise ValueError(f"Unsupported item type: {item_type}")
+        if date_from >= date_to:
+            raise ValueError("dateFrom must be earlier than dateTo")
+    if company is not None:
+        foreign = foreign_items(requests, company)
+        if foreign:
+            # Same answer for other companies' items and missing ones
+            raise ValueError("Unknown items: " + ", ".join(f"{item_type}:{item_id}" for item_type, item_id in foreign))
+
+    kit_ids = {item_id for item_type, item_id, _, _ in requests if item_type == 'kit'}
+    asset_ids = {item_id for item_type, item_id, _, _ in requests if item_type == 'asset'}
+    kit_leaves = explode_kits(kit_ids) if kit_ids else {}
+    catalog_ids = {item_id for item_type, item_id, _, _ in requests if item_type == 'catalog'}
+    for leaves in kit_leaves.values():
+        catalog_ids.update(leaves)
+    if company is not None and kit_leaves:
+        # Kit components pointing at another company's items count as missing
+        own = set(CatalogItem.all_objects.filter(company=company, pk__in=catalog_ids).values_list('pk', flat=True))
+        kit_leaves = {
+            kit_id: {part_id: qty for part_id, qty in leaves.items() if part_id in own}
+            for kit_id, leaves in kit_leaves.items()
+        }
+        catalog_ids &= own
+    kit_usage = kits_containing(catalog_ids) if catalog_ids else {}
+
+    # Owned stock doesn't depend on the window
+    owned = defaultdict(int)
+    if catalog_ids:
+        rows = (
+            rentable_assets(company)
+            .filter(catalogItem_id__in=catalog_ids)
+            .values('catalogItem_id')
+            .annotate(n=Count('id'))
+        )
+        for row in rows:
+            owned[('catalog', row['catalogItem_id'])] = row['n']
+    if asset_ids:
+        for asset_id in rentable_assets(company).filter(pk__in=asset_ids).values_list('pk', flat=True):
+            owned[('asset', asset_id)] = 1
+
+    windows = defaultdict(list)
+    for item_type, item_id, date_from, date_to in requests:
+        windows[(date_from, date_to)].append((item_type, item_id))
+
+    results = {}
+    for (date_from, date_to), items in windows.items():
+        window_assets = {item_id for item_type, item_id in items if item_type == 'asset'}
+        window_catalog = {item_id for item_type, item_id in items if item_type == 'catalog'}
+        for item_type, item_id in items:
+            if item_type == 'kit':
+                window_catalog.update(kit_leaves.get(item_id, {}))
+        window_usage = {catalog_id: kit_usage[catalog_id] for catalog_id in window_catalog if catalog_id in kit_usage}
+
+        reserved = _reserved_by_item(window_catalog, window_assets, window_usage, date_from, date_to, company)
+        subrented = _subrented_by_item(window_catalog, date_from, date_to, company)
+
+        def breakdown(item_type, item_id):
+            key = (item_type, item_id)
+            extra = subrented[item_id] if item_type == 'catalog' else 0
+            return {
+                'total': owned[key],
+                'reserved': reserved[key],
+                'subrented': extra,
+                'availability': owned[key] - reserved[key] + extra,
+            }
+
+        for item_type, item_id in items:
+            if item_type != 'kit':
+                results[(item_type, item_id)] = breakdown(item_type, item_id)
+                continue
+            # A kit is as available as its scarcest leaf component allows
+            parts = [(breakdown('catalog', part_id), qty) for part_id, qty in kit_leaves.get(item_id, {}).items()]
+            capacity = min(((part['total'] + part['subrented']) // qty for part, qty in parts), default=0)
+            buildable = min((part['availability'] // qty for part, qty in parts), default=0)
+            results[(item_type, item_id)] = {
+                'total': capacity,
+                'reserved': capacity - buildable,
+                'subrented': 0,
+                'availability': buildable,
+            }
+
+    return results
+
+
+def calculate_availability(item_type, item_id, date_from, date_to):
+    """
+    Calculate availability for a specific item in a given time window.
+
+    availability = owned stock - peak concurrent reservations + subrents
+    """
+    result = {
+        'item_type': item_type,
+        'item_id': item_id,
+        'date_from': date_from,
+        'date_to': date_to,
+    }
+    result.update(batch_availability([(item_type, item_id, date_from, date_to)])[(item_type, item_id)])
+    result['calculation_time'] = timezone.now()
+    return result
+
+
+def find_asset_conflicts(company=None):
+    """
+    Every pair of live reservations double-booking the same asset.
+
+    Reads asset reservations once, ordered by (refId, dateFrom) off the
+    partial asset index, and sweeps them keeping a heap of windows still
+    open, instead of comparing reservations pairwise.
+
+    Returns:
+        list: dicts with assetId, reservationIds and the overlapping window
+    """
+    reservations = Reservation.objects.filter(itemType='asset', status__in=ACTIVE_RESERVATION_STATUSES)
+    if company is not None:
+        reservations = reservations.filter(projectId__account__company=company)
+    rows = reservations.order_by('refId', 'dateFrom', 'pk').values_list('pk', 'refId', 'dateFrom', 'dateTo')
+
+    conflicts = []
+    current_asset = None
+    open_windows = []
+    for pk, asset_id, start, end in rows.iterator():
+        if asset_id != current_asset:
+            current_asset = asset_id
+            open_windows = []
+        while open_windows and open_windows[0][0] <= start:
+            heapq.heappop(open_windows)
+        for other_end, other_pk in open_windows:
+            conflicts.append({
+                'assetId': asset_id,
+                'reservationIds': [other_pk, pk],
+                'overlapFrom': start,
+                'overlapTo': min(end, other_end),
+            })
+        heapq.heappush(open_windows, (end, pk))
+    return conflicts
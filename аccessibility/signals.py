@@ -0,0 +1,88 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from documentsFinance.models import SubRent
+from equipment.models import Kit, KitItem
+from .availability_calendar import apply_usage, reservation_usage, schedule_kit_rebuild, subrent_usage
+from .models import Reservation
+
+
+def _previous(sender, instance):
+    if instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_reservation(sender, instance, **kwargs):
+    instance._calendar_previous = _previous(sender, instance)
+
+
+@receiver(post_save, sender=Reservation)
+def update_calendar_for_reservation(sender, instance, **kwargs):
+    previous = getattr(instance, '_calendar_previous', None)
+    if previous is not None:
+        unchanged = all(
+            getattr(previous, field) == getattr(instance, field)
+            for field in ('itemType', 'refId', 'qty', 'dateFrom', 'dateTo', 'status')
+        )
+        if unchanged:
+            return
+        apply_usage(reservation_usage(previous), previous.dateFrom, previous.dateTo, 'reservedQty', sign=-1)
+    apply_usage(reservation_usage(instance), instance.dateFrom, instance.dateTo, 'reservedQty')
+
+
+@receiver(post_delete, sender=Reservation)
+def release_calendar_for_reservation(sender, instance, **kwargs):
+    apply_usage(reservation_usage(instance), instance.dateFrom, instance.dateTo, 'reservedQty', sign=-1)
+
+
+@receiver(pre_save, sender=SubRent)
+def remember_subrent(sender, instance, **kwargs):
+    instance._calendar_previous = _previous(sender, instance)
+
+
+@receiver(post_save, sender=SubRent)
+def update_calendar_for_subrent(sender, instance, **kwargs):
+    previous = getattr(instance, '_calendar_previous', None)
+    if previous is not None:
+        unchanged = all(
+            getattr(previous, field) == getattr(instance, field)
+            for field in ('items', 'dateFrom', 'dateTo')
+        )
+        if unchanged:
+            return
+        apply_usage(subrent_usage(previous), previous.dateFrom, previous.dateTo, 'subrentedQty', sign=-1)
+    apply_usage(subrent_usage(instance), instance.dateFrom, instance.dateTo, 'subrentedQty')
+
+
+@receiver(post_delete, sender=SubRent)
+def release_calendar_for_subrent(sender, instance, **kwargs):
+    apply_usage(subrent_usage(instance), instance.dateFrom, instance.dateTo, 'subrentedQty', sign=-1)
+
+
+# Rebuilds run on commit, after the equipment app's receivers have dropped
+# the cached kit graph, so they see the new composition.
+@receiver(pre_save, sender=Kit)
+def remember_kit(sender, instance, **kwargs):
+    instance._calendar_previous = Kit.all_objects.filter(pk=instance.pk).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Kit)
+def update_calendar_for_kit(sender, instance, created, using, **kwargs):
+    previous = getattr(instance, '_calendar_previous', None)
+    if created or (previous is not None and previous.items == instance.items):
+        return
+    schedule_kit_rebuild(instance.company_id, instance.pk, using)
+
+
+@receiver(post_delete, sender=Kit)
+def release_calendar_for_kit(sender, instance, using, **kwargs):
+    schedule_kit_rebuild(instance.company_id, instance.pk, using)
+
+
+@receiver([post_save, post_delete], sender=KitItem)
+def update_calendar_for_kit_item(sender, instance, using, **kwargs):
+    company_id = Kit.all_objects.filter(pk=instance.kit_id).values_list('company_id', flat=True).first()
+    if company_id is not None:
+        schedule_kit_rebuild(company_id, instance.kit_id, using)
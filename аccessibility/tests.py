@@ -1,3 +1,561 @@
+from importlib import import_module
+from io import StringIO
+from unittest.mock import call, patch
+
+from django.apps import apps as django_apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from company.models import User
+from company.testing import dt, make_company, make_project
+from documentsFinance.models import SubRent, SubRentItem
+from equipment.models import Asset, CatalogItem, Kit, KitItem, StockLocation
+from . import availability_calendar
+from .allocation import allocate, allocate_catalog_item
+from .management.commands.bench_asset_allocation import allocation_fixture
+from .models import AssetAllocation, AvailabilityView, DailyAvailability, Reservation
+from .peak import peak_usage
+from .services import batch_availability, find_asset_conflicts
+
+
+class AvailabilityTestBase(TestCase):
+    """Shared stock and reservation fixtures"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.project = make_project(self.company)
+        self.item = CatalogItem.objects.create(
+            sku='sm58', name='Shure SM58', category='audio', defaultRate=10, company=self.company,
+        )
+        self.assets = [
+            Asset.objects.create(catalogItem=self.item, serial=f'S{i}', company=self.company)
+            for i in range(5)
+        ]
+        Asset.objects.create(catalogItem=self.item, serial='broken', status='damaged', company=self.company)
+
+    def reserve(self, item_type, ref_id, qty, day_from, day_to, status='reserved'):
+        return Reservation.objects.create(
+            projectId=self.project, lineId='L1', itemType=item_type, refId=ref_id,
+            qty=qty, dateFrom=dt(day_from), dateTo=dt(day_to), status=status,
+        )
+
+
+class AvailabilityTestCase(AvailabilityTestBase):
+    """Test cases for the availability engine"""
+
+    def test_no_reservations(self):
+        result = AvailabilityView.calculate_availability('catalog', self.item.id, dt(1), dt(3))
+        self.assertEqual(result['total'], 5)
+        self.assertEqual(result['availability'], 5)
+
+    def test_overlapping_reservations_are_subtracted(self):
+        self.reserve('catalog', self.item.id, 2, 1, 5)
+        self.reserve('asset', self.assets[0].id, 1, 2, 4)
+        self.reserve('catalog', self.item.id, 3, 10, 12)  # outside the window
+        self.reserve('catalog', self.item.id, 3, 1, 5, status='canceled')
+
+        result = AvailabilityView.calculate_availability('catalog', self.item.id, dt(2), dt(3))
+        self.assertEqual(result['reserved'], 3)
+        self.assertEqual(result['availability'], 2)
+
+    def test_touching_windows_do_not_overlap(self):
+        self.reserve('catalog', self.item.id, 2, 1, 2)
+        result = AvailabilityView.calculate_availability('catalog', self.item.id, dt(2), dt(3))
+        self.assertEqual(result['availability'], 5)
+
+    def test_subrent_adds_stock(self):
+        SubRent.objects.create(
+            projectId=self.project, items=[{'catalogItemId': self.item.id, 'qty': 4}],
+            dateFrom=dt(1), dateTo=dt(10), cost=100,
+        )
+        result = AvailabilityView.calculate_availability('catalog', self.item.id, dt(2), dt(3))
+        self.assertEqual(result['subrented'], 4)
+        self.assertEqual(result['availability'], 9)
+
+    def test_subrent_items_follow_json(self):
+        other = CatalogItem.objects.create(sku='sm57', name='Shure SM57', category='audio', defaultRate=8,
+                                           company=self.company)
+        subrent = SubRent.objects.create(
+            projectId=self.project, dateFrom=dt(1), dateTo=dt(10), cost=100,
+            items=[{'catalogItemId': self.item.id, 'qty': 2}, {'catalogItemId': self.item.id, 'qty': 1},
+                   {'catalogItemId': other.id}, {'name': 'vendor cable'}, {'catalogItemId': 999999}],
+        )
+        self.assertEqual(set(subrent.subrent_items.values_list('catalogItem_id', 'qty')),
+                         {(self.item.id, 3), (other.id, 1)})
+
+        subrent.items = [{'catalogItemId': other.id, 'qty': 5}]
+        subrent.dateTo = dt(20)
+        subrent.save()
+        self.assertEqual(list(SubRentItem.objects.values_list('catalogItem_id', 'qty', 'dateTo')),
+                         [(other.id, 5, dt(20))])
+        result = AvailabilityView.calculate_availability('catalog', other.id, dt(12), dt(14))
+        self.assertEqual(result['subrented'], 5)
+
+    def test_malformed_subrent_items_are_skipped(self):
+        subrent = SubRent.objects.create(
+            projectId=self.project, dateFrom=dt(1), dateTo=dt(10), cost=100,
+            items=[{'catalogItemId': 'abc'}, {'catalogItemId': [1]}, {'catalogItemId': self.item.id, 'qty': 'two'},
+                   {'catalogItemId': self.item.id, 'qty': None}, 'cable', None,
+                   {'catalogItemId': str(self.item.id), 'qty': '2'}],
+        )
+        self.assertEqual(list(subrent.subrent_items.values_list('catalogItem_id', 'qty')), [(self.item.id, 2)])
+
+    def test_backfill_migration_skips_malformed_items(self):
+        good = SubRent.objects.create(projectId=self.project, dateFrom=dt(1), dateTo=dt(2), cost=1,
+                                      items=[{'catalogItemId': self.item.id, 'qty': 3}])
+        SubRent.objects.bulk_create([
+            SubRent(projectId=self.project, dateFrom=dt(1), dateTo=dt(2), cost=1, items=items)
+            for items in ([{'qty': 2}, 'cable', {'catalogItemId': 'x'}], [{'catalogItemId': self.item.id, 'qty': 'a'}],
+                          [{'catalogItemId': 999999}, {'catalogItemId': self.item.id, 'qty': -1}], 7, {'catalogItemId': 1})
+        ])
+        SubRentItem.objects.all().delete()
+        migration = import_module('documentsFinance.migrations.0007_subrentitem')
+        migration.backfill_items(django_apps, None)
+        self.assertEqual(list(SubRentItem.objects.values_list('subRentId', 'catalogItem_id', 'qty')),
+                         [(good.pk, self.item.id, 3)])
+
+    def test_asset_availability(self):
+        self.reserve('asset', self.assets[1].id, 1, 1, 5)
+        busy = AvailabilityView.calculate_availability('asset', self.assets[1].id, dt(2), dt(3))
+        free = AvailabilityView.calculate_availability('asset', self.assets[2].id, dt(2), dt(3))
+        self.assertEqual(busy['availability'], 0)
+        self.assertEqual(free['availability'], 1)
+
+    def test_kit_availability(self):
+        kit = Kit.objects.create(name='Vocal kit', sku='vk', rate=20, items=[], company=self.company)
+        KitItem.objects.create(
+            kit=kit, content_type=ContentType.objects.get_for_model(CatalogItem),
+            object_id=self.item.id, quantity=2,
+        )
+        result = AvailabilityView.calculate_availability('kit', kit.id, dt(2), dt(3))
+        self.assertEqual(result['availability'], 2)
+
+
+class BatchAvailabilityTestCase(AvailabilityTestBase):
+    """Test cases for batch availability lookups"""
+
+    def test_batch_query_count_is_constant(self):
+        items = [
+            CatalogItem.objects.create(
+                sku=f'item-{i}', name=f'Item {i}', category='audio', defaultRate=1, company=self.company,
+            )
+            for i in range(20)
+        ]
+        for item in items:
+            Asset.objects.create(catalogItem=item, company=self.company)
+            self.reserve('catalog', item.id, 1, 1, 5)
+
+        requests = [('catalog', item.id, dt(2), dt(3)) for item in items]
+        requests.append(('asset', self.assets[0].id, dt(2), dt(3)))
+        with self.assertNumQueries(6):
+            results = batch_availability(requests)
+        self.assertEqual(len(results), 21)
+        self.assertEqual(results[('catalog', items[0].id)]['availability'], 0)
+        self.assertEqual(results[('asset', self.assets[0].id)]['availability'], 1)
+
+    def test_batch_matches_single_lookups(self):
+        self.reserve('catalog', self.item.id, 2, 1, 5)
+        self.reserve('asset', self.assets[0].id, 1, 2, 4)
+        results = batch_availability([
+            ('catalog', self.item.id, dt(2), dt(3)),
+            ('asset', self.assets[0].id, dt(2), dt(3)),
+        ])
+        for (item_type, item_id), breakdown in results.items():
+            single = AvailabilityView.calculate_availability(item_type, item_id, dt(2), dt(3))
+            self.assertEqual(breakdown['availability'], single['availability'])
+
+    def test_batch_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        self.reserve('catalog', self.item.id, 2, 1, 5)
+        response = client.post('/api/availability/batch/', {
+            'items': [{
+                'itemType': 'catalog', 'refId': self.item.id,
+                'dateFrom': dt(2).isoformat(), 'dateTo': dt(3).isoformat(),
+            }],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][f'catalog:{self.item.id}']['availability'], 3)
+
+    def test_batch_endpoint_rejects_other_companies_items(self):
+        self.reserve('catalog', self.item.id, 2, 1, 5)
+        other = make_company('other@example.com')
+        client = APIClient()
+        client.force_authenticate(other.owner)
+        response = client.post('/api/availability/batch/', {
+            'items': [{
+                'itemType': 'catalog', 'refId': self.item.id,
+                'dateFrom': dt(2).isoformat(), 'dateTo': dt(3).isoformat(),
+            }],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('results', response.data)
+
+    def test_batch_endpoint_rejects_users_without_company(self):
+        self.reserve('catalog', self.item.id, 2, 1, 5)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='loose@example.com', password='pw'))
+        response = client.post('/api/availability/batch/', {
+            'items': [{
+                'itemType': 'catalog', 'refId': self.item.id,
+                'dateFrom': dt(2).isoformat(), 'dateTo': dt(3).isoformat(),
+            }],
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('results', response.data)
+
+    def test_batch_counts_only_the_company_reservations(self):
+        other = make_company('other@example.com')
+        foreign_project = make_project(other, 'P-9')
+        Reservation.objects.create(projectId=foreign_project, lineId='x', itemType='catalog', refId=self.item.id,
+                                   qty=2, dateFrom=dt(1), dateTo=dt(5), status='reserved')
+        results = batch_availability([('catalog', self.item.id, dt(2), dt(3))], company=self.company)
+        self.assertEqual(results[('catalog', self.item.id)]['reserved'], 0)
+
+    def test_batch_endpoint_rejects_empty_window(self):
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        response = client.post('/api/availability/batch/', {
+            'items': [{
+                'itemType': 'catalog', 'refId': self.item.id,
+                'dateFrom': dt(3).isoformat(), 'dateTo': dt(2).isoformat(),
+            }],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PeakUsageTestCase(AvailabilityTestBase):
+    """Test cases for sweep-line peak usage"""
+
+    def test_disjoint_intervals_are_not_summed(self):
+        peak = peak_usage([(dt(1), dt(3), 2), (dt(4), dt(6), 3)])
+        self.assertEqual(peak, (3, dt(4), dt(6)))
+
+    def test_overlapping_intervals_stack(self):
+        peak = peak_usage([(dt(1), dt(5), 2), (dt(3), dt(8), 3), (dt(4), dt(6), 1)])
+        self.assertEqual(peak, (6, dt(4), dt(5)))
+
+    def test_back_to_back_intervals_do_not_overlap(self):
+        peak = peak_usage([(dt(1), dt(3), 2), (dt(3), dt(5), 2)])
+        self.assertEqual(peak.qty, 2)
+
+    def test_intervals_are_clipped_to_window(self):
+        peak = peak_usage([(dt(1), dt(10), 2)], dt(3), dt(5))
+        self.assertEqual(peak, (2, dt(3), dt(5)))
+        self.assertEqual(peak_usage([]), (0, None, None))
+
+    def test_availability_uses_peak_usage(self):
+        self.reserve('catalog', self.item.id, 3, 1, 3)
+        self.reserve('catalog', self.item.id, 2, 4, 6)
+        self.reserve('asset', self.assets[0].id, 1, 5, 7)
+        result = AvailabilityView.calculate_availability('catalog', self.item.id, dt(1), dt(8))
+        self.assertEqual(result['reserved'], 3)
+        self.assertEqual(result['availability'], 2)
+
+
+class AvailabilityCalendarTestCase(AvailabilityTestBase):
+    """Test cases for the materialized daily calendar"""
+
+    def day_usage(self):
+        return {
+            row.day.day: (row.reservedQty, row.subrentedQty)
+            for row in DailyAvailability.objects.filter(catalogItem=self.item)
+            if row.reservedQty or row.subrentedQty
+        }
+
+    def test_reservation_signals_maintain_calendar(self):
+        reservation = self.reserve('catalog', self.item.id, 2, 1, 3)
+        self.reserve('asset', self.assets[0].id, 1, 2, 3, status='hold')
+        self.assertEqual(self.day_usage(), {1: (2, 0), 2: (3, 0)})
+
+        reservation.dateTo = dt(4, 12)
+        reservation.qty = 4
+        reservation.save()
+        self.assertEqual(self.day_usage(), {1: (4, 0), 2: (5, 0), 3: (4, 0), 4: (4, 0)})
+
+        reservation.status = 'canceled'
+        reservation.save()
+        self.assertEqual(self.day_usage(), {2: (1, 0)})
+
+        Reservation.objects.all().delete()
+        self.assertEqual(self.day_usage(), {})
+
+    def test_subrent_signals_maintain_calendar(self):
+        subrent = SubRent.objects.create(
+            projectId=self.project, items=[{'catalogItemId': self.item.id, 'qty': 4}],
+            dateFrom=dt(1), dateTo=dt(3), cost=100,
+        )
+        self.assertEqual(self.day_usage(), {1: (0, 4), 2: (0, 4)})
+        subrent.delete()
+        self.assertEqual(self.day_usage(), {})
+
+    def test_rebuild_matches_incremental(self):
+        self.reserve('catalog', self.item.id, 2, 1, 5)
+        self.reserve('asset', self.assets[0].id, 1, 3, 8)
+        SubRent.objects.create(
+            projectId=self.project, items=[{'catalogItemId': self.item.id, 'qty': 4}],
+            dateFrom=dt(2), dateTo=dt(4), cost=100,
+        )
+        incremental = self.day_usage()
+
+        DailyAvailability.objects.all().delete()
+        call_command('rebuild_availability_calendar', '--from', '2026-06-01', '--to', '2026-06-30', stdout=StringIO())
+        self.assertEqual(self.day_usage(), incremental)
+
+    def test_calendar_endpoint(self):
+        self.reserve('catalog', self.item.id, 2, 1, 3)
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        response = client.get('/api/availability/calendar/', {'dateFrom': '2026-06-01', 'dateTo': '2026-06-30'})
+        self.assertEqual(response.status_code, 200)
+        item = response.data['items'][self.item.id]
+        self.assertEqual(item['total'], 5)
+        self.assertEqual(item['days'], {
+            '2026-06-01': {'reserved': 2, 'subrented': 0},
+            '2026-06-02': {'reserved': 2, 'subrented': 0},
+        })
+
+
+class KitAvailabilityTestCase(AvailabilityTestBase):
+    """Test cases for kit reservations consuming their components"""
+
+    def setUp(self):
+        super().setUp()
+        self.kit = Kit.objects.create(name='Vocal kit', sku='vk', rate=20, items=[], company=self.company)
+        with self.captureOnCommitCallbacks(execute=True):
+            KitItem.objects.create(
+                kit=self.kit, content_type=ContentType.objects.get_for_model(CatalogItem),
+                object_id=self.item.id, quantity=2,
+            )
+
+    def test_kit_reservation_consumes_components(self):
+        self.reserve('kit', self.kit.id, 1, 1, 5)
+        item = AvailabilityView.calculate_availability('catalog', self.item.id, dt(2), dt(3))
+        kit = AvailabilityView.calculate_availability('kit', self.kit.id, dt(2), dt(3))
+        self.assertEqual(item['availability'], 3)
+        self.assertEqual(kit['availability'], 1)
+        self.assertEqual(kit['total'], 2)
+
+    def test_kit_reservations_are_swept_with_component_reservations(self):
+        self.reserve('kit', self.kit.id, 1, 1, 3)
+        self.reserve('catalog', self.item.id, 3, 3, 5)
+        result = AvailabilityView.calculate_availability('catalog', self.item.id, dt(1), dt(5))
+        self.assertEqual(result['reserved'], 3)
+
+    def test_kit_reservation_fills_calendar(self):
+        self.reserve('kit', self.kit.id, 2, 1, 2)
+        row = DailyAvailability.objects.get(catalogItem=self.item, day=dt(1).date())
+        self.assertEqual(row.reservedQty, 4)
+
+    def reserved_on(self, day):
+        row = DailyAvailability.objects.filter(catalogItem=self.item, day=dt(day).date()).first()
+        return row.reservedQty if row else 0
+
+    def test_kit_change_rebuilds_calendar(self):
+        self.reserve('kit', self.kit.id, 2, 1, 3)
+        kit_item = KitItem.objects.get(kit=self.kit)
+        with self.captureOnCommitCallbacks(execute=True):
+            kit_item.quantity = 3
+            kit_item.save()
+            # Nothing is rebuilt before the transaction commits
+            self.assertEqual(self.reserved_on(1), 4)
+        self.assertEqual([self.reserved_on(day) for day in (1, 2, 3)], [6, 6, 0])
+        with self.captureOnCommitCallbacks(execute=True):
+            kit_item.delete()
+        self.assertEqual(self.reserved_on(1), 0)
+
+    def test_kit_json_change_rebuilds_calendar(self):
+        kit = Kit.objects.create(
+            name='Spare kit', sku='sk', rate=5, items=[{'catalogItemId': self.item.id, 'qty': 1}],
+            company=self.company,
+        )
+        self.reserve('kit', kit.id, 1, 1, 2)
+        self.assertEqual(self.reserved_on(1), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            kit.items = [{'catalogItemId': self.item.id, 'qty': 2}]
+            kit.save()
+        self.assertEqual(self.reserved_on(1), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            kit.delete()
+        self.assertEqual(self.reserved_on(1), 0)
+
+    def test_rebuild_covers_containing_kits_once_per_transaction(self):
+        case_kit = Kit.objects.create(name='Stage kit', sku='stk', rate=30, items=[{'kitId': self.kit.id, 'qty': 1}],
+                                      company=self.company)
+        unrelated = Kit.objects.create(name='Spare kit', sku='sk', rate=5,
+                                       items=[{'catalogItemId': self.item.id, 'qty': 1}], company=self.company)
+        self.reserve('kit', case_kit.id, 1, 1, 2)
+        self.reserve('kit', unrelated.id, 1, 10, 11)
+        catalog_type = ContentType.objects.get_for_model(CatalogItem)
+        with patch('аccessibility.availability_calendar.rebuild_calendar',
+                   wraps=availability_calendar.rebuild_calendar) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                for sku in ('cable-1', 'cable-2'):
+                    part = CatalogItem.objects.create(sku=sku, name='Cable', category='audio', defaultRate=1,
+                                                      company=self.company)
+                    KitItem.objects.create(kit=self.kit, content_type=catalog_type, object_id=part.id)
+                KitItem.objects.filter(kit=self.kit, object_id=self.item.id).update(quantity=3)
+                KitItem.objects.get(kit=self.kit, object_id=self.item.id).save()
+        self.assertEqual(len(callbacks), 1)
+        # Only the window of the kit containing the changed kit is rebuilt
+        self.assertEqual(rebuild.call_args_list, [call(dt(1).date(), dt(1).date(), company=self.company.pk)])
+        self.assertEqual(self.reserved_on(1), 3)
+
+
+class AssetConflictTestCase(AvailabilityTestBase):
+    """Test cases for serialized asset double-booking"""
+
+    def test_overlapping_asset_reservation_is_rejected(self):
+        self.reserve('asset', self.assets[0].id, 1, 1, 5)
+        with self.assertRaises(ValidationError):
+            self.reserve('asset', self.assets[0].id, 1, 4, 6)
+        self.reserve('asset', self.assets[0].id, 1, 5, 6)
+        self.reserve('asset', self.assets[1].id, 1, 1, 5)
+        self.reserve('asset', self.assets[0].id, 1, 1, 5, status='canceled')
+
+    def test_moving_into_a_booked_window_is_rejected(self):
+        self.reserve('asset', self.assets[0].id, 1, 1, 5)
+        later = self.reserve('asset', self.assets[0].id, 1, 6, 8)
+        later.dateFrom = dt(3)
+        with self.assertRaises(ValidationError):
+            later.save()
+
+    def test_database_guard_catches_bulk_writes(self):
+        self.reserve('asset', self.assets[0].id, 1, 1, 5)
+        overlapping = Reservation(
+            projectId=self.project, lineId='L2', itemType='asset', refId=self.assets[0].id,
+            qty=1, dateFrom=dt(2), dateTo=dt(3), status='reserved',
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.bulk_create([overlapping])
+
+    def test_migration_refuses_existing_overlaps(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('conflicting rows can only be planted with the SQLite guard removed')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER trg_reservation_asset_overlap_insert')
+        first = self.reserve('asset', self.assets[0].id, 1, 1, 5)
+        clashing, clear = Reservation.objects.bulk_create([
+            Reservation(projectId=self.project, lineId='L2', itemType='asset', refId=self.assets[0].id,
+                        qty=1, dateFrom=dt(4), dateTo=dt(6), status='checkedOut'),
+            Reservation(projectId=self.project, lineId='L3', itemType='asset', refId=self.assets[0].id,
+                        qty=1, dateFrom=dt(6), dateTo=dt(7), status='hold'),
+        ])
+        migration = import_module('аccessibility.migrations.0004_reservation_asset_overlap_guard')
+        with self.assertRaises(CommandError) as raised:
+            migration.refuse_existing_overlaps(django_apps, None)
+        self.assertIn(f'reservations {first.pk} and {clashing.pk}', str(raised.exception))
+        self.assertNotIn(str(clear.pk), str(raised.exception).split('\n')[1])
+        self.assertEqual(set(Reservation.objects.values_list('status', flat=True)),
+                         {'reserved', 'checkedOut', 'hold'})
+
+        Reservation.objects.filter(pk=clashing.pk).update(status='canceled')
+        migration.refuse_existing_overlaps(django_apps, None)
+
+    def test_api_answers_model_validation_errors_with_400(self):
+        self.reserve('asset', self.assets[0].id, 1, 1, 5)
+
+        class ReserveView(APIView):
+            def post(view, request):
+                self.reserve('asset', self.assets[0].id, 1, 2, 3)
+
+        request = APIRequestFactory().post('/reserve/')
+        force_authenticate(request, self.company.owner)
+        response = ReserveView.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already booked', str(response.data))
+
+    def test_conflict_report(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('DROP TRIGGER trg_reservation_asset_overlap_insert')
+        else:
+            self.skipTest('conflicting rows can only be planted with the SQLite guard removed')
+        first = self.reserve('asset', self.assets[0].id, 1, 1, 5)
+        Reservation.objects.bulk_create([
+            Reservation(projectId=self.project, lineId='L2', itemType='asset', refId=self.assets[0].id,
+                        dateFrom=dt(2), dateTo=dt(3), status='hold'),
+            Reservation(projectId=self.project, lineId='L3', itemType='asset', refId=self.assets[0].id,
+                        dateFrom=dt(4), dateTo=dt(9), status='reserved'),
+            Reservation(projectId=self.project, lineId='L4', itemType='asset', refId=self.assets[1].id,
+                        dateFrom=dt(2), dateTo=dt(3), status='reserved'),
+        ])
+
+        conflicts = find_asset_conflicts(self.company)
+        self.assertEqual(len(conflicts), 2)
+        self.assertEqual({conflict['reservationIds'][0] for conflict in conflicts}, {first.id})
+        self.assertEqual(conflicts[1]['overlapFrom'], dt(4))
+        self.assertEqual(conflicts[1]['overlapTo'], dt(5))
+
+        client = APIClient()
+        client.force_authenticate(self.company.owner)
+        response = client.get('/api/availability/conflicts/')
+        self.assertEqual(response.data['count'], 2)
+
+        client.force_authenticate(User.objects.create_user(email='loose@example.com', password='pw'))
+        response = client.get('/api/availability/conflicts/')
+        self.assertEqual((response.status_code, response.data['count']), (200, 0))
+
+
+class AssetAllocationTestCase(AvailabilityTestBase):
+    """Test cases for the greedy asset allocator"""
+
+    def test_uses_as_many_assets_as_peak_demand(self):
+        demand, stock = allocation_fixture(reservations=2000, assets=300)
+        result = allocate(demand, stock)
+        self.assertEqual(result.shortages, {})
+        self.assertEqual(result.assets_used, peak_usage([(start, end, qty) for _, start, end, qty in demand]).qty)
+
+    def test_no_asset_is_double_booked(self):
+        demand, stock = allocation_fixture(reservations=500, assets=40)
+        windows = {pk: (start, end) for pk, start, end, _ in demand}
+        per_asset = {}
+        for reservation_id, assets in allocate(demand, stock).assignments.items():
+            for asset_id in assets:
+                per_asset.setdefault(asset_id, []).append(windows[reservation_id])
+        for bookings in per_asset.values():
+            self.assertEqual(peak_usage([(start, end, 1) for start, end in bookings]).qty, 1)
+
+    def test_prefers_location_and_respects_busy_windows(self):
+        result = allocate(
+            [(1, dt(1), dt(3), 2), (2, dt(5), dt(6), 1)],
+            [(10, 'A'), (11, 'B'), (12, 'B'), (13, 'B')],
+            busy={12: [(dt(2), dt(4))]},
+            preferred_location='B',
+        )
+        self.assertEqual(sorted(result.assignments[1]), [11, 13])
+        self.assertIn(result.assignments[2][0], [11, 13])
+        self.assertEqual(result.assets_used, 2)
+
+    def test_overlapping_busy_windows(self):
+        # (2, 3) nested in (1, 10) must not hide the outer window
+        result = allocate([(1, 5, 6, 1)], [(1, None), (2, None)], busy={1: [(1, 10), (2, 3)]})
+        self.assertEqual(result.assignments[1], [2])
+
+    def test_reports_shortages(self):
+        result = allocate([(1, dt(1), dt(3), 3)], [(10, None), (11, None)])
+        self.assertEqual(result.shortages, {1: 1})
+
+    def test_allocate_catalog_item(self):
+        warehouse = StockLocation.objects.create(name='Main', type='warehouse', company=self.company)
+        Asset.objects.filter(pk__in=[self.assets[3].id, self.assets[4].id]).update(location=warehouse)
+        Asset.objects.filter(pk=self.assets[0].id).update(status='maintenance')
+        first = self.reserve('catalog', self.item.id, 2, 1, 3)
+        second = self.reserve('catalog', self.item.id, 3, 2, 4)
+        self.reserve('asset', self.assets[1].id, 1, 1, 5)
+
+        result = allocate_catalog_item(self.item, location=warehouse, since=dt(1))
+        self.assertEqual(sorted(result.assignments[first.id]), [self.assets[3].id, self.assets[4].id])
+        self.assertEqual(result.assignments[second.id], [self.assets[2].id])
+        self.assertEqual(result.shortages, {second.id: 2})
+        self.assertEqual(AssetAllocation.objects.filter(reservationId=first).count(), 2)
 
-# Create your tests here.
+        # Re-running replaces the previous allocation
+        allocate_catalog_item(self.item, location=warehouse, since=dt(1))
+        self.assertEqual(AssetAllocation.objects.count(), 3)
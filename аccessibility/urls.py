@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'availability'
+
+urlpatterns = [
+    path('calendar/', views.AvailabilityCalendarAPIView.as_view(), name='availability-calendar'),
+    path('batch/', views.BatchAvailabilityAPIView.as_view(), name='availability-batch'),
+    path('conflicts/', views.AssetConflictReportAPIView.as_view(), name='asset-conflicts'),
+]
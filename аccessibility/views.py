@@ -1,3 +1,80 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .availability_calendar import calendar_grid
+from .serializers import BatchAvailabilitySerializer, CalendarQuerySerializer
+from .services import batch_availability, find_asset_conflicts
+
+
+class BatchAvailabilityAPIView(APIView):
+    """
+    API endpoint for checking availability of many items at once.
+
+    Accepts {"items": [{itemType, refId, dateFrom, dateTo}, ...]} and returns
+    availability keyed by "<itemType>:<refId>".
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BatchAvailabilitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if request.user.company is None:
+            # company=None would count every tenant's items and reservations
+            return Response({'detail': 'User is not linked to a company.'}, status=status.HTTP_403_FORBIDDEN)
+        items = serializer.validated_data['items']
+        try:
+            results = batch_availability(
+                [(item['itemType'], item['refId'], item['dateFrom'], item['dateTo']) for item in items],
+                company=request.user.company,
+            )
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = {
+            f"{item_type}:{item_id}": breakdown
+            for (item_type, item_id), breakdown in results.items()
+        }
+        return Response({'results': data}, status=status.HTTP_200_OK)
+
+
+class AvailabilityCalendarAPIView(APIView):
+    """
+    API endpoint for the month-view availability grid.
+
+    Reads the materialized daily calendar for ?dateFrom=&dateTo= and an
+    optional repeated ?catalogItems= filter.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = {
+            'dateFrom': request.query_params.get('dateFrom'),
+            'dateTo': request.query_params.get('dateTo'),
+        }
+        if 'catalogItems' in request.query_params:
+            params['catalogItems'] = request.query_params.getlist('catalogItems')
+        serializer = CalendarQuerySerializer(data=params)
+        serializer.is_valid(raise_exception=True)
+
+        grid = calendar_grid(
+            request.user.company,
+            serializer.validated_data['dateFrom'],
+            serializer.validated_data['dateTo'],
+            serializer.validated_data.get('catalogItems'),
+        )
+        return Response({'items': grid}, status=status.HTTP_200_OK)
+
+
+class AssetConflictReportAPIView(APIView):
+    """
+    API endpoint listing every double-booked asset in the user's company.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # company=None would report every tenant's conflicts
+        company = request.user.company
+        conflicts = find_asset_conflicts(company=company) if company is not None else []
+        return Response({'count': len(conflicts), 'conflicts': conflicts}, status=status.HTTP_200_OK)